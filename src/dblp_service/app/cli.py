@@ -4,6 +4,7 @@ from dblp_service.lib.log import create_logger
 from dblp_service.lib.config import Config, load_config, setenv
 import typing as t
 from dblp_service.lib.debug import install_icecream
+from dblp_service.local_storage.sparql_client import write_query_metrics
 
 log = create_logger(__file__)
 
@@ -11,8 +12,16 @@ log = create_logger(__file__)
 @click.group()
 @click.pass_context
 @click.option("--env", type=click.Choice(["test", "dev", "prod"]), default="dev", help="Check that config is valid")
-def cli(ctx: Context, env: str):
+@click.option(
+    "--metrics-out",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="On exit, write SPARQL query metrics to this file (Prometheus text if *.prom, else JSON)",
+)
+def cli(ctx: Context, env: str, metrics_out: t.Optional[str]):
     log.debug(f"env={env}")
+    if metrics_out:
+        ctx.call_on_close(lambda: write_query_metrics(metrics_out))
     install_icecream()
     setenv(env)
     set_config(ctx)
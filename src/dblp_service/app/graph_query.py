@@ -1,4 +1,7 @@
+import typing as t
+
 import click
+from click.core import Context
 from rich.pretty import pprint
 from bigtree.tree.export import print_tree
 from dblp_service.pub_formats.bibtex.bibtex_transform import dblp_reprs_to_bibtex_library, print_library
@@ -6,8 +9,11 @@ from dblp_service.pub_formats.rdf_tuples.queries import get_author_publication_t
 from dblp_service.pub_formats.rdf_tuples.tree_traversal import all_authorship_trees_to_reprs
 from dblp_service.pub_formats.rdf_tuples.trees import iter_subj_obj_relationships, simplify_urlname
 from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.columnar_store import ColumnarBackend, is_columnar_store
+from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.local_storage.graph_naming import DblpGraphName
 
-from .cli import cli
+from .cli import cli, get_config
 
 log = create_logger(__file__)
 
@@ -17,6 +23,18 @@ def graph_query():
     """Query Jena RDF GraphDB"""
 
 
+def stash_backend(ctx: Context, md5_prefix: str) -> t.Optional[ColumnarBackend]:
+    """Serve queries from the columnar store and authorship index of a stashed release."""
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    md5 = fstash.resolve_md5(md5_prefix)
+    if not md5 or not is_columnar_store(fstash.triple_store_dir(md5)):
+        print(f'No indexed release matches {md5_prefix}; run `stash index` first')
+        return None
+    backend = ColumnarBackend(fstash.indexes_dir)
+    backend.attach(DblpGraphName(md5), fstash.index_dir(md5))
+    return backend
+
 
 @graph_query.command()
 @click.argument('author-uri', type=str)
@@ -26,7 +44,10 @@ def graph_query():
 @click.option('--show-tuples', is_flag=True, default=False)
 @click.option('--step-debug', is_flag=True, default=False)
 @click.option('--pub-index', type=int, default=-1)
+@click.option('--stash-md5', type=str, help='Read from the indexes of a stashed release (MD5 prefix), not Fuseki')
+@click.pass_context
 def show_authorship(
+    ctx: Context,
     author_uri: str,
     format: str,
     show_tree: bool,
@@ -34,8 +55,12 @@ def show_authorship(
     show_tuples: bool,
     step_debug: bool,
     pub_index: int,
+    stash_md5: t.Optional[str],
 ):
-    tree = get_author_publication_tree(author_uri)
+    backend = stash_backend(ctx, stash_md5) if stash_md5 else None
+    if stash_md5 and not backend:
+        return
+    tree = get_author_publication_tree(author_uri, backend)
     pub_count = len(tree.children)
     log.info(f'Publication Count: {pub_count}')
     if pub_index > -1:
@@ -3,6 +3,9 @@
 """
 
 
+from collections import Counter
+import json
+from os import path
 from pprint import pprint
 
 from dblp_service.app.arg_helpers import zero_or_one
@@ -12,7 +15,17 @@ from click.core import Context
 import asyncio
 import typing as t
 
-from dblp_service.local_storage.jena_db import init_db
+from dblp_service.local_storage.bulk_loader import bulk_load_stashed
+from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.local_storage.graph_catalog import ACTIVE_ALIAS, GraphCatalog, graph_catalog_file
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.jena_db import JenaDB, init_db
+from dblp_service.lib.log import create_logger
+from dblp_service.services.affected_authors import AffectedAuthors
+from dblp_service.services.chunked_diff import DEFAULT_RANGE_SIZE
+from dblp_service.services.rdf_graph_diff import DiffEngine
+
+log = create_logger(__file__)
 
 
 @cli.group()
@@ -42,6 +55,163 @@ def import_rdfs(ctx: Context, md5_prefix: t.Tuple[str]):
     pprint(config)
 
 
+@jena.command()
+@click.argument('md5-prefix', type=str, nargs=-1)
+@click.pass_context
+def load(ctx: Context, md5_prefix: t.Tuple[str]):
+    """Bulk load a stashed RDF (stashed head by default) with the TDB2 loader"""
+    success, md5 = zero_or_one(md5_prefix)
+    if not success:
+        return
+
+    assert (config := get_config(ctx))
+    if not md5:
+        _, md5 = FileStash(config).get_base_and_head_id()
+    if not md5:
+        print('No MD5 given and no stashed head version set')
+        return
+
+    if stats := asyncio.run(bulk_load_stashed(config, md5)):
+        print(stats)
+
+
+@jena.command()
+@click.argument('md5-prefix', type=str, nargs=-1)
+@click.option('--alias', type=str, default=ACTIVE_ALIAS, show_default=True)
+@click.pass_context
+def activate(ctx: Context, md5_prefix: t.Tuple[str], alias: str):
+    """Point a graph alias at a loaded graph (stashed head by default)"""
+    success, md5_given = zero_or_one(md5_prefix)
+    if not success:
+        return
+
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    md5 = fstash.resolve_md5(md5_given) if md5_given else fstash.get_base_and_head_id()[1]
+    if not md5:
+        print('No stashed version matched; nothing to activate')
+        return
+
+    jenadb = JenaDB.from_config(config)
+    graph_name = DblpGraphName(md5)
+    prior = jenadb.activate_graph(graph_name, alias)
+    print(f'{alias}: {prior.qname() if prior else "(unset)"} -> {graph_name.qname()}')
+
+
+@jena.command()
+@click.option('--base', type=str, help='MD5 prefix of the older release (default: active graph, else stashed base)')
+@click.option('--head', type=str, help='MD5 prefix of the newer release (default: stashed head)')
+@click.option('--out', type=click.File('w'), default='-', help='JSON lines output file (default: stdout)')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+@click.option('--authors-out', type=click.Path(dir_okay=False), help='Also write the affected author IRIs here')
+@click.pass_context
+def diff(
+    ctx: Context,
+    base: t.Optional[str],
+    head: t.Optional[str],
+    out: t.TextIO,
+    batch_size: int,
+    authors_out: t.Optional[str],
+):
+    """Stream the publications added, removed or modified between two loaded releases"""
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    stashed_base, stashed_head = fstash.get_base_and_head_id()
+    diff_engine = DiffEngine(fstash, JenaDB.from_config(config))
+    base_md5 = fstash.resolve_md5(base) if base else diff_engine.active_release() or stashed_base
+    head_md5 = fstash.resolve_md5(head) if head else stashed_head
+    if not base_md5 or not head_md5:
+        print('Base and head releases are required; set them with `stash set-base/set-head`')
+        return
+
+    counts: t.Counter[str] = Counter()
+    affected = AffectedAuthors()
+    changes = diff_engine.iter_publication_changes(DblpGraphName(base_md5), DblpGraphName(head_md5), batch_size)
+    for change in affected.collect(changes):
+        counts[change.kind] += 1
+        out.write(json.dumps(change.to_json()) + '\n')
+    log.info(f'Publication changes: {dict(counts)}')
+    if authors_out:
+        log.info(f'Wrote {affected.write(authors_out):,} affected authors to {authors_out}')
+
+
+@jena.command('create-diff')
+@click.option('--base', type=str, help='MD5 prefix of the older release (default: active graph, else stashed base)')
+@click.option('--head', type=str, help='MD5 prefix of the newer release (default: stashed head)')
+@click.option(
+    '--range-size',
+    type=int,
+    default=DEFAULT_RANGE_SIZE,
+    show_default=True,
+    help='Publications per update; each update scans the head graph\'s publications once',
+)
+@click.option('--concurrency', type=int, default=1, show_default=True, help='Updates in flight at once')
+@click.pass_context
+def create_diff(ctx: Context, base: t.Optional[str], head: t.Optional[str], range_size: int, concurrency: int):
+    """Materialize the graph of publications in head but not base, resuming an interrupted run"""
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    stashed_base, stashed_head = fstash.get_base_and_head_id()
+    diff_engine = DiffEngine(fstash, JenaDB.from_config(config))
+    base_md5 = fstash.resolve_md5(base) if base else diff_engine.active_release() or stashed_base
+    head_md5 = fstash.resolve_md5(head) if head else stashed_head
+    if not base_md5 or not head_md5:
+        print('Base and head releases are required; set them with `stash set-base/set-head`')
+        return
+
+    base_graph, head_graph = DblpGraphName(base_md5), DblpGraphName(head_md5)
+    checkpoint_file = path.join(fstash.checkpoints_dir, f'diff-{base_md5}-{head_md5}.json')
+    diff_graph = diff_engine.create_diff_graph(
+        head_graph, base_graph, range_size=range_size, concurrency=concurrency, checkpoint_file=checkpoint_file
+    )
+    print(f'Created {diff_graph.qname()}')
+
+
+@jena.command('export-patch')
+@click.option('--base', type=str, help='MD5 prefix of the older release (default: stashed base)')
+@click.option('--head', type=str, help='MD5 prefix of the newer release (default: stashed head)')
+@click.option('--out', type=click.Path(dir_okay=False), required=True, help='Patch file (gzipped if it ends with .gz)')
+@click.option('--memory-mb', type=int, default=1024, show_default=True, help='Sort buffer per release')
+@click.option('--tmp-dir', type=click.Path(file_okay=False), help='Directory for sorted runs')
+@click.pass_context
+def export_patch(
+    ctx: Context, base: t.Optional[str], head: t.Optional[str], out: str, memory_mb: int, tmp_dir: t.Optional[str]
+):
+    """Write the changes between two stashed releases as an RDF Patch, for apply-patch on other nodes"""
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    stashed_base, stashed_head = fstash.get_base_and_head_id()
+    base_md5 = fstash.resolve_md5(base) if base else stashed_base
+    head_md5 = fstash.resolve_md5(head) if head else stashed_head
+    if not base_md5 or not head_md5:
+        print('Base and head releases are required; set them with `stash set-base/set-head`')
+        return
+
+    diff_engine = DiffEngine(fstash, JenaDB.from_config(config))
+    stats = diff_engine.export_patch(base_md5, head_md5, out, tmp_dir, memory_mb << 20)
+    print(f'Wrote {out}: {stats}')
+
+
+@jena.command('apply-patch')
+@click.argument('patch-file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--base', type=str, help='MD5 prefix of the loaded graph to start from (default: the release the patch follows)')
+@click.option('--batch-size', type=int, default=500, show_default=True, help='Subjects per update')
+@click.pass_context
+def apply_patch(ctx: Context, patch_file: str, base: t.Optional[str], batch_size: int):
+    """Create the graph of a patch's head release from a loaded graph, by an RDF Patch from export-patch"""
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    base_md5 = fstash.resolve_md5(base) if base else None
+    if base and not base_md5:
+        print(f'No stashed release matched {base}')
+        return
+
+    diff_engine = DiffEngine(fstash, JenaDB.from_config(config))
+    base_graph = DblpGraphName(base_md5) if base_md5 else None
+    head_graph, stats = diff_engine.apply_patch(patch_file, base_graph, batch_size)
+    print(f'Created {head_graph.qname()}: {stats}')
+
+
 @jena.command()
 @click.pass_context
 def prune(ctx: Context):
@@ -53,6 +223,10 @@ def prune(ctx: Context):
 @jena.command()
 @click.pass_context
 def report(ctx: Context):
-    """Import RDFs from stash, explicit or head/base by default"""
+    """Show loaded graphs, with triple and publication counts"""
     assert (config := get_config(ctx))
-    pprint(config)
+    catalog = GraphCatalog(graph_catalog_file(config))
+    if not catalog.exists():
+        print('No graph catalog found; load a graph to create one')
+        return
+    print(catalog.create_report())
@@ -1,6 +1,31 @@
+from collections import Counter
+import json
+import os
+import tempfile
+
 from dblp_service.app.arg_helpers import zero_or_one
 from dblp_service.lib.log import create_logger
-from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.lib.tables import format_table
+from dblp_service.local_storage.authorship_index import (
+    AuthorshipIndex,
+    apply_authorship_delta,
+    authorship_delta,
+    build_authorship_index,
+    is_authorship_index,
+)
+from dblp_service.local_storage.columnar_store import ColumnarStore, build_columnar_store, is_columnar_store
+from dblp_service.local_storage.file_stash_manager import FileStash, StashedFile
+from dblp_service.local_storage.parallel_ingest import Combine, CountTriples, PredicateStats, map_reduce_ntriples
+from dblp_service.services.affected_authors import AffectedAuthors
+from dblp_service.services.offline_diff import iter_offline_changes
+from dblp_service.services.publication_hashes import (
+    PublicationHashes,
+    build_publication_hashes,
+    diff_publication_hashes,
+    is_publication_hashes,
+)
+from dblp_service.services.publication_keys import PublicationKeys, build_publication_keys, is_publication_keys
+from dblp_service.services.release_deltas import ReleaseDeltas
 from .cli import cli, get_config
 import click
 from click.core import Context
@@ -63,8 +88,11 @@ def import_file(ctx: Context, filename: str):
     assert (config := get_config(ctx))
     fstash = FileStash(config)
 
-    fstash.import_file(filename)
+    stashed = fstash.import_file(filename)
     fstash.get_imported_files()
+    if stashed.path and stashed.path.endswith((".nt", ".nt.gz")):
+        build_authorship(fstash, stashed)
+        build_hashes(fstash, stashed)
 
 
 @stash.command()
@@ -99,3 +127,243 @@ def set_head(ctx: Context, md5_prefix: t.Tuple[str]):
         fstash = FileStash(config)
         fstash.set_head_version(md5)
         print(fstash.create_report())
+
+
+def work_directory(fstash: FileStash, md5: str) -> tempfile.TemporaryDirectory:
+    """A temporary directory beside a release's indexes, for its decompressed dump
+    while it is read in parallel; removed, dump and all, once the read is done."""
+    os.makedirs(fstash.index_dir(md5), exist_ok=True)
+    return tempfile.TemporaryDirectory(prefix="work-", dir=fstash.index_dir(md5))
+
+
+def build_authorship(fstash: FileStash, stashed: StashedFile, processes: t.Optional[int] = None):
+    """Build the authorship index for a stashed N-Triples file."""
+    assert stashed.path
+    index_dir = fstash.authorship_index_dir(stashed.md5)
+    with work_directory(fstash, stashed.md5) as work_dir:
+        pairs = build_authorship_index(stashed.path, index_dir, processes, work_dir)
+    print(f"Built {index_dir}: {pairs:,} author/publication pairs")
+
+
+def build_hashes(fstash: FileStash, stashed: StashedFile):
+    """Hash the publications of a stashed N-Triples file, and build their key set."""
+    assert stashed.path
+    hashes_dir = fstash.publication_hashes_dir(stashed.md5)
+    pubs = build_publication_hashes(stashed.path, hashes_dir, fstash.index_dir(stashed.md5))
+    print(f"Built {hashes_dir}: {pubs:,} publication hashes")
+    build_keys(fstash, stashed.md5)
+
+
+def build_keys(fstash: FileStash, md5: str):
+    """Build the publication key set of a release from its publication hashes."""
+    keys_dir = fstash.publication_keys_dir(md5)
+    pubs = (term[1:-1] for term, _ in PublicationHashes(fstash.publication_hashes_dir(md5)).items())
+    keys = build_publication_keys(pubs, keys_dir, fstash.index_dir(md5))
+    print(f"Built {keys_dir}: {keys:,} publication keys")
+
+
+def store_delta(fstash: FileStash, base_md5: str, head_md5: str) -> bool:
+    """Store the delta between two releases from their publication hashes."""
+    hashes_dirs = [fstash.publication_hashes_dir(base_md5), fstash.publication_hashes_dir(head_md5)]
+    if not all(is_publication_hashes(d) for d in hashes_dirs):
+        print("Publication hashes of both releases are required; build them with `stash index`")
+        return False
+    count = ReleaseDeltas(fstash.deltas_dir).add(*[PublicationHashes(d) for d in hashes_dirs], base_md5, head_md5)
+    print(f"Stored delta {base_md5} -> {head_md5}: {count:,} changed publications")
+    return True
+
+
+def update_authorship(fstash: FileStash, base_md5: str, head: StashedFile) -> bool:
+    """Update the base release's authorship index to the head release, using the
+    publications added, removed or modified between the two, from stored deltas
+    or publication hashes. Modified publications are all re-read from head, as a
+    hash does not tell which of their fields changed."""
+    base_index_dir = fstash.authorship_index_dir(base_md5)
+    head_store_dir = fstash.triple_store_dir(head.md5)
+    if not is_authorship_index(base_index_dir) or not is_columnar_store(head_store_dir):
+        print("Incremental update needs the base authorship index and the head columnar store")
+        return False
+
+    hashes_dirs = [fstash.publication_hashes_dir(base_md5), fstash.publication_hashes_dir(head.md5)]
+    changes = ReleaseDeltas(fstash.deltas_dir).changes(base_md5, head.md5)
+    if changes is None and not all(is_publication_hashes(d) for d in hashes_dirs):
+        print("Incremental update needs a stored delta or the publication hashes of both releases")
+        return False
+
+    changed = [uri for uri, _ in changes or diff_publication_hashes(*[PublicationHashes(d) for d in hashes_dirs])]
+    delta = authorship_delta(ColumnarStore(head_store_dir), changed)
+
+    index_dir = fstash.authorship_index_dir(head.md5)
+    pairs = apply_authorship_delta(AuthorshipIndex(base_index_dir), delta, index_dir)
+    print(f"Built {index_dir} from {base_md5} and {len(delta):,} changed publications: {pairs:,} pairs")
+    return True
+
+
+@stash.command()
+@click.pass_context
+@click.argument("md5-prefix", type=str, nargs=-1)
+@click.option("--rebuild", is_flag=True, help="Rebuild indexes even if they exist")
+@click.option(
+    "--base", type=str, help="MD5 prefix of the previous indexed release, to store a delta and update authorship from"
+)
+@click.option("--processes", type=int, help="Worker processes for reading the dump (default: all cores)")
+def index(ctx: Context, md5_prefix: t.Tuple[str], rebuild: bool, base: t.Optional[str], processes: t.Optional[int]):
+    """Build the memory-mapped columnar store, authorship index and publication
+    hashes of a stashed N-Triples file (stashed head by default), for serving
+    queries and diffs without Fuseki.
+    """
+    success, md5_given = zero_or_one(md5_prefix)
+    if not success:
+        return
+
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    md5 = fstash.resolve_md5(md5_given) if md5_given else fstash.get_base_and_head_id()[1]
+    stashed = fstash.get_stashed_file(md5) if md5 else None
+    if not md5 or not stashed or not stashed.path:
+        print("No stashed file matched; nothing to index")
+        return
+
+    store_dir = fstash.triple_store_dir(md5)
+    if is_columnar_store(store_dir) and not rebuild:
+        print(f"Columnar store already built in {store_dir}")
+    else:
+        stats = build_columnar_store(stashed.path, store_dir, fstash.index_dir(md5))
+        print(f"Built {store_dir}: {stats}")
+
+    if is_publication_hashes(fstash.publication_hashes_dir(md5)) and not rebuild:
+        print(f"Publication hashes already built in {fstash.publication_hashes_dir(md5)}")
+        if not is_publication_keys(fstash.publication_keys_dir(md5)):
+            build_keys(fstash, md5)
+    else:
+        build_hashes(fstash, stashed)
+
+    base_md5 = fstash.resolve_md5(base) if base else None
+    if base_md5:
+        store_delta(fstash, base_md5, md5)
+
+    if is_authorship_index(fstash.authorship_index_dir(md5)) and not rebuild:
+        print(f"Authorship index already built in {fstash.authorship_index_dir(md5)}")
+        return
+
+    if not base_md5 or not update_authorship(fstash, base_md5, stashed):
+        build_authorship(fstash, stashed, processes)
+
+
+@stash.command()
+@click.pass_context
+@click.argument("md5-prefix", type=str, nargs=-1)
+@click.option("--processes", type=int, help="Worker processes for reading the dump (default: all cores)")
+def stats(ctx: Context, md5_prefix: t.Tuple[str], processes: t.Optional[int]):
+    """Count the triples, publications and triples per predicate of a stashed
+    N-Triples file (stashed head by default).
+    """
+    success, md5_given = zero_or_one(md5_prefix)
+    if not success:
+        return
+
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    md5 = fstash.resolve_md5(md5_given) if md5_given else fstash.get_base_and_head_id()[1]
+    stashed = fstash.get_stashed_file(md5) if md5 else None
+    if not md5 or not stashed or not stashed.path:
+        print("No stashed file matched")
+        return
+
+    reducer = Combine(CountTriples(), PredicateStats())
+    with work_directory(fstash, md5) as work_dir:
+        counts, predicates = map_reduce_ntriples(stashed.path, reducer, processes, work_dir)
+    print(f"{stashed.path}: {counts.triples:,} triples, {counts.publications:,} publications")
+    rows = [[predicate, f"{count:,}"] for predicate, count in predicates.most_common()]
+    print(format_table(["Predicate", "Triples"], rows))
+
+
+@stash.command()
+@click.pass_context
+@click.option("--base", type=str, help="MD5 prefix of the older release (default: stashed base)")
+@click.option("--head", type=str, help="MD5 prefix of the newer release (default: stashed head)")
+@click.option("--out", type=click.File("w"), default="-", help="JSON lines output file (default: stdout)")
+@click.option("--memory-mb", type=int, default=1024, show_default=True, help="Sort buffer per release")
+@click.option("--tmp-dir", type=click.Path(file_okay=False), help="Directory for sorted runs")
+@click.option("--hashes", is_flag=True, help="Only list changed publications, from their stored hashes")
+@click.option(
+    "--authors-out", type=click.Path(dir_okay=False), help="Also write the authors of changed publications here"
+)
+def diff(
+    ctx: Context,
+    base: t.Optional[str],
+    head: t.Optional[str],
+    out: t.TextIO,
+    memory_mb: int,
+    tmp_dir: t.Optional[str],
+    hashes: bool,
+    authors_out: t.Optional[str],
+):
+    """Stream the subjects added, removed or modified between two stashed
+    N-Triples files, without Fuseki.
+
+    With --hashes, only publications are compared, by composing the deltas
+    stored by `stash index --base` if they connect the releases, or else by the
+    content hashes built by `stash index`; each line is just {"uri", "kind"}.
+
+    --authors-out writes the sorted authors of the changed publications, as a
+    work list for re-alignment; it needs the full diff, not --hashes.
+    """
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    stashed_base, stashed_head = fstash.get_base_and_head_id()
+    base_md5 = fstash.resolve_md5(base) if base else stashed_base
+    head_md5 = fstash.resolve_md5(head) if head else stashed_head
+    base_file = fstash.get_stashed_file(base_md5) if base_md5 else None
+    head_file = fstash.get_stashed_file(head_md5) if head_md5 else None
+    if not base_file or not base_file.path or not head_file or not head_file.path:
+        print("Stashed base and head files are required; set them with `stash set-base/set-head`")
+        return
+
+    counts: t.Counter[str] = Counter()
+    if hashes and authors_out:
+        print("--authors-out needs the full diff; drop --hashes")
+        return
+
+    if hashes:
+        hashes_dirs = [fstash.publication_hashes_dir(base_file.md5), fstash.publication_hashes_dir(head_file.md5)]
+        changes = ReleaseDeltas(fstash.deltas_dir).changes(base_file.md5, head_file.md5)
+        if changes is None and not all(is_publication_hashes(d) for d in hashes_dirs):
+            print("Publication hashes of both releases are required; build them with `stash index`")
+            return
+        for uri, kind in changes or diff_publication_hashes(*[PublicationHashes(d) for d in hashes_dirs]):
+            counts[kind] += 1
+            out.write(json.dumps({"uri": uri, "kind": kind}) + "\n")
+        log.info(f"Publication changes: {dict(counts)}")
+        return
+
+    affected = AffectedAuthors()
+    for change in affected.collect(iter_offline_changes(base_file.path, head_file.path, tmp_dir, memory_mb << 20)):
+        counts[change.kind] += 1
+        out.write(json.dumps(change.to_json()) + "\n")
+    log.info(f"Subject changes: {dict(counts)}")
+    if authors_out:
+        log.info(f"Wrote {affected.write(authors_out):,} affected authors to {authors_out}")
+
+
+@stash.command()
+@click.pass_context
+@click.argument("publications", type=str, nargs=-1)
+@click.option("--base", type=str, help="MD5 prefix of the older release (default: stashed base)")
+@click.option("--head", type=str, help="MD5 prefix of the newer release (default: stashed head)")
+def lookup(ctx: Context, publications: t.Tuple[str], base: t.Optional[str], head: t.Optional[str]):
+    """Show whether publications (IRIs or dblp keys) are in the base and head
+    releases, from their key sets, without Fuseki.
+    """
+    assert (config := get_config(ctx))
+    fstash = FileStash(config)
+    stashed_base, stashed_head = fstash.get_base_and_head_id()
+    md5s = [fstash.resolve_md5(base) if base else stashed_base, fstash.resolve_md5(head) if head else stashed_head]
+    keys_dirs = [fstash.publication_keys_dir(md5) if md5 else "" for md5 in md5s]
+    if not all(is_publication_keys(d) for d in keys_dirs):
+        print("Publication keys of both releases are required; build them with `stash index`")
+        return
+
+    base_keys, head_keys = [PublicationKeys(d) for d in keys_dirs]
+    rows = [[pub, "yes" if pub in base_keys else "no", "yes" if pub in head_keys else "no"] for pub in publications]
+    print(format_table(["Publication", "In base", "In head"], rows))
@@ -4,11 +4,11 @@ import os
 import json
 
 from marshmallow import Schema, fields, post_load
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from dblp_service.lib.log import create_logger
 
-from .schemas import StrField
+from .schemas import IntField, StrField
 
 log = create_logger(__file__)
 
@@ -32,11 +32,34 @@ class OpenReviewSchema(Schema):
 @dataclass
 class ApacheJenaConfig:
     dbLocation: str
+    connectionUrl: str = "http://localhost:3030/ds"
+    poolSize: int = 8
+    maxConcurrency: int = 8
+    loaderExecutable: str = "tdb2.tdbloader"
+    loaderMode: str = "parallel"
+    loaderJvmArgs: str = "-Xmx8G"
+    startupTimeout: int = 120
+    queryCacheMaxBytes: int = 1 << 30
+    slowQueryMillis: int = 5000
+    queryTimeoutSeconds: int = 600  # 0 for no deadline
+    templateTimeoutSeconds: t.Dict[str, int] = field(
+        default_factory=lambda: {"diff-publications": 3600, "is-a-publication": 3600, "count-graph": 3600}
+    )
 
 
 class ApacheJenaConfigSchema(Schema):
     connectionUrl = StrField
     dbLocation = StrField
+    poolSize = IntField
+    maxConcurrency = IntField
+    loaderExecutable = StrField
+    loaderMode = StrField
+    loaderJvmArgs = StrField
+    startupTimeout = IntField
+    queryCacheMaxBytes = IntField
+    slowQueryMillis = IntField
+    queryTimeoutSeconds = IntField
+    templateTimeoutSeconds = fields.Dict(keys=fields.Str(), values=fields.Int())
 
     @post_load
     def make(self, data: t.Any, **_) -> ApacheJenaConfig:
@@ -0,0 +1,237 @@
+"""Author/publication adjacency for a dblp release, as memory-mapped CSR arrays.
+
+Listing an author's publications (?pub dblp:authoredBy <author>) is the hottest
+lookup in show-authorship and author alignment. The index answers it, and the
+reverse, without SPARQL:
+
+    stash/indexes/<md5>/authorship
+    ├── meta.json
+    ├── authors.bin, authors_offsets.npy     sorted author IRIs (see term_table.py)
+    ├── pubs.bin, pubs_offsets.npy           sorted publication IRIs
+    ├── author_offsets.npy, author_pubs.npy  publications of each author (CSR)
+    └── pub_offsets.npy, pub_authors.npy     authors of each publication (CSR)
+
+The publications of author i are author_pubs[author_offsets[i]:author_offsets[i+1]].
+
+Finding an author is a binary search over the author table; listing their
+publications is then O(degree).
+
+Indexes can be updated from release diffs without re-reading a dump: an
+AuthorshipDelta replaces the authors of a set of publications, and
+apply_authorship_delta rewrites the index in id space, inserting only the
+new terms. Publications which lose all their authors keep an (empty) entry.
+
+"""
+import dataclasses as dc
+import json
+from os import path
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.memory_store import DBLP_AUTHORED_BY, TripleSource
+from dblp_service.local_storage.ntriples import is_iri
+from dblp_service.local_storage.parallel_ingest import AuthorshipPairs, map_reduce_ntriples
+from dblp_service.local_storage.term_table import TermTable, replace_dir, staging_dir, write_term_table
+
+log = create_logger(__file__)
+
+INDEX_FORMAT = 1
+Authorship: t.TypeAlias = t.Tuple[str, str]  # (author IRI, publication IRI), without <>
+Ids: t.TypeAlias = npt.NDArray[np.uint32]
+
+
+def build_authorship_index(
+    rdf_file: str, index_dir: str, processes: t.Optional[int] = None, work_dir: t.Optional[str] = None
+) -> int:
+    """Build an authorship index from an N-Triples dump, returning the number of pairs.
+
+    The dump is read in parallel (see parallel_ingest.map_reduce_ntriples); a
+    gzipped dump is decompressed into work_dir first, or read in one process.
+    """
+    return write_authorship_index(map_reduce_ntriples(rdf_file, AuthorshipPairs(), processes, work_dir), index_dir)
+
+
+def write_authorship_index(pairs: t.Iterable[Authorship], index_dir: str) -> int:
+    unique = set(pairs)
+    authors = sorted({author for author, _ in unique})
+    pubs = sorted({pub for _, pub in unique})
+    author_ids = {author: i for i, author in enumerate(authors)}
+    pub_ids = {pub: i for i, pub in enumerate(pubs)}
+    edge_authors = np.fromiter((author_ids[a] for a, _ in unique), dtype=np.uint32, count=len(unique))
+    edge_pubs = np.fromiter((pub_ids[p] for _, p in unique), dtype=np.uint32, count=len(unique))
+
+    tmp_dir = staging_dir(index_dir)
+    write_term_table(tmp_dir, authors, 'authors')
+    write_term_table(tmp_dir, pubs, 'pubs')
+    write_csr_arrays(tmp_dir, edge_authors, edge_pubs, len(authors), len(pubs))
+    replace_dir(tmp_dir, index_dir)
+    return len(unique)
+
+
+def csr(rows: Ids, cols: Ids, row_count: int) -> t.Tuple[npt.NDArray[np.int64], Ids]:
+    """Offsets and column ids of the adjacency rows -> cols, with columns sorted within each row."""
+    order = np.lexsort((cols, rows))
+    offsets = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=offsets[1:])
+    return offsets, np.ascontiguousarray(cols[order])
+
+
+def write_csr_arrays(tmp_dir: str, edge_authors: Ids, edge_pubs: Ids, author_count: int, pub_count: int):
+    author_offsets, author_pubs = csr(edge_authors, edge_pubs, author_count)
+    pub_offsets, pub_authors = csr(edge_pubs, edge_authors, pub_count)
+    np.save(path.join(tmp_dir, 'author_offsets.npy'), author_offsets)
+    np.save(path.join(tmp_dir, 'author_pubs.npy'), author_pubs)
+    np.save(path.join(tmp_dir, 'pub_offsets.npy'), pub_offsets)
+    np.save(path.join(tmp_dir, 'pub_authors.npy'), pub_authors)
+
+    meta = {'format': INDEX_FORMAT, 'authors': author_count, 'pubs': pub_count, 'pairs': len(author_pubs)}
+    with open(path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def is_authorship_index(index_dir: str) -> bool:
+    return path.exists(path.join(index_dir, 'meta.json'))
+
+
+class AuthorshipIndex:
+    index_dir: str
+    authors: TermTable
+    pubs: TermTable
+    pair_count: int
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(path.join(index_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != INDEX_FORMAT:
+            raise Exception(f'Unsupported authorship index format {meta["format"]} in {index_dir}')
+        self.pair_count = meta['pairs']
+
+        def load(name: str) -> t.Any:
+            return np.load(path.join(index_dir, f'{name}.npy'), mmap_mode='r')
+
+        self.authors = TermTable(index_dir, 'authors')
+        self.pubs = TermTable(index_dir, 'pubs')
+        self.author_offsets: npt.NDArray[np.int64] = load('author_offsets')
+        self.author_pubs: Ids = load('author_pubs')
+        self.pub_offsets: npt.NDArray[np.int64] = load('pub_offsets')
+        self.pub_authors: Ids = load('pub_authors')
+
+    def __len__(self) -> int:
+        return self.pair_count
+
+    def publication_ids(self, authorURI: str) -> Ids:
+        author_id = self.authors.term_id(authorURI)
+        if author_id is None:
+            return np.zeros(0, dtype=np.uint32)
+        return self.author_pubs[self.author_offsets[author_id] : self.author_offsets[author_id + 1]]
+
+    def publications(self, authorURI: str) -> t.List[str]:
+        """The publications of an author, in sorted order."""
+        return [self.pubs.term(pub_id) for pub_id in self.publication_ids(authorURI).tolist()]
+
+    def authors_of(self, pubURI: str) -> t.List[str]:
+        """The authors of a publication, in sorted order."""
+        pub_id = self.pubs.term_id(pubURI)
+        if pub_id is None:
+            return []
+        ids = self.pub_authors[self.pub_offsets[pub_id] : self.pub_offsets[pub_id + 1]]
+        return [self.authors.term(author_id) for author_id in ids.tolist()]
+
+    def edge_ids(self) -> t.Tuple[Ids, Ids]:
+        """All pairs, as (author id, publication id) columns."""
+        degrees = np.diff(self.author_offsets)
+        edge_authors = np.repeat(np.arange(len(self.authors), dtype=np.uint32), degrees)
+        return edge_authors, np.asarray(self.author_pubs)
+
+    def pairs(self) -> t.Iterator[Authorship]:
+        edge_authors, edge_pubs = self.edge_ids()
+        for author_id, pub_id in zip(edge_authors.tolist(), edge_pubs.tolist()):
+            yield self.authors.term(author_id), self.pubs.term(pub_id)
+
+
+@dc.dataclass
+class AuthorshipDelta:
+    """Replace the authors of each publication in pubs with those given in pairs.
+
+    A publication in pubs with no pairs has been removed (or lost its authors).
+    """
+
+    pubs: t.Set[str] = dc.field(default_factory=set)
+    pairs: t.Set[Authorship] = dc.field(default_factory=set)
+
+    def __len__(self) -> int:
+        return len(self.pubs)
+
+
+def authorship_delta(source: TripleSource, pubs: t.Iterable[str]) -> AuthorshipDelta:
+    """Delta setting the authors of pubs to those found in source (e.g., the newer release)."""
+    delta = AuthorshipDelta()
+    for pub in pubs:
+        delta.pubs.add(pub)
+        for _, _, author in source.match(s=f'<{pub}>', p=DBLP_AUTHORED_BY):
+            if is_iri(author):
+                delta.pairs.add((author[1:-1], pub))
+    return delta
+
+
+def merge_term_table(table: TermTable, new_terms: t.Iterable[str], tmp_dir: str, name: str) -> t.Tuple[Ids, int]:
+    """Write table plus any new terms, as a new sorted table.
+
+    Returns (remap, added): remap[i] is the new id of old term i, and added is
+    the number of terms added. The old table is copied by byte range; only the
+    terms it is searched for are decoded.
+    """
+    added = sorted(term for term in set(new_terms) if table.term_id(term) is None)
+    points = np.array([table.insertion_point(term) for term in added], dtype=np.int64)
+    encoded = [term.encode('utf-8') for term in added]
+
+    with open(path.join(tmp_dir, f'{name}.bin'), 'wb') as f:
+        prev = 0
+        for point, term_bytes in zip(points.tolist(), encoded):
+            f.write(table.term_bytes[table.offsets[prev] : table.offsets[point]].tobytes())
+            f.write(term_bytes)
+            prev = point
+        f.write(table.term_bytes[table.offsets[prev] : table.offsets[len(table)]].tobytes())
+
+    lengths = np.insert(np.diff(table.offsets), points, [len(b) for b in encoded])
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    np.save(path.join(tmp_dir, f'{name}_offsets.npy'), offsets)
+
+    old_ids = np.arange(len(table), dtype=np.int64)
+    remap = (old_ids + np.searchsorted(points, old_ids, 'right')).astype(np.uint32)
+    return remap, len(added)
+
+
+def apply_authorship_delta(index: AuthorshipIndex, delta: AuthorshipDelta, index_dir: str) -> int:
+    """Write index, updated by delta, to index_dir and return the number of pairs.
+
+    index_dir may be index.index_dir, in which case index must not be used afterwards.
+    """
+    edge_authors, edge_pubs = index.edge_ids()
+    replaced = [pub_id for pub in delta.pubs if (pub_id := index.pubs.term_id(pub)) is not None]
+    keep = ~np.isin(edge_pubs, np.array(replaced, dtype=np.uint32))
+
+    tmp_dir = staging_dir(index_dir)
+    pairs = sorted(delta.pairs)
+    author_remap, added_authors = merge_term_table(index.authors, [a for a, _ in pairs], tmp_dir, 'authors')
+    pub_remap, added_pubs = merge_term_table(index.pubs, [p for _, p in pairs], tmp_dir, 'pubs')
+    author_count = len(author_remap) + added_authors
+    pub_count = len(pub_remap) + added_pubs
+
+    # ids of the delta's pairs, looked up in the tables just written
+    authors, pubs = TermTable(tmp_dir, 'authors'), TermTable(tmp_dir, 'pubs')
+    delta_authors = np.array([authors.term_id(a) for a, _ in pairs], dtype=np.uint32)
+    delta_pubs = np.array([pubs.term_id(p) for _, p in pairs], dtype=np.uint32)
+
+    all_authors = np.concatenate((author_remap[edge_authors[keep]], delta_authors))
+    all_pubs = np.concatenate((pub_remap[edge_pubs[keep]], delta_pubs))
+    write_csr_arrays(tmp_dir, all_authors, all_pubs, author_count, pub_count)
+    del authors, pubs
+    replace_dir(tmp_dir, index_dir)
+    log.info(f'Applied authorship delta for {len(delta)} publications: {len(all_authors):,} pairs')
+    return len(all_authors)
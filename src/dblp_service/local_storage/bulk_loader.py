@@ -0,0 +1,148 @@
+"""Offline bulk loading of stashed RDF dumps into the TDB2 database.
+
+Loading a full dump with  SPARQL `LOAD` streams every triple through Fuseki's
+transactional update path, which takes hours and holds the whole transaction in
+memory. The TDB2 bulk loader writes  the indexes directly, but needs exclusive
+access to the database, so no server may be running for the duration of the load:
+a server started by this process is stopped and restarted around it, while an
+external server must be stopped by whoever runs it.
+
+"""
+import dataclasses as dc
+import os
+import re
+import subprocess
+import time
+import typing as t
+
+from tqdm import tqdm
+
+from dblp_service.lib.config import ApacheJenaConfig, Config
+from dblp_service.lib.log import AppLogger, create_logger
+from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.local_storage.fuseki_context import FusekiServerManager
+from dblp_service.local_storage.graph_naming import DblpGraphName, md5_to_graph_name
+from dblp_service.local_storage.jena_db import JenaDB
+
+loader_progress = re.compile(r'Add: ([\d,]+)')
+loader_finished = re.compile(r'Finished: .*?([\d,]+) tuples in ([\d.]+)s')
+
+
+@dc.dataclass
+class LoadStats:
+    triples: int
+    seconds: float
+
+    def triples_per_second(self) -> float:
+        return self.triples / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f'{self.triples:,} triples in {self.seconds:.1f}s ({self.triples_per_second():,.0f} triples/sec)'
+
+
+class BulkLoader:
+    jena_config: ApacheJenaConfig
+    log: AppLogger
+
+    def __init__(self, jena_config: ApacheJenaConfig):
+        self.jena_config = jena_config
+        self.log = create_logger(self.__class__.__name__)
+
+    def loader_command(self, graph_name: DblpGraphName, rdf_file: str) -> t.List[str]:
+        graph_iri = graph_name.uri()[1:-1]
+        return [
+            self.jena_config.loaderExecutable,
+            f'--loader={self.jena_config.loaderMode}',
+            '--loc',
+            self.jena_config.dbLocation,
+            f'--graph={graph_iri}',
+            rdf_file,
+        ]
+
+    def load(self, graph_name: DblpGraphName, rdf_file: str) -> LoadStats:
+        """Run the bulk loader, reporting progress as it goes.
+
+        The database must not be in use by a running server.
+        """
+        cmd = self.loader_command(graph_name, rdf_file)
+        self.log.info(f'Running {" ".join(cmd)}')
+        env = dict(os.environ, JVM_ARGS=self.jena_config.loaderJvmArgs)
+
+        start = time.monotonic()
+        stats: t.Optional[LoadStats] = None
+        with subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, env=env
+        ) as process:
+            assert process.stdout is not None
+            with tqdm(unit=' triples', unit_scale=True, desc=graph_name.qname()) as progress:
+                for line in process.stdout:
+                    self.log.debug(f'tdbloader> {line.strip()}')
+                    if match := loader_progress.search(line):
+                        progress.update(int(match.group(1).replace(',', '')) - progress.n)
+                    elif match := loader_finished.search(line):
+                        stats = LoadStats(int(match.group(1).replace(',', '')), float(match.group(2)))
+
+        if process.returncode != 0:
+            raise Exception(f'Bulk loader exited with status {process.returncode}')
+
+        if stats is None:
+            stats = LoadStats(progress.n, time.monotonic() - start)
+        return stats
+
+
+async def bulk_load_stashed(
+    config: Config, md5_prefix: str, fuseki: t.Optional[FusekiServerManager] = None
+) -> t.Optional[LoadStats]:
+    """Bulk load a stashed RDF file into its DblpGraphName.
+
+    The loader needs exclusive access to the database. A server spawned by
+    this process (fuseki) is stopped for the load and started again after
+    it; an external server cannot be stopped from here, so the load is
+    refused while one is answering. Once the load completes a server is
+    used to confirm the graph is available.
+    """
+    log = create_logger('bulk_load_stashed')
+    fstash = FileStash(config)
+    if (md5 := fstash.resolve_md5(md5_prefix)) is None:
+        return None
+
+    stashed_file = fstash.get_stashed_file(md5)
+    if stashed_file is None or stashed_file.path is None:
+        log.warn(f'Stashed id found but no file located. md5={md5}')
+        return None
+
+    graph_name = md5_to_graph_name(md5)
+    loader = BulkLoader(config.jena)
+    fuseki = fuseki or FusekiServerManager.from_config(config.jena, attach=False)
+    restart = fuseki.spawned()
+    if restart:
+        log.info(f'Stopping the Fuseki server at {fuseki.server_url} started by this process for the bulk load')
+        await fuseki.stop()
+    elif await fuseki.ping():
+        log.error(
+            f'An external Fuseki server at {fuseki.server_url}, not started by this process, holds the database;'
+            ' stop it before bulk loading'
+        )
+        return None
+
+    try:
+        stats = loader.load(graph_name, stashed_file.path)
+        log.info(f'Loaded {graph_name.qname()}: {stats}')
+    finally:
+        if restart:
+            await fuseki.start()
+
+    def record_loaded_graph():
+        jenadb = JenaDB.from_config(config)
+        if graph_name in jenadb.get_named_graphs(rescan=True):
+            jenadb.record_graph(graph_name, stashed_file.path)
+        else:
+            log.error(f'Graph {graph_name.qname()} not found after bulk load')
+
+    if restart:
+        record_loaded_graph()
+    else:
+        async with fuseki:
+            record_loaded_graph()
+
+    return stats
@@ -0,0 +1,383 @@
+"""Read-only, memory-mapped columnar store for a frozen dblp release.
+
+A stashed N-Triples dump is streamed once and written as:
+
+    service-root.d
+    └── stash
+        └── indexes
+            └── <md5>
+                ├── triples
+                │   ├── meta.json
+                │   ├── terms.bin                          sorted utf-8 terms, concatenated
+                │   ├── terms_offsets.npy                  int64 start of each term, plus the end
+                │   ├── spo_s.npy, spo_p.npy, spo_o.npy    triples as term ids, sorted by (s, p, o)
+                │   └── pos_p.npy, pos_o.npy, pos_s.npy    the same triples, sorted by (p, o, s)
+                ├── authorship                             (see authorship_index.py)
+                ├── pub-hashes                             (see services/publication_hashes.py)
+                └── pub-keys                               (see services/publication_keys.py)
+
+Every term (IRI, literal or blank node, in N-Triples syntax) is replaced by its
+rank in the sorted term table, so ids compare as their terms do. A lookup by
+subject, or by predicate and object, is a binary search over the memory-mapped
+columns, which touches only the pages it needs; opening a store reads nothing
+but meta.json. Each triple takes 24 bytes (six uint32 columns), plus its share
+of the term table.
+
+The build does not hold the terms in memory: each term occurrence is sorted,
+with its position, by an external sort (external_sort.py) within a memory
+budget, which yields the term table in order and the id of every occurrence.
+The ids are written to a memory-mapped column under the staging directory, and
+sorted from there; sorting takes 8 bytes of RAM per triple for the order, plus
+one 4-byte column at a time.
+
+"""
+from array import array
+import dataclasses as dc
+import json
+import os
+from os import path
+import time
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.authorship_index import AuthorshipIndex
+from dblp_service.local_storage.external_sort import ExternalSorter, run_directory
+from dblp_service.local_storage.graph_naming import DblpGraphName, DiffGraphName, GraphName
+from dblp_service.local_storage.memory_store import (
+    DBLP_PUBLICATION,
+    RDF_TYPE,
+    author_publication_term_rows,
+    publication_plain_rows,
+)
+from dblp_service.local_storage.ntriples import Triple, read_ntriple_batches
+from dblp_service.local_storage.rdf_backend import KeyRange, RdfBackend
+from dblp_service.local_storage.sparql_client import Row
+from dblp_service.local_storage.term_table import TermTable, replace_dir, staging_dir, write_term_table
+
+log = create_logger(__file__)
+
+STORE_FORMAT = 1
+TRIPLES_DIR = 'triples'
+AUTHORSHIP_DIR = 'authorship'
+PUB_HASHES_DIR = 'pub-hashes'
+PUB_KEYS_DIR = 'pub-keys'
+DEFAULT_MEMORY_BUDGET = 1 << 30
+RANK_BATCH_SIZE = 1 << 20
+TermIds: t.TypeAlias = npt.NDArray[np.uint32]
+
+spo_columns = ['spo_s', 'spo_p', 'spo_o']
+pos_columns = ['pos_p', 'pos_o', 'pos_s']
+
+
+@dc.dataclass
+class ColumnarStats:
+    triples: int
+    terms: int
+    seconds: float
+
+    def __str__(self) -> str:
+        return f'{self.triples:,} triples, {self.terms:,} terms in {self.seconds:.1f}s'
+
+
+def build_columnar_store(
+    rdf_file: str,
+    store_dir: str,
+    tmp_dir: t.Optional[str] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> ColumnarStats:
+    """Stream an N-Triples file (optionally gzipped) into a columnar store.
+
+    The store is written to a temporary sibling directory and renamed into place,
+    so store_dir either holds a complete store or does not exist.
+
+    Args:
+        tmp_dir: where the term sort spills its runs (default: the system temp directory)
+        memory_budget: approximate bytes of terms buffered before spilling
+    """
+    if not rdf_file.endswith(('.nt', '.nt.gz')):
+        raise Exception(f'Columnar stores are built from N-Triples (.nt, .nt.gz) only, not {rdf_file}')
+    start = time.perf_counter()
+    staging = staging_dir(store_dir)
+    with run_directory(tmp_dir) as run_dir:
+        # Each term occurrence is sorted with its position in the flat (s, p, o, s, ...) column
+        sorter = ExternalSorter(run_dir, memory_budget)
+        positions = 0
+        for batch in read_ntriple_batches(rdf_file):
+            for triple in batch:
+                for term in triple:
+                    sorter.add(term, str(positions))
+                    positions += 1
+            log.debug(f'Read {positions // 3:,} triples')
+
+        raw_file = path.join(staging, 'raw.npy')
+        raw = np.lib.format.open_memmap(raw_file, mode='w+', dtype=np.uint32, shape=(positions,))
+        term_count = write_term_table(staging, rank_terms(sorter.items(), raw))
+        raw.flush()
+        del raw
+
+    triples = np.load(raw_file, mmap_mode='r').reshape(-1, 3)
+    triple_count = write_sorted_columns(triples, staging)
+    del triples
+    os.remove(raw_file)
+
+    stats = ColumnarStats(triple_count, term_count, time.perf_counter() - start)
+    meta = {'format': STORE_FORMAT, 'source': path.basename(rdf_file), 'triples': stats.triples, 'terms': stats.terms}
+    with open(path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    replace_dir(staging, store_dir)
+    return stats
+
+
+def rank_terms(items: t.Iterable[t.Tuple[str, str]], raw: TermIds) -> t.Iterator[str]:
+    """Yield the distinct terms of sorted (term, position) items, setting
+    raw[position] to the rank of each term occurrence."""
+    term: t.Optional[str] = None
+    rank = -1
+    batch_positions = array('q')
+    batch_ranks = array('I')
+
+    def flush():
+        raw[np.frombuffer(batch_positions, dtype=np.int64)] = np.frombuffer(batch_ranks, dtype=np.uint32)
+        del batch_positions[:], batch_ranks[:]
+
+    for key, position in items:
+        if key != term:
+            term = key
+            rank += 1
+            yield term
+        batch_positions.append(int(position))
+        batch_ranks.append(rank)
+        if len(batch_positions) >= RANK_BATCH_SIZE:
+            flush()
+    if batch_positions:
+        flush()
+
+
+def write_sorted_columns(triples: TermIds, store_dir: str) -> int:
+    """Write the distinct rows of an (n, 3) array of term ids as the spo and pos
+    columns, gathering one column at a time; returns the number of rows written."""
+    spo_order = np.lexsort((triples[:, 2], triples[:, 1], triples[:, 0]))
+    # duplicate triples are adjacent once sorted; keep the first of each
+    distinct = np.zeros(len(spo_order), dtype=bool)
+    distinct[:1] = True
+    for column in range(3):
+        sorted_column = triples[spo_order, column]
+        distinct[1:] |= sorted_column[1:] != sorted_column[:-1]
+        del sorted_column
+    spo_order = spo_order[distinct]
+    del distinct
+    for column, name in enumerate(spo_columns):
+        np.save(path.join(store_dir, f'{name}.npy'), triples[spo_order, column])
+    del spo_order
+
+    spo = [np.load(path.join(store_dir, f'{name}.npy'), mmap_mode='r') for name in spo_columns]
+    pos_order = np.lexsort((spo[0], spo[2], spo[1]))
+    for column, name in zip([1, 2, 0], pos_columns):
+        np.save(path.join(store_dir, f'{name}.npy'), spo[column][pos_order])
+    return len(pos_order)
+
+
+def is_columnar_store(store_dir: str) -> bool:
+    return path.exists(path.join(store_dir, 'meta.json'))
+
+
+class ColumnarStore:
+    """A read-only graph over a store written by build_columnar_store."""
+
+    store_dir: str
+    triple_count: int
+    term_count: int
+    terms: TermTable
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(path.join(store_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != STORE_FORMAT:
+            raise Exception(f'Unsupported columnar store format {meta["format"]} in {store_dir}')
+        self.triple_count = meta['triples']
+        self.term_count = meta['terms']
+
+        def load(name: str) -> t.Any:
+            return np.load(path.join(store_dir, f'{name}.npy'), mmap_mode='r')
+
+        self.terms = TermTable(store_dir)
+        self.spo: t.List[TermIds] = [load(name) for name in spo_columns]
+        self.pos: t.List[TermIds] = [load(name) for name in pos_columns]
+
+    def __len__(self) -> int:
+        return self.triple_count
+
+    def term(self, term_id: int) -> str:
+        return self.terms.term(term_id)
+
+    def term_id(self, term: str) -> t.Optional[int]:
+        return self.terms.term_id(term)
+
+    def match_ids(
+        self, s: t.Optional[int] = None, p: t.Optional[int] = None, o: t.Optional[int] = None
+    ) -> t.Tuple[TermIds, TermIds, TermIds]:
+        """Return the (s, p, o) id columns of all triples matching the bound ids."""
+        if s is not None:
+            lo, hi = narrow(self.spo[0], s, 0, self.triple_count)
+            if p is not None:
+                lo, hi = narrow(self.spo[1], p, lo, hi)
+                if o is not None:
+                    lo, hi = narrow(self.spo[2], o, lo, hi)
+            found = [column[lo:hi] for column in self.spo]
+            if o is not None and p is None:
+                keep = found[2] == o
+                found = [column[keep] for column in found]
+            return found[0], found[1], found[2]
+
+        if p is not None:
+            lo, hi = narrow(self.pos[0], p, 0, self.triple_count)
+            if o is not None:
+                lo, hi = narrow(self.pos[1], o, lo, hi)
+            p_ids, o_ids, s_ids = [column[lo:hi] for column in self.pos]
+            return s_ids, p_ids, o_ids
+
+        if o is not None:
+            # no OSP order is kept; scan the object column
+            keep = np.flatnonzero(self.spo[2] == o)
+            return self.spo[0][keep], self.spo[1][keep], self.spo[2][keep]
+
+        return self.spo[0], self.spo[1], self.spo[2]
+
+    def match(
+        self, s: t.Optional[str] = None, p: t.Optional[str] = None, o: t.Optional[str] = None
+    ) -> t.Iterator[Triple]:
+        """Yield matching triples as terms (see memory_store.TripleSource)."""
+        ids: t.List[t.Optional[int]] = []
+        for term in [s, p, o]:
+            term_id = self.term_id(term) if term is not None else None
+            if term is not None and term_id is None:
+                return
+            ids.append(term_id)
+
+        s_ids, p_ids, o_ids = self.match_ids(*ids)
+        for s_id, p_id, o_id in zip(s_ids.tolist(), p_ids.tolist(), o_ids.tolist()):
+            yield self.term(s_id), self.term(p_id), self.term(o_id)
+
+    def subject_ids(self, p: str, o: str) -> TermIds:
+        """Ids of all subjects of (?s p o), in sorted (i.e., term) order."""
+        p_id, o_id = self.term_id(p), self.term_id(o)
+        if p_id is None or o_id is None:
+            return np.zeros(0, dtype=np.uint32)
+        s_ids, _, _ = self.match_ids(p=p_id, o=o_id)
+        return s_ids
+
+    def subjects(self, p: str, o: str) -> t.List[str]:
+        return [self.term(s_id) for s_id in self.subject_ids(p, o).tolist()]
+
+
+def narrow(column: TermIds, value: int, lo: int, hi: int) -> t.Tuple[int, int]:
+    """Narrow [lo, hi) of a column sorted within that range to the rows equal to value."""
+    window = column[lo:hi]
+    return lo + int(np.searchsorted(window, value, 'left')), lo + int(np.searchsorted(window, value, 'right'))
+
+
+def merge_difference(xs: t.Iterator[str], ys: t.Iterator[str]) -> t.Iterator[str]:
+    """Yield items of sorted xs which are not in sorted ys."""
+    y = next(ys, None)
+    for x in xs:
+        while y is not None and y < x:
+            y = next(ys, None)
+        if y != x:
+            yield x
+
+
+class ColumnarBackend(RdfBackend):
+    """Serve frozen dblp graphs from columnar stores under index_root.
+
+    load_graph builds the store for an N-Triples file, if it has not already been
+    built, and opens it along with the graph's authorship index, if one was built
+    (see authorship_index.py), which then serves author publication lookups.
+    The stores are read-only, so diff graphs cannot be created.
+    """
+
+    index_root: str
+    stores: t.Dict[str, ColumnarStore]
+    authorship: t.Dict[str, AuthorshipIndex]
+
+    def __init__(self, index_root: str):
+        self.index_root = index_root
+        self.stores = {}
+        self.authorship = {}
+        self.max_concurrency = 4
+
+    def graph_dir(self, graph_name: GraphName) -> str:
+        if isinstance(graph_name, DblpGraphName):
+            return path.join(self.index_root, graph_name.md5)
+        return path.join(self.index_root, graph_name.qname().replace('/', '-'))
+
+    def attach(self, graph_name: GraphName, graph_dir: str):
+        """Open the stores built under graph_dir (see the module docstring for the layout)."""
+        uri = graph_name.uri()[1:-1]
+        self.stores[uri] = ColumnarStore(path.join(graph_dir, TRIPLES_DIR))
+        authorship_dir = path.join(graph_dir, AUTHORSHIP_DIR)
+        if path.exists(path.join(authorship_dir, 'meta.json')):
+            self.authorship[uri] = AuthorshipIndex(authorship_dir)
+
+    def store(self, graph_name: GraphName) -> ColumnarStore:
+        uri = graph_name.uri()[1:-1]
+        if uri not in self.stores:
+            raise Exception(f'Graph {graph_name.qname()} has not been loaded')
+        return self.stores[uri]
+
+    def named_graphs(self) -> t.List[str]:
+        return list(self.stores)
+
+    def load_graph(self, graph_name: GraphName, rdf_file: str):
+        graph_dir = self.graph_dir(graph_name)
+        store_dir = path.join(graph_dir, TRIPLES_DIR)
+        if not is_columnar_store(store_dir):
+            log.info(f'Building columnar store for {rdf_file}')
+            log.info(str(build_columnar_store(rdf_file, store_dir)))
+        self.attach(graph_name, graph_dir)
+
+    def count_graph(self, graph_name: GraphName) -> t.Tuple[int, int]:
+        store = self.store(graph_name)
+        return len(store), len(store.subject_ids(RDF_TYPE, DBLP_PUBLICATION))
+
+    def _publication_terms(self, graph_name: GraphName) -> t.Iterator[str]:
+        store = self.store(graph_name)
+        for s_id in store.subject_ids(RDF_TYPE, DBLP_PUBLICATION).tolist():
+            yield store.term(s_id)
+
+    def publications(self, graph_name: GraphName) -> t.Iterator[str]:
+        for pub in self._publication_terms(graph_name):
+            yield pub[1:-1]
+
+    def diff_publications(self, graph1: GraphName, graph2: GraphName) -> t.Iterator[str]:
+        # Each store has its own ids, but ids follow term order, so both
+        # publication lists come out sorted and can be merged.
+        for pub in merge_difference(self._publication_terms(graph1), self._publication_terms(graph2)):
+            yield pub[1:-1]
+
+    def publication_rows(self, graph_name: GraphName, pubURIs: t.List[str]) -> t.Iterator[Row]:
+        return publication_plain_rows(self.store(graph_name), pubURIs)
+
+    def create_diff_graph(
+        self, graph1: GraphName, graph2: GraphName, diff_graph: DiffGraphName, key_range: t.Optional[KeyRange] = None
+    ):
+        raise Exception('Columnar stores are read-only; diff graphs need Fuseki or MemoryBackend')
+
+    def copy_graph(self, source: GraphName, target: GraphName):
+        raise Exception('Columnar stores are read-only; attach the store of each release instead')
+
+    def patch_graph(self, graph_name: GraphName, deletes: t.List[Triple], adds: t.List[Triple]):
+        raise Exception('Columnar stores are read-only; rebuild the store from the patched release instead')
+
+    def author_publication_rows(self, authorURIs: t.List[str], graph: t.Optional[GraphName] = None) -> t.Iterator[Row]:
+        uris = [graph.uri()[1:-1]] if graph else list(self.stores)
+        for uri in uris:
+            if uri not in self.stores:
+                raise Exception(f'Graph <{uri}> has not been loaded')
+            authorship = self.authorship.get(uri)
+            publications_of = authorship.publications if authorship else None
+            yield from author_publication_term_rows(self.stores[uri], authorURIs, publications_of)
@@ -0,0 +1,112 @@
+"""External sort of (key, value) lines within a memory budget.
+
+Sorted runs of at most the memory budget are spilled to a temporary directory,
+and then merged with heapq.merge, so streams far larger than memory (e.g., the
+triples of a full dblp dump, keyed by subject or term) come out in key order.
+Used by the offline diff (services/offline_diff.py), the publication hashes and
+key sets, and the columnar store build.
+
+Each pair is one line of a run, key and value joined by '\x00'. Keys and values
+may hold any character (literals may hold raw tabs): characters up to '\x0b'
+are escaped as '\x0b' followed by the character shifted up by 0x20, which
+keeps their relative order and leaves the separator and the line's '\n' below
+every escaped character, so lines still sort by (key, value). Runs are read
+and written with newline='\n', so a raw '\r' does not end a line either.
+
+"""
+from contextlib import contextmanager
+import heapq
+from itertools import groupby
+import os
+from os import path
+import re
+import shutil
+import tempfile
+import typing as t
+
+# Rough per-entry overhead of a buffered str, beyond its characters
+ENTRY_OVERHEAD = 64
+
+KeyValue: t.TypeAlias = t.Tuple[str, str]
+
+SEPARATOR = '\x00'
+ESCAPE = '\x0b'
+escape_table = str.maketrans({chr(c): f'{ESCAPE}{chr(c + 0x20)}' for c in range(ord(ESCAPE) + 1)})
+escaped_re = re.compile(f'{ESCAPE}(.)', re.DOTALL)
+
+
+def escape(s: str) -> str:
+    return s.translate(escape_table)
+
+
+def unescape(s: str) -> str:
+    if ESCAPE not in s:
+        return s
+    return escaped_re.sub(lambda m: chr(ord(m.group(1)) - 0x20), s)
+
+
+class ExternalSorter:
+    """Sort (key, value) pairs within a memory budget, spilling sorted runs to disk.
+
+    Pairs are ordered by key, then value.
+    """
+
+    run_dir: str
+    memory_budget: int
+    buffer: t.List[str]
+    buffered_bytes: int
+    runs: t.List[str]
+
+    def __init__(self, run_dir: str, memory_budget: int):
+        self.run_dir = run_dir
+        self.memory_budget = memory_budget
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.runs = []
+
+    def add(self, key: str, value: str):
+        # SEPARATOR sorts before any character of an escaped key, so lines sort by (key, value)
+        line = f'{escape(key)}{SEPARATOR}{escape(value)}\n'
+        self.buffer.append(line)
+        self.buffered_bytes += len(line) + ENTRY_OVERHEAD
+        if self.buffered_bytes >= self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort()
+        run_file = path.join(self.run_dir, f'run-{id(self):x}-{len(self.runs)}.txt')
+        with open(run_file, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(self.buffer)
+        self.runs.append(run_file)
+        self.buffer = []
+        self.buffered_bytes = 0
+
+    def items(self) -> t.Iterator[KeyValue]:
+        """Stream all pairs in sorted order; the sorter may not be added to afterwards."""
+        self.buffer.sort()
+        files = [open(run, encoding='utf-8', newline='\n') for run in self.runs]
+        try:
+            for line in heapq.merge(self.buffer, *files):
+                key, value = line[:-1].split(SEPARATOR, 1)
+                yield unescape(key), unescape(value)
+        finally:
+            for f in files:
+                f.close()
+
+    def groups(self) -> t.Iterator[t.Tuple[str, t.List[str]]]:
+        """Stream (key, values) for each key, in key order."""
+        for key, pairs in groupby(self.items(), key=lambda kv: kv[0]):
+            yield key, [value for _, value in pairs]
+
+
+@contextmanager
+def run_directory(tmp_dir: t.Optional[str]) -> t.Iterator[str]:
+    if tmp_dir:
+        os.makedirs(tmp_dir, exist_ok=True)
+    run_dir = tempfile.mkdtemp(prefix='dblp-sort-', dir=tmp_dir)
+    try:
+        yield run_dir
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
@@ -9,6 +9,17 @@ Stash directory structure is e.g.,
         │   │   └── dblp-l222.ttl
         │   └── ffe98a7f2f4ca496a4e25295e8117dac
         │       └── dblp-l338.ttl
+        ├── indexes
+        │   └── ed2c3d520c332d8e4e6d5b9446eb51d4
+        │       ├── triples      (see columnar_store.py)
+        │       ├── authorship   (see authorship_index.py)
+        │       ├── pub-hashes   (see services/publication_hashes.py)
+        │       ├── pub-keys     (see services/publication_keys.py)
+        │       └── work-*       (while indexing: the decompressed dump, for parallel reads; see parallel_ingest.py)
+        ├── deltas
+        │   └── ed2c3d520c332d8e4e6d5b9446eb51d4-ffe98a7f2f4ca496a4e25295e8117dac
+        │                        (see services/release_deltas.py)
+        ├── checkpoints          (progress of diff graph materialization; see services/chunked_diff.py)
         └── stash-index.json
 
 """
@@ -28,6 +39,7 @@ from dblp_service.lib.log import create_logger
 from dblp_service.lib.tables import format_table
 from dblp_service.dblp_org.dblp_rdf_catalog import DblpOrgFileFetcher, DblpRdfCatalog, DblpRdfFile
 from dblp_service.dblp_org.fetch_dblp_files import get_file_md5
+from dblp_service.local_storage.columnar_store import AUTHORSHIP_DIR, PUB_HASHES_DIR, PUB_KEYS_DIR, TRIPLES_DIR
 from shutil import copyfile
 
 
@@ -59,6 +71,9 @@ class FileStash:
     root_dir: str
     downloads_dir: str
     imports_dir: str
+    indexes_dir: str
+    deltas_dir: str
+    checkpoints_dir: str
     index_file: str
     dblp_file_fetcher: DblpOrgFileFetcher
 
@@ -69,6 +84,9 @@ class FileStash:
         self.root_dir = path.join(service_root, 'stash')
         self.downloads_dir = path.join(self.root_dir, 'downloads')
         self.imports_dir = path.join(self.root_dir, 'imports')
+        self.indexes_dir = path.join(self.root_dir, 'indexes')
+        self.deltas_dir = path.join(self.root_dir, 'deltas')
+        self.checkpoints_dir = path.join(self.root_dir, 'checkpoints')
         self.index_file = path.join(self.root_dir, 'stash-index.json')
         self.dblp_file_fetcher = DblpOrgFileFetcher()
 
@@ -166,7 +184,7 @@ class FileStash:
                 return replace(stash_index, base_version=md5)
 
         # md5_matches = [v.md5 for v in catalog.get_archived_releases() if v.md5.startswith(md5)]
-        md5_matches = [stashed_md5 for stashed_md5 in self.get_all_stashed_md5s() if stashed_md5.startswith(md5)]
+        md5_matches = self.match_md5_prefix(md5)
 
         num_matches = len(md5_matches)
 
@@ -191,6 +209,33 @@ class FileStash:
             return sindex.base_version, sindex.head_version
         return None, None
 
+    def match_md5_prefix(self, md5_prefix: str) -> t.List[str]:
+        return sorted({md5 for md5 in self.get_all_stashed_md5s() if md5.startswith(md5_prefix)})
+
+    def resolve_md5(self, md5_prefix: str) -> t.Optional[str]:
+        """Expand an MD5 prefix to the single stashed MD5 it matches, if any."""
+        md5_matches = self.match_md5_prefix(md5_prefix)
+        if len(md5_matches) != 1:
+            self.log.warning(f'MD5 prefix {md5_prefix} matched {len(md5_matches)} stashed files')
+            return None
+        return md5_matches[0]
+
+    def index_dir(self, md5: str) -> str:
+        """Directory holding the indexes built from a stashed file."""
+        return path.join(self.indexes_dir, md5)
+
+    def triple_store_dir(self, md5: str) -> str:
+        return path.join(self.index_dir(md5), TRIPLES_DIR)
+
+    def authorship_index_dir(self, md5: str) -> str:
+        return path.join(self.index_dir(md5), AUTHORSHIP_DIR)
+
+    def publication_hashes_dir(self, md5: str) -> str:
+        return path.join(self.index_dir(md5), PUB_HASHES_DIR)
+
+    def publication_keys_dir(self, md5: str) -> str:
+        return path.join(self.index_dir(md5), PUB_KEYS_DIR)
+
     def get_stashed_file(self, md5: str) -> t.Optional[StashedFile]:
         for f in self.get_stashed_files():
             if f.md5 == md5:
@@ -1,3 +1,4 @@
+import asyncio
 import subprocess
 import threading
 from typing import Optional
@@ -5,37 +6,94 @@ import typing as t
 import os
 import signal
 import re
+import time
+from urllib.parse import urlsplit
 
+import requests
+
+from dblp_service.lib.config import ApacheJenaConfig
 from dblp_service.lib.log import AppLogger, create_logger
 
 
+def server_root_url(connection_url: str) -> str:
+    """Strip the dataset path from a SPARQL endpoint URL.
+    e.g., http://localhost:3030/ds -> http://localhost:3030
+    """
+    parts = urlsplit(connection_url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
 class FusekiServerManager:
+    """Provide a Fuseki server for the duration of an async context.
+
+    If a server is already answering on server_url (and attach is True), it is
+    reused and left running on exit. Otherwise a new server is spawned and
+    terminated on exit.
+    """
+
     startup_event: threading.Event
+    process: t.Optional[subprocess.Popen[str]]
+    thread: t.Optional[threading.Thread]
+    attached: bool
     log: AppLogger
 
     def __init__(
         self,
         fuseki_executable: str = 'fuseki-server',
         db_location: Optional[str] = None,
+        *,
+        server_url: str = 'http://localhost:3030',
+        attach: bool = True,
+        startup_timeout: float = 120.0,
+        poll_interval: float = 0.1,
     ):
         self.fuseki_executable = fuseki_executable
         self.db_location = db_location
+        self.server_url = server_url
+        self.attach = attach
+        self.startup_timeout = startup_timeout
+        self.poll_interval = poll_interval
         self.process = None
+        self.thread = None
+        self.attached = False
         self.db_dir = None
         self.startup_event = threading.Event()
         self.log = create_logger(self.__class__.__name__)
 
+    @classmethod
+    def from_config(cls, jena_config: ApacheJenaConfig, *, attach: bool = True) -> 'FusekiServerManager':
+        return cls(
+            db_location=jena_config.dbLocation,
+            server_url=server_root_url(jena_config.connectionUrl),
+            attach=attach,
+            startup_timeout=jena_config.startupTimeout,
+        )
+
     def _echo_output(self, stream: t.Any):
         """Echo subprocess output to stdout."""
         for line in iter(stream.readline, ''):
             subp_line = str(line).strip()
             self.log.debug(f'fuseki-server> {subp_line}')
             if re.search(':: Started ', subp_line):
-                print('Fuseki server ready...')
                 self.startup_event.set()
 
+    def _ping(self) -> bool:
+        try:
+            response = requests.get(f'{self.server_url}/$/ping', timeout=1.0)
+            return response.ok
+        except requests.exceptions.RequestException:
+            return False
 
-    async def __aenter__(self):
+    def spawned(self) -> bool:
+        """Whether this manager started the server, which is still running."""
+        return self.process is not None and self.process.poll() is None
+
+    async def ping(self) -> bool:
+        """Check whether a Fuseki server is answering on server_url."""
+        return await asyncio.to_thread(self._ping)
+
+    async def start(self):
+        """Spawn fuseki-server and wait until it is ready to answer requests."""
         cmd = [self.fuseki_executable, '--update']
         if self.db_location is None:
             cmd.append('--mem')
@@ -45,9 +103,13 @@ class FusekiServerManager:
                 os.makedirs(db_path)
             cmd.extend(['--loc', db_path])
 
+        if (port := urlsplit(self.server_url).port) is not None:
+            cmd.extend(['--port', str(port)])
+
         cmd.append('/ds')
 
         os.environ['FUSEKI_BASE'] = 'fuseki.run.d'
+        self.startup_event.clear()
         self.process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -61,19 +123,59 @@ class FusekiServerManager:
         # Start a thread to echo the output
         self.thread = threading.Thread(target=self._echo_output, args=(self.process.stdout,))
         self.thread.start()
-        self.startup_event.wait()
+        await self._await_ready()
 
-        return self
+    async def _await_ready(self):
+        """Poll until the server is up, without blocking the event loop.
 
-    async def __aexit__(self, exc_type: t.Any, exc_value: object, traceback: object):
-        print('Fuseki exiting')
-        # Terminate the Fuseki server process
+        Readiness is signalled by either the ':: Started' log line or a
+        successful ping, so a change in the log format cannot hang startup.
+        """
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            assert self.process is not None
+            if (status := self.process.poll()) is not None:
+                await self.stop()
+                raise Exception(f'fuseki-server exited during startup with status {status}')
+
+            if self.startup_event.is_set() or await self.ping():
+                print('Fuseki server ready...')
+                return
+
+            await asyncio.sleep(self.poll_interval)
+
+        await self.stop()
+        raise TimeoutError(f'fuseki-server not ready after {self.startup_timeout}s')
+
+    async def stop(self):
+        """Terminate a server started by this manager, releasing the TDB2 database.
+
+        An attached server is left running.
+        """
         if self.process:
-            os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
-            self.process.wait()
+            print('Fuseki exiting')
+            # Terminate the Fuseki server process
+            if self.process.poll() is None:
+                os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
+            await asyncio.to_thread(self.process.wait)
+            self.process = None
 
-        # Wait for the output thread to finish
-        self.thread.join()
+        # Wait for the output thread to finish, without blocking the event loop
+        if self.thread:
+            await asyncio.to_thread(self.thread.join)
+            self.thread = None
+
+    async def __aenter__(self):
+        if self.attach and await self.ping():
+            self.log.info(f'Attached to running Fuseki server at {self.server_url}')
+            self.attached = True
+            return self
+
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type: t.Any, exc_value: object, traceback: object):
+        await self.stop()
 
         # Clean up the temporary directory if used
         if self.db_dir:
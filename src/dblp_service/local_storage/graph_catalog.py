@@ -0,0 +1,177 @@
+"""Record the graphs loaded into JenaDB, with their sizes and provenance.
+
+Listing graphs with `SELECT ?g WHERE {GRAPH ?g { }}` scans the quad index, and
+counting their triples scans  every triple,  which is slow on a store  holding
+hundreds of millions of quads. Instead, counts are computed once, when a graph
+is loaded or created, and kept in a catalog file:
+
+    service-root.d
+    └── jena
+        └── graph-catalog.json
+
+The catalog also holds aliases, stable logical names (e.g., 'active') which
+resolve to a loaded dblp graph. A new release is loaded into its own graph
+alongside the current one, then the alias is flipped to it. Since the whole
+catalog is rewritten with an atomic rename, readers see either the old or the
+new target, never a half-loaded graph, and no triples are copied.
+
+"""
+import dataclasses as dc
+from datetime import datetime
+from os import path
+import os
+import typing as t
+
+import marshmallow_dataclass as mmdc
+from marshmallow import Schema
+import marshmallow as mm
+
+from dblp_service.lib.config import Config
+from dblp_service.lib.log import create_logger
+from dblp_service.lib.tables import format_table
+from dblp_service.local_storage.graph_naming import GraphName, uri_to_graph_name
+
+
+@mmdc.dataclass
+class GraphCatalogEntry:
+    qname: str
+    source_md5: t.Optional[str]
+    triple_count: int
+    publication_count: int
+    loaded_at: str  # iso format
+    source_size: t.Optional[int]  # bytes
+
+    Schema: t.ClassVar[t.Type[mm.Schema]] = Schema
+
+    def graph_name(self) -> GraphName:
+        return uri_to_graph_name(self.qname)
+
+
+ACTIVE_ALIAS = 'active'
+PREVIOUS_ALIAS = 'previous'
+
+
+@mmdc.dataclass
+class GraphCatalogIndex:
+    graphs: t.List[GraphCatalogEntry] = dc.field(default_factory=list)
+    aliases: t.Dict[str, str] = dc.field(default_factory=dict)  # alias -> qname
+
+    Schema: t.ClassVar[t.Type[mm.Schema]] = Schema
+
+
+def graph_catalog_file(config: Config) -> str:
+    return path.join(config.dblpServiceRoot, 'jena', 'graph-catalog.json')
+
+
+def now_isoformat() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class GraphCatalog:
+    catalog_file: str
+
+    log = create_logger('GraphCatalog')
+
+    def __init__(self, catalog_file: str):
+        self.catalog_file = catalog_file
+
+    def read_index(self) -> GraphCatalogIndex:
+        if not path.exists(self.catalog_file):
+            return GraphCatalogIndex()
+
+        with open(self.catalog_file, 'r') as f:
+            index: GraphCatalogIndex = GraphCatalogIndex.Schema().loads(f.read())
+            return index
+
+    def write_index(self, index: GraphCatalogIndex) -> None:
+        """Write the catalog, atomically replacing any previous version."""
+        os.makedirs(path.dirname(self.catalog_file), exist_ok=True)
+        content = GraphCatalogIndex.Schema().dumps(index)
+        tmp_file = f'{self.catalog_file}.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(content)
+        os.replace(tmp_file, self.catalog_file)
+
+    def exists(self) -> bool:
+        return path.exists(self.catalog_file)
+
+    def entries(self) -> t.List[GraphCatalogEntry]:
+        return self.read_index().graphs
+
+    def get_entry(self, graph_name: GraphName) -> t.Optional[GraphCatalogEntry]:
+        for entry in self.entries():
+            if entry.qname == graph_name.qname():
+                return entry
+        return None
+
+    def record(self, entry: GraphCatalogEntry) -> None:
+        index = self.read_index()
+        graphs = [g for g in index.graphs if g.qname != entry.qname]
+        graphs.append(entry)
+        self.write_index(dc.replace(index, graphs=graphs))
+
+    def remove(self, graph_name: GraphName) -> None:
+        index = self.read_index()
+        qname = graph_name.qname()
+        aliased = [alias for alias, target in index.aliases.items() if target == qname]
+        if aliased:
+            raise Exception(f'Graph {qname} is the target of alias(es) {", ".join(aliased)}')
+        graphs = [g for g in index.graphs if g.qname != qname]
+        self.write_index(dc.replace(index, graphs=graphs))
+
+    def aliases(self) -> t.Dict[str, str]:
+        return self.read_index().aliases
+
+    def resolve_alias(self, alias: str) -> t.Optional[GraphName]:
+        qname = self.aliases().get(alias)
+        return uri_to_graph_name(qname) if qname else None
+
+    def swap_alias(
+        self,
+        graph_name: GraphName,
+        alias: str = ACTIVE_ALIAS,
+        previous_alias: t.Optional[str] = PREVIOUS_ALIAS,
+    ) -> t.Optional[GraphName]:
+        """Point alias at a cataloged graph, returning the graph it pointed at before.
+
+        If previous_alias is given, it is updated to the old target in the same
+        write, so a rollover can be undone by swapping back.
+        """
+        index = self.read_index()
+        qname = graph_name.qname()
+        if not any(g.qname == qname for g in index.graphs):
+            raise Exception(f'Cannot alias {alias} to {qname}: graph is not in the catalog')
+
+        aliases = dict(index.aliases)
+        prior = aliases.get(alias)
+        aliases[alias] = qname
+        if previous_alias and prior and prior != qname:
+            aliases[previous_alias] = prior
+
+        self.write_index(dc.replace(index, aliases=aliases))
+        self.log.info(f'Alias {alias}: {prior} -> {qname}')
+        return uri_to_graph_name(prior) if prior else None
+
+    def graph_names(self) -> t.List[GraphName]:
+        return [entry.graph_name() for entry in self.entries()]
+
+    def create_report(self) -> str:
+        index = self.read_index()
+        aliases_by_graph: t.Dict[str, t.List[str]] = {}
+        for alias, qname in sorted(index.aliases.items()):
+            aliases_by_graph.setdefault(qname, []).append(alias)
+
+        headers = ['Graph', 'Aliases', 'Source MD5', 'Triples', 'Publications', 'Loaded', 'Size (MB)']
+        rows = [
+            [
+                entry.qname,
+                ', '.join(aliases_by_graph.get(entry.qname, [])),
+                entry.source_md5[:6] if entry.source_md5 else '-',
+                f'{entry.triple_count:,}',
+                f'{entry.publication_count:,}',
+                entry.loaded_at[:16],
+                f'{entry.source_size / 1e6:,.1f}' if entry.source_size is not None else '-',
+            ]
+            for entry in index.graphs
+        ]
+        return format_table(headers, rows)
@@ -101,7 +101,6 @@ def uri_to_graph_name(uri: str) -> GraphName:
     http_start = re.compile('^http://[^/]+/')
     if http_start.match(uri):
         [_, uri_tail] = http_start.split(uri)
-        print(f'uri= {uri}, uri_tail = {uri_tail}')
         return qname_path_to_graph_name(uri_tail.split('/'))
 
     path = [p for p in uri.split('/') if len(p) > 0]
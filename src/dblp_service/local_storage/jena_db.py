@@ -1,54 +1,190 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
-
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
 import typing as t
 
 from dblp_service.lib.config import Config
 from dblp_service.lib.filesys import ensure_directory
 from dblp_service.lib.log import AppLogger, create_logger
 from dblp_service.local_storage.fuseki_context import FusekiServerManager
-from dblp_service.local_storage.graph_naming import GraphName, uri_to_graph_name
+from dblp_service.local_storage.graph_catalog import (
+    ACTIVE_ALIAS,
+    GraphCatalog,
+    GraphCatalogEntry,
+    graph_catalog_file,
+    now_isoformat,
+)
+from dblp_service.local_storage.graph_naming import DblpGraphName, GraphName, uri_to_graph_name
+from dblp_service.local_storage.query_metrics import QueryMetrics
+from dblp_service.local_storage.rdf_backend import FusekiBackend, RdfBackend
+from dblp_service.local_storage.sparql_client import Row, SparqlClient, get_sparql_client
 
 
 class JenaDB:
-    log: AppLogger
+    """Named graphs held in a storage backend: Fuseki by default, or any other
+    RdfBackend (e.g., memory_store.MemoryBackend). Raw SPARQL calls
+    (run_sparql_query etc.) need the Fuseki backend."""
 
-    def __init__(self):
+    log: AppLogger
+    backend: RdfBackend
+    catalog: t.Optional[GraphCatalog]
+
+    def __init__(
+        self,
+        client: t.Optional[SparqlClient] = None,
+        catalog: t.Optional[GraphCatalog] = None,
+        backend: t.Optional[RdfBackend] = None,
+    ):
         self.log = create_logger(self.__class__.__name__)
+        self.backend = backend if backend else FusekiBackend(client if client else get_sparql_client())
+        self.catalog = catalog
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'JenaDB':
+        return cls(get_sparql_client(), GraphCatalog(graph_catalog_file(config)))
+
+    @property
+    def client(self) -> SparqlClient:
+        if not isinstance(self.backend, FusekiBackend):
+            raise Exception(f'{type(self.backend).__name__} does not run SPARQL')
+        return self.backend.client
+
+    def get_named_graphs(self, rescan: bool = False) -> t.List[GraphName]:
+        """List graphs from the catalog, if there is one, else by scanning the store."""
+        if self.catalog and self.catalog.exists() and not rescan:
+            return self.catalog.graph_names()
 
-    def get_named_graphs(self) -> t.List[GraphName]:
-        query = """ SELECT ?g WHERE {GRAPH ?g { }} """
-        graph_names = [r for [r] in self.run_sparql_query(query)]
-        return [uri_to_graph_name(g) for g in graph_names]
+        return [uri_to_graph_name(g) for g in self.backend.named_graphs()]
 
-    def run_sparql_query(self, query: str):
+    @property
+    def metrics(self) -> QueryMetrics:
+        return self.client.metrics
+
+    def run_sparql_query(self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None):
+        """Run a query, returning rows of values. Raises QueryTimeout if it runs past
+        its deadline (timeout in seconds, else the template's or default deadline)."""
         self.log.debug(f'Running query `{query}`')
-        try:
-            sparql = SPARQLWrapper('http://localhost:3030/' 'ds')
-            sparql.setReturnFormat(JSON)
-            sparql.setQuery(query)
-            sparql.setMethod('GET')
-            ret: t.Any = sparql.queryAndConvert()
-            return unwrap_query_vars(ret)
-        except:
-            raise
-
-    def run_sparql_update(self, query: str):
-        try:
-            self.log.debug(f'Running update `{query}`')
-            sparql = SPARQLWrapper('http://localhost:3030/' 'ds')
-            sparql.setReturnFormat(JSON)
-            sparql.setQuery(query)
-            sparql.setMethod('POST')
-            ret: t.Any = sparql.queryAndConvert()
-            return ret
-        except:
-            raise
+        ret: t.Any = self.client.query(query, template, timeout)
+        return unwrap_query_vars(ret)
+
+    def iter_sparql_query(
+        self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None
+    ) -> t.Iterator[Row]:
+        """Like run_sparql_query, but rows are streamed and yielded lazily."""
+        self.log.debug(f'Streaming query `{query}`')
+        return self.client.query_rows(query, template, timeout)
+
+    def run_sparql_update(self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None) -> int:
+        self.log.debug(f'Running update `{query}`')
+        return self.client.update(query, template, timeout)
 
     def load_graph(self, graph_name: GraphName, rdf_file: str):
         """Load the RDF file into a named graph."""
-        file_uri = f'<file://{rdf_file}>'
-        results = self.run_sparql_update(f'LOAD {file_uri} INTO GRAPH {graph_name.uri()}')
-        assert results['statusCode'] == 200
+        self.backend.load_graph(graph_name, rdf_file)
+        self.record_graph(graph_name, rdf_file)
+
+    def count_graph(self, graph_name: GraphName) -> t.Tuple[int, int]:
+        """Count (triples, publications) in a graph."""
+        return self.backend.count_graph(graph_name)
+
+    def record_graph(self, graph_name: GraphName, rdf_file: t.Optional[str] = None):
+        """Count a newly loaded, created or patched graph and record it in the catalog."""
+        if not self.catalog:
+            return
+
+        triples, pubs = self.count_graph(graph_name)
+        self.catalog.record(
+            GraphCatalogEntry(
+                qname=graph_name.qname(),
+                source_md5=graph_name.md5 if isinstance(graph_name, DblpGraphName) else None,
+                triple_count=triples,
+                publication_count=pubs,
+                loaded_at=now_isoformat(),
+                source_size=os.path.getsize(rdf_file) if rdf_file else None,
+            )
+        )
+
+    def active_graph(self, alias: str = ACTIVE_ALIAS) -> t.Optional[GraphName]:
+        """The graph alias points at, or None if it is unset."""
+        return self.catalog.resolve_alias(alias) if self.catalog else None
+
+    def resolve_alias(self, alias: str = ACTIVE_ALIAS) -> GraphName:
+        """Resolve a logical graph name (e.g., 'active') to the graph it points at."""
+        graph_name = self.active_graph(alias)
+        if not graph_name:
+            raise Exception(f'Graph alias {alias} is not set')
+        return graph_name
+
+    def activate_graph(self, graph_name: GraphName, alias: str = ACTIVE_ALIAS) -> t.Optional[GraphName]:
+        """Flip alias to a fully loaded graph, returning the graph it replaced.
+
+        Replaces copying the new release over a fixed 'current' graph (ADD, DROP,
+        ADD), which copied every triple twice and exposed an empty graph mid-way.
+        The previous target stays loaded, under the 'previous' alias, until pruned.
+        The graph is counted in the store first, so an alias never points at a
+        graph which was dropped, or never loaded, whatever the catalog says.
+        """
+        if not self.catalog:
+            raise Exception('Graph aliases require a graph catalog')
+        _, pubs = self.count_graph(graph_name)
+        if not pubs:
+            raise Exception(f'Cannot alias {alias} to {graph_name.qname()}: graph holds no publications')
+        return self.catalog.swap_alias(graph_name, alias)
+
+
+A = t.TypeVar('A')
+P = t.ParamSpec('P')
+
+
+class AsyncJenaDB:
+    """Asyncio front-end to JenaDB which keeps up to `concurrency` requests in
+    flight against one Fuseki server.
+
+    The SPARQL calls themselves are blocking; they run on a dedicated thread
+    pool sized to the semaphore, so  awaiting many queries at once fills
+    Fuseki's worker threads rather than waiting on one response at a time.
+    """
+
+    jenadb: JenaDB
+    concurrency: int
+    log: AppLogger
+
+    def __init__(self, jenadb: t.Optional[JenaDB] = None, *, concurrency: t.Optional[int] = None):
+        self.jenadb = jenadb if jenadb else JenaDB()
+        self.concurrency = concurrency if concurrency else self.jenadb.backend.max_concurrency
+        self.log = create_logger(self.__class__.__name__)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='jena')
+
+    async def call(self, fn: t.Callable[P, A], *args: P.args, **kwargs: P.kwargs) -> A:
+        """Run a blocking JenaDB operation under the concurrency limit."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def run_query(
+        self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None
+    ) -> t.List[t.List[t.Any]]:
+        return await self.call(self.jenadb.run_sparql_query, query, template, timeout)
+
+    async def run_update(self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None) -> int:
+        return await self.call(self.jenadb.run_sparql_update, query, template, timeout)
+
+    async def load_graph(self, graph_name: GraphName, rdf_file: str):
+        await self.call(self.jenadb.load_graph, graph_name, rdf_file)
+
+    async def run_queries(self, queries: t.Iterable[str]) -> t.List[t.List[t.List[t.Any]]]:
+        """Fan out many queries at once, returning results in query order."""
+        return await asyncio.gather(*[self.run_query(q) for q in queries])
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type: t.Any, exc_value: object, traceback: object):
+        self.close()
 
 
 def unwrap_query_vars(queryReturn: t.Any) -> t.List[t.List[t.Any]]:
@@ -76,22 +212,14 @@ async def init_db(config: Config):
         print('could not initialize db')
         return
 
-    async with FusekiServerManager(db_location=dbloc):
-        pass
-
-
-# - Rename the database 'current-dblp' to 'prev-dblp'
-# ADD GRAPH <current-dblp> TO GRAPH <prev-dblp>
-#
-# # Drop the old 'current-dblp'
-# DROP GRAPH <current-dblp>
-#
-## Copy 'updated-dblp' to 'current-dblp'
-# ADD GRAPH <updated-dblp> TO GRAPH <current-dblp>
-#
-# Drop the old 'updated-dblp'
-# DROP GRAPH <updated-dblp>
-# - Rename the database 'updated-dblp' to 'current-dblp'
+    async with FusekiServerManager.from_config(config.jena):
+        jenadb = JenaDB.from_config(config)
+        print(f'Jena db: {dbloc}')
+        if jenadb.catalog and jenadb.catalog.exists():
+            print(jenadb.catalog.create_report())
+        else:
+            for graph_name in jenadb.get_named_graphs():
+                print(graph_name.qname())
 
 
 # async def load_named_graph(ttl_file: str, graph: str, /, db_location: t.Optional[str] = None):
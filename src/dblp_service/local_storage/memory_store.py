@@ -0,0 +1,277 @@
+"""In-process triple store implementing RdfBackend, for tests and small experiments.
+
+Each named  graph is held in three  nested-dict indexes, so that a  pattern with
+any combination of bound terms is answered by hash lookups:
+
+    spo: subject -> predicate -> {objects}
+    pos: predicate -> object -> {subjects}
+    osp: object -> subject -> {predicates}
+
+Terms are stored in N-Triples syntax (see ntriples.py). Graphs are loaded from
+N-Triples files; blank node labels are scoped to the load, as in Fuseki, so the
+same label in two files names two different nodes.
+
+"""
+import typing as t
+
+from dblp_service.local_storage.graph_naming import DiffGraphName, GraphName
+from dblp_service.local_storage.ntriples import Triple, is_blank, read_ntriples
+from dblp_service.local_storage.rdf_backend import KeyRange, RdfBackend, in_key_range
+from dblp_service.local_storage.sparql_client import Row, decode_tsv_term
+
+RDF_TYPE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>'
+DBLP_PUBLICATION = '<https://dblp.org/rdf/schema#Publication>'
+DBLP_AUTHORED_BY = '<https://dblp.org/rdf/schema#authoredBy>'
+
+Index: t.TypeAlias = t.Dict[str, t.Dict[str, t.Set[str]]]
+
+
+class TripleSource(t.Protocol):
+    """A graph which can be searched by triple pattern, with terms in N-Triples syntax."""
+
+    def match(
+        self, s: t.Optional[str] = None, p: t.Optional[str] = None, o: t.Optional[str] = None
+    ) -> t.Iterator[Triple]:
+        ...
+
+    def subjects(self, p: str, o: str) -> t.Iterable[str]:
+        ...
+
+
+def publication_term_rows(source: TripleSource, sub: str) -> t.Iterator[t.List[t.Optional[str]]]:
+    """Rows [sub, pred, obj, bpred, bobj] for one publication, mirroring the four
+    UNION branches of rdf_backend.publication_tuple_patterns."""
+    for _, pred, obj in source.match(s=sub):
+        if not is_blank(obj):
+            yield [sub, pred, obj, None, None]
+            continue
+        for _, bpred, bobj in source.match(s=obj):
+            yield [sub, pred, obj, bpred, bobj]
+        for _, _, btype in source.match(s=obj, p=RDF_TYPE):
+            yield [sub, pred, obj, '"isA"', btype]
+    for _, _, type_ in source.match(s=sub, p=RDF_TYPE):
+        yield [sub, '"isA"', type_, None, None]
+
+
+def publication_plain_rows(source: TripleSource, pubURIs: t.List[str]) -> t.Iterator[Row]:
+    """Rows [sub, pred, obj, bpred, bobj] with plain values, as returned by
+    RdfBackend.publication_rows."""
+    for pubURI in pubURIs:
+        for row in publication_term_rows(source, f'<{pubURI}>'):
+            yield [decode_tsv_term(term) if term else None for term in row]
+
+
+def author_publication_term_rows(
+    source: TripleSource,
+    authorURIs: t.List[str],
+    publications_of: t.Optional[t.Callable[[str], t.Iterable[str]]] = None,
+) -> t.Iterator[Row]:
+    """Rows [author, sub, pred, obj, bpred, bobj] with plain values, as returned
+    by RdfBackend.author_publication_rows.
+
+    publications_of(authorURI) may list an author's publications (as plain IRIs)
+    from an index; otherwise they are found in source.
+    """
+    for authorURI in authorURIs:
+        if publications_of:
+            subs = [f'<{pub}>' for pub in publications_of(authorURI)]
+        else:
+            subs = sorted(source.subjects(DBLP_AUTHORED_BY, f'<{authorURI}>'))
+        for sub in subs:
+            for row in publication_term_rows(source, sub):
+                yield [authorURI] + [decode_tsv_term(term) if term else None for term in row]
+
+
+def index_add(index: Index, a: str, b: str, c: str):
+    index.setdefault(a, {}).setdefault(b, set()).add(c)
+
+
+def index_discard(index: Index, a: str, b: str, c: str):
+    cs = index[a][b]
+    cs.discard(c)
+    if not cs:
+        del index[a][b]
+        if not index[a]:
+            del index[a]
+
+
+class TripleIndex:
+    """The triples of one graph, indexed by SPO, POS and OSP."""
+
+    spo: Index
+    pos: Index
+    osp: Index
+    size: int
+
+    def __init__(self):
+        self.spo = {}
+        self.pos = {}
+        self.osp = {}
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, triple: Triple) -> bool:
+        s, p, o = triple
+        return o in self.spo.get(s, {}).get(p, ())
+
+    def add(self, s: str, p: str, o: str):
+        if (s, p, o) in self:
+            return
+        index_add(self.spo, s, p, o)
+        index_add(self.pos, p, o, s)
+        index_add(self.osp, o, s, p)
+        self.size += 1
+
+    def discard(self, s: str, p: str, o: str):
+        if (s, p, o) not in self:
+            return
+        index_discard(self.spo, s, p, o)
+        index_discard(self.pos, p, o, s)
+        index_discard(self.osp, o, s, p)
+        self.size -= 1
+
+    def match(
+        self, s: t.Optional[str] = None, p: t.Optional[str] = None, o: t.Optional[str] = None
+    ) -> t.Iterator[Triple]:
+        """Yield all triples matching the bound terms (None matches anything)."""
+        if s is not None:
+            by_pred = self.spo.get(s, {})
+            preds = [p] if p is not None else list(by_pred)
+            for pred in preds:
+                objs = by_pred.get(pred, set())
+                if o is not None:
+                    if o in objs:
+                        yield s, pred, o
+                else:
+                    for obj in objs:
+                        yield s, pred, obj
+        elif p is not None:
+            by_obj = self.pos.get(p, {})
+            objs = [o] if o is not None else list(by_obj)
+            for obj in objs:
+                for sub in by_obj.get(obj, set()):
+                    yield sub, p, obj
+        elif o is not None:
+            for sub, preds in self.osp.get(o, {}).items():
+                for pred in preds:
+                    yield sub, pred, o
+        else:
+            for sub, by_pred in self.spo.items():
+                for pred, objs in by_pred.items():
+                    for obj in objs:
+                        yield sub, pred, obj
+
+    def subjects(self, p: str, o: str) -> t.Set[str]:
+        return self.pos.get(p, {}).get(o, set())
+
+
+class MemoryBackend(RdfBackend):
+    graphs: t.Dict[str, TripleIndex]
+    loads: int
+
+    def __init__(self):
+        self.graphs = {}
+        self.loads = 0
+        self.max_concurrency = 1
+
+    def graph(self, graph_name: GraphName) -> TripleIndex:
+        """The triples of a graph, for reading; a graph which was never written is empty."""
+        index = self.graphs.get(graph_name.uri()[1:-1])
+        return index if index is not None else TripleIndex()
+
+    def writable_graph(self, graph_name: GraphName) -> TripleIndex:
+        """The triples of a graph, created if need be, for the load and update paths."""
+        return self.graphs.setdefault(graph_name.uri()[1:-1], TripleIndex())
+
+    def scoped_graphs(self, graph_name: t.Optional[GraphName]) -> t.List[TripleIndex]:
+        return [self.graph(graph_name)] if graph_name else list(self.graphs.values())
+
+    def named_graphs(self) -> t.List[str]:
+        return [uri for uri, index in self.graphs.items() if len(index)]
+
+    def add_triples(self, graph_name: GraphName, triples: t.Iterable[Triple]):
+        """Add triples to a graph, scoping blank node labels to this call."""
+        self.loads += 1
+        scope = f'_:l{self.loads}x'
+        index = self.writable_graph(graph_name)
+        for s, p, o in triples:
+            if is_blank(s):
+                s = scope + s[2:]
+            if is_blank(o):
+                o = scope + o[2:]
+            index.add(s, p, o)
+
+    def load_graph(self, graph_name: GraphName, rdf_file: str):
+        if not rdf_file.endswith(('.nt', '.nt.gz')):
+            raise Exception(f'MemoryBackend loads N-Triples (.nt, .nt.gz) only, not {rdf_file}')
+        self.add_triples(graph_name, read_ntriples(rdf_file))
+
+    def count_graph(self, graph_name: GraphName) -> t.Tuple[int, int]:
+        index = self.graph(graph_name)
+        return len(index), len(index.subjects(RDF_TYPE, DBLP_PUBLICATION))
+
+    def _publications(self, graph_name: GraphName) -> t.Set[str]:
+        return self.graph(graph_name).subjects(RDF_TYPE, DBLP_PUBLICATION)
+
+    def publications(self, graph_name: GraphName) -> t.Iterator[str]:
+        for pub in sorted(self._publications(graph_name)):
+            yield pub[1:-1]
+
+    def diff_publications(self, graph1: GraphName, graph2: GraphName) -> t.Iterator[str]:
+        for pub in sorted(self._publications(graph1) - self._publications(graph2)):
+            yield pub[1:-1]
+
+    def publication_rows(self, graph_name: GraphName, pubURIs: t.List[str]) -> t.Iterator[Row]:
+        return publication_plain_rows(self.graph(graph_name), pubURIs)
+
+    def create_diff_graph(
+        self, graph1: GraphName, graph2: GraphName, diff_graph: DiffGraphName, key_range: t.Optional[KeyRange] = None
+    ):
+        index = self.writable_graph(diff_graph)
+        for pub in self._publications(graph1) - self._publications(graph2):
+            if in_key_range(pub[1:-1], key_range):
+                index.add(pub, RDF_TYPE, DBLP_PUBLICATION)
+
+    def copy_graph(self, source: GraphName, target: GraphName):
+        # blank node labels are kept, so the copy shares its nodes with source, as in Fuseki
+        index = TripleIndex()
+        for s, p, o in self.graph(source).match():
+            index.add(s, p, o)
+        self.graphs[target.uri()[1:-1]] = index
+
+    def patch_graph(self, graph_name: GraphName, deletes: t.List[Triple], adds: t.List[Triple]):
+        index = self.writable_graph(graph_name)
+        blank_refs: t.Dict[str, t.List[t.Tuple[str, str]]] = {}
+        blank_tuples: t.Dict[str, t.List[t.Tuple[str, str]]] = {}
+        for s, p, o in deletes:
+            if is_blank(s):
+                blank_tuples.setdefault(s, []).append((p, o))
+            elif is_blank(o):
+                blank_refs.setdefault(o, []).append((s, p))
+            else:
+                index.discard(s, p, o)
+
+        for label in blank_refs.keys() | blank_tuples.keys():
+            refs, tuples = blank_refs.get(label, []), blank_tuples.get(label, [])
+            # the nodes matching the deleted pattern, as in rdf_backend.patch_graph_update
+            nodes = {o for s, p in refs[:1] for _, _, o in index.match(s=s, p=p)} if refs else set(index.spo)
+            matches = [
+                node
+                for node in nodes
+                if is_blank(node)
+                and all((s, p, node) in index for s, p in refs)
+                and all((node, p, o) in index for p, o in tuples)
+            ]
+            for node in matches:
+                for s, p in refs:
+                    index.discard(s, p, node)
+                for p, o in tuples:
+                    index.discard(node, p, o)
+
+        self.add_triples(graph_name, adds)
+
+    def author_publication_rows(self, authorURIs: t.List[str], graph: t.Optional[GraphName] = None) -> t.Iterator[Row]:
+        for index in self.scoped_graphs(graph):
+            yield from author_publication_term_rows(index, authorURIs)
@@ -0,0 +1,138 @@
+"""Streaming N-Triples reader.
+
+Terms are kept in their N-Triples  syntax (e.g., '<https://dblp.org/rec/x>',
+'"Curvedness"@en', '_:b0'), which  keeps IRIs, literals and blank nodes apart
+without wrapping each term in an object. The plain value of a term is given by
+sparql_client.decode_tsv_term, as SPARQL TSV results use the same syntax.
+
+Reading a full dump (dblp.nt.gz) is bound by decompression and parsing, so:
+
+ - gzipped files are decompressed by an external process (pigz, igzip or gzip,
+   whichever is found first), which runs in parallel with parsing; Python's
+   gzip module is the fallback.
+ - text is read in large chunks of whole lines, and each chunk is parsed by a
+   single regex scan, yielding batches of (s, p, o) tuples. Only a chunk which
+   does not parse cleanly (comments, blank or invalid lines) is re-read line by
+   line, to skip comments and report the invalid line.
+
+read_ntriple_batches is the batch API; read_ntriples streams single triples.
+
+"""
+from contextlib import contextmanager
+import gzip
+import io
+import re
+import shutil
+import subprocess
+import typing as t
+
+Triple: t.TypeAlias = t.Tuple[str, str, str]
+
+iri = r'<[^<>"{}|^`\\\s]*>'
+blank = r'_:[A-Za-z0-9_][A-Za-z0-9_\-.]*'
+literal = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"(?:@[A-Za-z]+(?:-[A-Za-z0-9]+)*|\^\^' + iri + r')?'
+triple_re = re.compile(rf'\s*({iri}|{blank})\s*({iri})\s*({iri}|{blank}|{literal})\s*\.\s*$')
+# the same pattern, matching every line of a chunk
+chunk_triple_re = re.compile(
+    rf'^[ \t]*({iri}|{blank})[ \t]*({iri})[ \t]*({iri}|{blank}|{literal})[ \t]*\.[ \t]*$', re.MULTILINE
+)
+
+# External decompressors, in order of preference
+decompressors = [['pigz', '-dc'], ['igzip', '-dc'], ['gzip', '-dc']]
+
+CHUNK_CHARS = 1 << 22
+
+
+def parse_ntriples_line(line: str) -> t.Optional[Triple]:
+    """Parse one line, returning None for blank lines and comments."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#'):
+        return None
+
+    m = triple_re.match(stripped)
+    if not m:
+        raise Exception(f'Invalid N-Triples line: {line!r}')
+    return m.group(1), m.group(2), m.group(3)
+
+
+def parse_ntriples_chunk(chunk: str) -> t.List[Triple]:
+    """Parse a chunk of whole lines."""
+    triples: t.List[Triple] = chunk_triple_re.findall(chunk)
+    if len(triples) == chunk.count('\n') + (not chunk.endswith('\n')):
+        return triples
+    return [triple for line in chunk.splitlines() if (triple := parse_ntriples_line(line)) is not None]
+
+
+def decompress_command() -> t.Optional[t.List[str]]:
+    for command in decompressors:
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+@contextmanager
+def open_ntriples(file_path: str) -> t.Iterator[t.TextIO]:
+    """Open an N-Triples file as text, decompressing it if it ends with .gz"""
+    if not file_path.endswith('.gz'):
+        with open(file_path, 'rt', encoding='utf-8') as f:
+            yield f
+        return
+
+    command = decompress_command()
+    if not command:
+        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+            yield f
+        return
+
+    proc = subprocess.Popen(command + [file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert proc.stdout and proc.stderr
+    finished = False
+    try:
+        yield io.TextIOWrapper(proc.stdout, encoding='utf-8')
+        finished = True
+    finally:
+        if not finished:
+            proc.kill()
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode('utf-8', 'replace').strip()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise Exception(f'{command[0]} failed on {file_path} ({returncode}): {stderr}')
+
+
+def iter_line_chunks(f: t.TextIO, chunk_chars: int = CHUNK_CHARS) -> t.Iterator[str]:
+    """Read text in chunks of about chunk_chars, split at line ends."""
+    remainder = ''
+    while chunk := f.read(chunk_chars):
+        end = chunk.rfind('\n')
+        if end < 0:
+            remainder += chunk
+            continue
+        yield remainder + chunk[: end + 1]
+        remainder = chunk[end + 1 :]
+    if remainder:
+        yield remainder
+
+
+def read_ntriple_batches(file_path: str, chunk_chars: int = CHUNK_CHARS) -> t.Iterator[t.List[Triple]]:
+    """Stream the triples of an N-Triples file (gzipped if it ends with .gz) in
+    batches, one per chunk of about chunk_chars characters."""
+    with open_ntriples(file_path) as f:
+        for chunk in iter_line_chunks(f, chunk_chars):
+            if triples := parse_ntriples_chunk(chunk):
+                yield triples
+
+
+def read_ntriples(file_path: str) -> t.Iterator[Triple]:
+    """Stream the triples of an N-Triples file, gzipped if it ends with .gz"""
+    for batch in read_ntriple_batches(file_path):
+        yield from batch
+
+
+def is_blank(term: str) -> bool:
+    return term.startswith('_:')
+
+
+def is_iri(term: str) -> bool:
+    return term.startswith('<')
@@ -0,0 +1,240 @@
+"""Map a reducer over the triples of an N-Triples dump on every core.
+
+A plain (uncompressed) N-Triples file is cut into byte-range shards, each
+starting just after a line end, so every line falls in exactly one shard.
+Worker processes each fold the triples of their shards into a partial result
+with a TripleReducer, and the partial results are merged in shard order:
+
+    state = reducer.init()
+    state = reducer.step_batch(state, triples)   # for each batch in a shard
+    result = reducer.merge(result, state)        # for each shard, in order
+
+gzip streams cannot be split, so a .gz dump is first decompressed once into a
+work directory (plain_ntriples), or, without one, reduced in a single process.
+
+Reducers are pickled to the workers, so they must be defined at module level.
+
+"""
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses as dc
+import os
+from os import path
+import typing as t
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.memory_store import DBLP_AUTHORED_BY, DBLP_PUBLICATION, RDF_TYPE
+from dblp_service.local_storage.ntriples import (
+    CHUNK_CHARS,
+    Triple,
+    is_iri,
+    open_ntriples,
+    parse_ntriples_chunk,
+    read_ntriple_batches,
+)
+
+log = create_logger(__file__)
+
+S = t.TypeVar('S')
+ByteRange: t.TypeAlias = t.Tuple[int, int]
+
+SHARDS_PER_PROCESS = 4
+
+
+class TripleReducer(ABC, t.Generic[S]):
+    @abstractmethod
+    def init(self) -> S:
+        """A new, empty partial result."""
+
+    @abstractmethod
+    def step(self, state: S, triple: Triple) -> S:
+        """Fold one triple into a partial result."""
+
+    @abstractmethod
+    def merge(self, state1: S, state2: S) -> S:
+        """Combine the partial results of two consecutive runs of triples."""
+
+    def step_batch(self, state: S, triples: t.List[Triple]) -> S:
+        """Fold a batch of triples; override to avoid a call per triple."""
+        for triple in triples:
+            state = self.step(state, triple)
+        return state
+
+
+def plain_ntriples(rdf_file: str, work_dir: str) -> str:
+    """Return an uncompressed copy of an N-Triples file, decompressing it into work_dir if needed."""
+    if not rdf_file.endswith('.gz'):
+        return rdf_file
+
+    plain_file = path.join(work_dir, path.basename(rdf_file)[: -len('.gz')])
+    if path.exists(plain_file) and path.getmtime(plain_file) >= path.getmtime(rdf_file):
+        return plain_file
+
+    log.info(f'Decompressing {rdf_file} to {plain_file}')
+    os.makedirs(work_dir, exist_ok=True)
+    tmp_file = f'{plain_file}.tmp'
+    with open_ntriples(rdf_file) as f, open(tmp_file, 'w', encoding='utf-8') as out:
+        while chunk := f.read(CHUNK_CHARS):
+            out.write(chunk)
+    os.replace(tmp_file, plain_file)
+    return plain_file
+
+
+def byte_shards(file_path: str, shard_count: int) -> t.List[ByteRange]:
+    """Split a file into at most shard_count byte ranges, each ending at a line end (or EOF)."""
+    size = path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, shard_count):
+            f.seek(max(size * i // shard_count, bounds[-1]))
+            f.readline()
+            if (pos := f.tell()) >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def read_shard_batches(file_path: str, shard: ByteRange, chunk_bytes: int = CHUNK_CHARS) -> t.Iterator[t.List[Triple]]:
+    """Stream the triples of one shard in batches."""
+    start, end = shard
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remainder = b''
+        while (pos := f.tell()) < end:
+            block = remainder + f.read(min(chunk_bytes, end - pos))
+            cut = block.rfind(b'\n') + 1 if f.tell() < end else len(block)
+            block, remainder = block[:cut], block[cut:]
+            if triples := parse_ntriples_chunk(block.decode('utf-8')):
+                yield triples
+
+
+def reduce_shard(reducer: TripleReducer[S], file_path: str, shard: ByteRange) -> S:
+    state = reducer.init()
+    for batch in read_shard_batches(file_path, shard):
+        state = reducer.step_batch(state, batch)
+    return state
+
+
+def map_reduce_ntriples(
+    rdf_file: str,
+    reducer: TripleReducer[S],
+    processes: t.Optional[int] = None,
+    work_dir: t.Optional[str] = None,
+) -> S:
+    """Reduce all triples of an N-Triples file, in parallel over byte-range shards.
+
+    Args:
+        rdf_file: .nt file, or .nt.gz, which is decompressed into work_dir first
+        reducer: a module-level TripleReducer
+        processes: worker processes; defaults to the CPU count; 1 runs in-process
+        work_dir: where to decompress gzipped files; if None, they are read in one process
+    """
+    processes = processes or os.cpu_count() or 1
+    if rdf_file.endswith('.gz'):
+        if work_dir is None:
+            processes = 1
+        else:
+            rdf_file = plain_ntriples(rdf_file, work_dir)
+
+    if processes == 1:
+        state = reducer.init()
+        for batch in read_ntriple_batches(rdf_file):
+            state = reducer.step_batch(state, batch)
+        return state
+
+    shards = byte_shards(rdf_file, processes * SHARDS_PER_PROCESS)
+    log.debug(f'Reducing {rdf_file} in {len(shards)} shards over {processes} processes')
+    result = reducer.init()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        partials = pool.map(reduce_shard, [reducer] * len(shards), [rdf_file] * len(shards), shards)
+        for partial in partials:
+            result = reducer.merge(result, partial)
+    return result
+
+
+class Combine(TripleReducer[t.Tuple[t.Any, ...]]):
+    """Run several reducers in one pass; the state is the tuple of their states."""
+
+    reducers: t.Tuple[TripleReducer[t.Any], ...]
+
+    def __init__(self, *reducers: TripleReducer[t.Any]):
+        self.reducers = reducers
+
+    def init(self) -> t.Tuple[t.Any, ...]:
+        return tuple(r.init() for r in self.reducers)
+
+    def step(self, state: t.Tuple[t.Any, ...], triple: Triple) -> t.Tuple[t.Any, ...]:
+        return tuple(r.step(s, triple) for r, s in zip(self.reducers, state))
+
+    def step_batch(self, state: t.Tuple[t.Any, ...], triples: t.List[Triple]) -> t.Tuple[t.Any, ...]:
+        return tuple(r.step_batch(s, triples) for r, s in zip(self.reducers, state))
+
+    def merge(self, state1: t.Tuple[t.Any, ...], state2: t.Tuple[t.Any, ...]) -> t.Tuple[t.Any, ...]:
+        return tuple(r.merge(s1, s2) for r, s1, s2 in zip(self.reducers, state1, state2))
+
+
+@dc.dataclass
+class GraphCounts:
+    triples: int = 0
+    publications: int = 0
+
+
+class CountTriples(TripleReducer[GraphCounts]):
+    """Count (triples, publications), as RdfBackend.count_graph does; duplicate
+    triples are counted each time they occur."""
+
+    def init(self) -> GraphCounts:
+        return GraphCounts()
+
+    def step(self, state: GraphCounts, triple: Triple) -> GraphCounts:
+        state.triples += 1
+        if triple[1] == RDF_TYPE and triple[2] == DBLP_PUBLICATION:
+            state.publications += 1
+        return state
+
+    def step_batch(self, state: GraphCounts, triples: t.List[Triple]) -> GraphCounts:
+        state.triples += len(triples)
+        state.publications += sum(1 for _, p, o in triples if p == RDF_TYPE and o == DBLP_PUBLICATION)
+        return state
+
+    def merge(self, state1: GraphCounts, state2: GraphCounts) -> GraphCounts:
+        return GraphCounts(state1.triples + state2.triples, state1.publications + state2.publications)
+
+
+class PredicateStats(TripleReducer[t.Counter[str]]):
+    """Count the triples with each predicate."""
+
+    def init(self) -> t.Counter[str]:
+        return Counter()
+
+    def step(self, state: t.Counter[str], triple: Triple) -> t.Counter[str]:
+        state[triple[1]] += 1
+        return state
+
+    def step_batch(self, state: t.Counter[str], triples: t.List[Triple]) -> t.Counter[str]:
+        state.update(p for _, p, _ in triples)
+        return state
+
+    def merge(self, state1: t.Counter[str], state2: t.Counter[str]) -> t.Counter[str]:
+        state1.update(state2)
+        return state1
+
+
+class AuthorshipPairs(TripleReducer[t.Set[t.Tuple[str, str]]]):
+    """Collect (author, publication) IRI pairs, without <>, from dblp:authoredBy triples."""
+
+    def init(self) -> t.Set[t.Tuple[str, str]]:
+        return set()
+
+    def step(self, state: t.Set[t.Tuple[str, str]], triple: Triple) -> t.Set[t.Tuple[str, str]]:
+        s, p, o = triple
+        if p == DBLP_AUTHORED_BY and is_iri(s) and is_iri(o):
+            state.add((o[1:-1], s[1:-1]))
+        return state
+
+    def merge(self, state1: t.Set[t.Tuple[str, str]], state2: t.Set[t.Tuple[str, str]]) -> t.Set[t.Tuple[str, str]]:
+        state1 |= state2
+        return state1
@@ -0,0 +1,138 @@
+"""Persistent cache of SPARQL results over immutable dblp graphs.
+
+Imported dblp.org graphs are  named for the MD5 of the dump  they were loaded
+from  (see graph_naming.py), so  the  result  of  a query  which  only  reads
+/g/<md5> graphs never changes. Such results are stored on disk, keyed  by the
+normalized query text plus the set of graphs it touches, and evicted least
+recently used first once the cache grows past its size bound.
+
+Queries which touch no named graph, or any graph other than an imported dblp
+graph (e.g.,  a diff graph, which is  created and  filled by an  update), are
+never cached. Neither are empty results, which are what  a query returns when
+run before its graph has been loaded.
+
+"""
+import json
+from os import path
+import os
+import re
+import sqlite3
+import threading
+import time
+import typing as t
+import hashlib
+
+from dblp_service.lib.log import AppLogger, create_logger
+from dblp_service.local_storage.graph_naming import DblpGraphName, uri_to_graph_name
+
+graph_uri_re = re.compile(r'<(http://rdfdb/[^>]+)>')
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.split())
+
+
+def graphs_in_query(query: str) -> t.List[str]:
+    return sorted({m.group(1) for m in graph_uri_re.finditer(query)})
+
+
+class QueryCache:
+    db_file: str
+    max_bytes: int
+    max_entry_bytes: int
+    hits: int
+    misses: int
+    log: AppLogger
+
+    def __init__(self, db_file: str, max_bytes: int):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8
+        self.hits = 0
+        self.misses = 0
+        self.log = create_logger(self.__class__.__name__)
+
+        os.makedirs(path.dirname(db_file), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results '
+            '(key TEXT PRIMARY KEY, graphs TEXT, value TEXT, size INTEGER, last_access REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)')
+        self._conn.commit()
+
+    def cache_key(self, query: str, kind: str) -> t.Optional[str]:
+        """Return the key for query, or None if its result may change over time.
+
+        kind distinguishes result encodings of the same query (e.g., json/rows).
+        """
+        graph_uris = graphs_in_query(query)
+        if not graph_uris:
+            return None
+        try:
+            graphs = [uri_to_graph_name(uri) for uri in graph_uris]
+        except Exception:
+            return None
+        if not all(isinstance(g, DblpGraphName) for g in graphs):
+            return None
+
+        text = '\n'.join([kind, normalize_query(query), *[g.qname() for g in graphs]])
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> t.Optional[t.Any]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute('UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def put(self, key: str, value: t.Any, graphs: t.List[str]):
+        content = json.dumps(value)
+        size = len(content)
+        if size > self.max_entry_bytes:
+            return
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (key, ' '.join(graphs), content, size, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        [total] = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in self._conn.execute('SELECT key, size FROM results ORDER BY last_access').fetchall():
+            self._conn.execute('DELETE FROM results WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+            if total <= self.max_bytes:
+                break
+        self.log.debug(f'Evicted {evicted} cached results')
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            [total] = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()
+            return int(total)
+
+    def stats(self) -> t.Dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses, bytes=self.size_bytes())
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,210 @@
+"""Timing and counters for SPARQL calls made through SparqlClient.
+
+Each call is  attributed to a query  template, either named  by the caller (e.g.,
+'author-publications') or derived from the query text with IRIs, literals and
+numbers blanked out, so that the same query run for different authors or graphs
+falls into one bucket.
+
+Two durations are recorded per call:
+
+    fetch_seconds: time spent inside the client, i.e., waiting on Fuseki and
+                   decoding its response
+    wall_seconds:  time from  sending the request  until the result  has been
+                   fully consumed
+
+For streamed results the  difference between the  two is time spent  by the
+caller processing rows, which tells Fuseki  apart from Python post-processing as
+the bottleneck.
+
+Calls slower than the  slow-query threshold are logged  with their query text.
+Metrics can be exported as a JSON-serializable dict or in Prometheus text format.
+"""
+import bisect
+import dataclasses as dc
+import hashlib
+import re
+import threading
+import time
+import typing as t
+
+from dblp_service.lib.log import AppLogger, create_logger
+from dblp_service.local_storage.query_cache import graphs_in_query, normalize_query
+
+latency_buckets: t.List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+
+query_keyword_re = re.compile(
+    r'\b(SELECT|CONSTRUCT|ASK|DESCRIBE|LOAD|INSERT|DELETE|DROP|CLEAR|CREATE|ADD|COPY|MOVE)\b', re.IGNORECASE
+)
+template_blanks = [
+    (re.compile(r'<[^<>\s]*>'), '<>'),
+    (re.compile(r'"(?:[^"\\]|\\.)*"'), '""'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '0'),
+    (re.compile(r'(?:<>\s*)+'), '<>* '),
+]
+
+
+def query_template(query: str) -> str:
+    """Derive a stable template name for a query, e.g., 'select-3fa2c1d0'."""
+    text = normalize_query(query)
+    for pattern, blank in template_blanks:
+        text = pattern.sub(blank, text)
+    keyword = m.group(1).lower() if (m := query_keyword_re.search(text)) else 'query'
+    return f'{keyword}-{hashlib.sha1(text.encode()).hexdigest()[:8]}'
+
+
+@dc.dataclass
+class QueryRecord:
+    """Measurements for a single SPARQL call, filled in as it runs."""
+
+    template: str
+    kind: str  # 'query', 'rows' or 'update'
+    query: str
+    started: float = dc.field(default_factory=time.perf_counter)
+    fetch_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    rows: int = 0
+    response_bytes: int = 0
+    error: t.Optional[str] = None
+
+
+@dc.dataclass
+class TemplateStats:
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    response_bytes: int = 0
+    fetch_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    max_fetch_seconds: float = 0.0
+    bucket_counts: t.List[int] = dc.field(default_factory=lambda: [0] * (len(latency_buckets) + 1))
+
+    def observe(self, record: QueryRecord):
+        self.calls += 1
+        self.errors += 1 if record.error else 0
+        self.rows += record.rows
+        self.response_bytes += record.response_bytes
+        self.fetch_seconds += record.fetch_seconds
+        self.wall_seconds += record.wall_seconds
+        self.max_fetch_seconds = max(self.max_fetch_seconds, record.fetch_seconds)
+        self.bucket_counts[bisect.bisect_left(latency_buckets, record.fetch_seconds)] += 1
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'response_bytes': self.response_bytes,
+            'fetch_seconds': round(self.fetch_seconds, 6),
+            'wall_seconds': round(self.wall_seconds, 6),
+            'max_fetch_seconds': round(self.max_fetch_seconds, 6),
+            'buckets': {
+                str(le): count for le, count in zip(latency_buckets + ['+Inf'], self.bucket_counts)  # type: ignore
+            },
+        }
+
+
+class QueryMetrics:
+    slow_query_seconds: float
+    templates: t.Dict[str, TemplateStats]
+    graph_calls: t.Dict[str, int]
+    cache_hits: t.Dict[str, int]
+    slow_queries: int
+    log: AppLogger
+
+    def __init__(self, slow_query_seconds: float = 5.0):
+        self.slow_query_seconds = slow_query_seconds
+        self.templates = {}
+        self.graph_calls = {}
+        self.cache_hits = {}
+        self.slow_queries = 0
+        self.log = create_logger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+    def start(self, query: str, kind: str, template: t.Optional[str] = None) -> QueryRecord:
+        return QueryRecord(template if template else query_template(query), kind, query)
+
+    def cache_hit(self, query: str, template: t.Optional[str] = None):
+        name = template if template else query_template(query)
+        with self._lock:
+            self.cache_hits[name] = self.cache_hits.get(name, 0) + 1
+
+    def finish(self, record: QueryRecord):
+        record.wall_seconds = time.perf_counter() - record.started
+        if record.kind != 'rows':
+            # the whole response is read before returning to the caller
+            record.fetch_seconds = record.wall_seconds
+        with self._lock:
+            self.templates.setdefault(record.template, TemplateStats()).observe(record)
+            for graph in graphs_in_query(record.query):
+                self.graph_calls[graph] = self.graph_calls.get(graph, 0) + 1
+            slow = record.fetch_seconds >= self.slow_query_seconds
+            if slow:
+                self.slow_queries += 1
+
+        if slow:
+            self.log.warning(
+                f'Slow query ({record.template}): {record.fetch_seconds:.2f}s in Fuseki/client,'
+                f' {record.wall_seconds:.2f}s total, {record.rows} rows, {record.response_bytes} bytes'
+                f'\n{record.query}'
+            )
+
+    def reset(self):
+        with self._lock:
+            self.templates = {}
+            self.graph_calls = {}
+            self.cache_hits = {}
+            self.slow_queries = 0
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        with self._lock:
+            return {
+                'slow_query_seconds': self.slow_query_seconds,
+                'slow_queries': self.slow_queries,
+                'templates': {name: stats.to_json() for name, stats in sorted(self.templates.items())},
+                'graphs': dict(sorted(self.graph_calls.items())),
+                'cache_hits': dict(sorted(self.cache_hits.items())),
+            }
+
+    def to_prometheus(self, prefix: str = 'dblp_sparql') -> str:
+        """Render metrics in the Prometheus text exposition format."""
+        lines: t.List[str] = []
+
+        def family(name: str, kind: str, description: str):
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+
+        with self._lock:
+            templates = sorted(self.templates.items())
+
+            family('fetch_seconds', 'histogram', 'Time spent waiting on Fuseki and decoding responses')
+            for name, stats in templates:
+                cumulative = 0
+                for le, count in zip(latency_buckets + ['+Inf'], stats.bucket_counts):  # type: ignore
+                    cumulative += count
+                    lines.append(f'{prefix}_fetch_seconds_bucket{{template="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_fetch_seconds_sum{{template="{name}"}} {stats.fetch_seconds:.6f}')
+                lines.append(f'{prefix}_fetch_seconds_count{{template="{name}"}} {stats.calls}')
+
+            counters: t.List[t.Tuple[str, str, t.Callable[[TemplateStats], t.Any]]] = [
+                ('wall_seconds_total', 'Time until results were fully consumed', lambda s: s.wall_seconds),
+                ('errors_total', 'Failed calls', lambda s: s.errors),
+                ('rows_total', 'Result rows returned', lambda s: s.rows),
+                ('response_bytes_total', 'Response bytes received', lambda s: s.response_bytes),
+            ]
+            for name, description, value in counters:
+                family(name, 'counter', description)
+                for template, stats in templates:
+                    lines.append(f'{prefix}_{name}{{template="{template}"}} {value(stats)}')
+
+            family('cache_hits_total', 'counter', 'Calls answered from the query cache')
+            for template, hits in sorted(self.cache_hits.items()):
+                lines.append(f'{prefix}_cache_hits_total{{template="{template}"}} {hits}')
+
+            family('graph_calls_total', 'counter', 'Calls referencing each named graph')
+            for graph, calls in sorted(self.graph_calls.items()):
+                lines.append(f'{prefix}_graph_calls_total{{graph="{graph}"}} {calls}')
+
+            family('slow_queries_total', 'counter', 'Calls slower than the slow-query threshold')
+            lines.append(f'{prefix}_slow_queries_total {self.slow_queries}')
+
+        return '\n'.join(lines) + '\n'
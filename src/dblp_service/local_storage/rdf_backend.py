@@ -0,0 +1,312 @@
+"""Storage backends under JenaDB.
+
+JenaDB, DiffEngine and the author publication queries need only a handful of
+graph operations: list and load graphs, count them, find the publications in a
+graph or in the difference of two graphs, and fetch the tuples describing an
+author's publications. RdfBackend names these operations, so they can be served
+either by Fuseki (FusekiBackend, via SPARQL), by an in-process triple store
+(memory_store.MemoryBackend), which needs no JVM and is meant for tests and
+small experiments, or by read-only, memory-mapped stores built from full dblp
+dumps (columnar_store.ColumnarBackend).
+
+"""
+from abc import ABC, abstractmethod
+from textwrap import dedent
+import typing as t
+
+from dblp_service.local_storage.graph_naming import DiffGraphName, GraphName
+from dblp_service.local_storage.ntriples import Triple, is_blank
+from dblp_service.local_storage.sparql_client import Row, SparqlClient, get_sparql_client
+from dblp_service.local_storage.sparql_pager import sparql_string
+
+# Publications in (after, upto] by iri_order_key; None leaves that end open.
+KeyRange: t.TypeAlias = t.Tuple[t.Optional[str], t.Optional[str]]
+
+
+def iri_order_key(iri: str) -> str:
+    """Order IRIs as their N-Triples terms (<iri>) sort, which is how the triple
+    stores keep them; plain IRIs sort differently when one is a prefix of another
+    (e.g., .../A14 and .../A14-1)."""
+    return iri + '>'
+
+
+def in_key_range(iri: str, key_range: t.Optional[KeyRange]) -> bool:
+    if key_range is None:
+        return True
+    after, upto = key_range
+    key = iri_order_key(iri)
+    return (after is None or key > after) and (upto is None or key <= upto)
+
+
+class RdfBackend(ABC):
+    max_concurrency: int
+
+    @abstractmethod
+    def named_graphs(self) -> t.List[str]:
+        """List the URIs (without <>) of all named graphs."""
+
+    @abstractmethod
+    def load_graph(self, graph_name: GraphName, rdf_file: str):
+        """Load an RDF file into a named graph."""
+
+    @abstractmethod
+    def count_graph(self, graph_name: GraphName) -> t.Tuple[int, int]:
+        """Count (triples, publications) in a graph."""
+
+    @abstractmethod
+    def publications(self, graph_name: GraphName) -> t.Iterator[str]:
+        """Stream the IRIs of all publications (?s a dblp:Publication) in a graph,
+        ordered by iri_order_key."""
+
+    @abstractmethod
+    def diff_publications(self, graph1: GraphName, graph2: GraphName) -> t.Iterator[str]:
+        """Stream the IRIs of all publications in graph1 but not graph2."""
+
+    @abstractmethod
+    def publication_rows(self, graph_name: GraphName, pubURIs: t.List[str]) -> t.Iterator[Row]:
+        """Stream rows [sub, pred, obj, bpred, bobj] describing each of the given
+        publications in a graph (see publication_tuple_patterns)."""
+
+    @abstractmethod
+    def create_diff_graph(
+        self, graph1: GraphName, graph2: GraphName, diff_graph: DiffGraphName, key_range: t.Optional[KeyRange] = None
+    ):
+        """Fill diff_graph with `?pub a dblp:Publication` for each publication
+        in graph1 but not graph2; with a key_range, only for the publications
+        in it (see in_key_range).
+
+        Inserts are idempotent, so a range may safely be filled again."""
+
+    @abstractmethod
+    def copy_graph(self, source: GraphName, target: GraphName):
+        """Replace the contents of target with a copy of source, which is left as is."""
+
+    @abstractmethod
+    def patch_graph(self, graph_name: GraphName, deletes: t.List[Triple], adds: t.List[Triple]):
+        """Delete, then add, triples in N-Triples syntax, as one update.
+
+        Blank node labels are not kept by a load, so a blank node in deletes
+        stands for any node which has all the tuples deleted from it, and is
+        referenced as deleted (see patch_graph_update). Each blank node label in
+        adds is a new node."""
+
+    @abstractmethod
+    def author_publication_rows(self, authorURIs: t.List[str], graph: t.Optional[GraphName] = None) -> t.Iterator[Row]:
+        """Stream rows [author, sub, pred, obj, bpred, bobj] describing the
+        publications of each author (see publication_tuple_patterns). If graph is
+        None, all graphs are searched."""
+
+    def close(self):
+        pass
+
+
+# Graph patterns selecting every  tuple describing a publication ?sub, along with
+# the tuples of any blank nodes it references (e.g., signatures).
+publication_tuple_patterns = """
+          {
+            ?sub ?pred ?obj
+            FILTER (! isBlank(?obj) )
+          } UNION {
+            ?sub ?pred ?obj
+            FILTER (isBlank(?obj) ) .
+            ?obj ?bpred ?bobj .
+          } UNION {
+            ?sub a ?obj .
+            BIND("isA" as ?pred)
+          } UNION {
+            ?sub ?pred ?obj
+            FILTER (isBlank(?obj) ) .
+            ?obj a ?bobj .
+            BIND("isA" as ?bpred)
+          }
+"""
+
+
+def scope_to_graph(patterns: str, graph: t.Optional[GraphName]) -> str:
+    """Wrap graph patterns in GRAPH <g> { }, if a graph is given."""
+    if graph is None:
+        return patterns
+    return f'GRAPH {graph.uri()} {{ {patterns} }}'
+
+
+def author_publications_batch_query(authorURIs: t.List[str], graph: t.Optional[GraphName] = None) -> str:
+    values = ' '.join(f'<{uri}>' for uri in authorURIs)
+    patterns = f'VALUES ?author {{ {values} }} ?sub dblp:authoredBy ?author . {publication_tuple_patterns}'
+    return f"""
+        prefix dblp: <https://dblp.org/rdf/schema#>
+
+        SELECT ?author ?sub ?pred ?obj ?bpred ?bobj
+        WHERE {{
+          {scope_to_graph(patterns, graph)}
+        }}
+        """
+
+
+def publication_rows_batch_query(pubURIs: t.List[str], graph: GraphName) -> str:
+    values = ' '.join(f'<{uri}>' for uri in pubURIs)
+    patterns = f'VALUES ?sub {{ {values} }} {publication_tuple_patterns}'
+    return f"""
+        SELECT ?sub ?pred ?obj ?bpred ?bobj
+        WHERE {{
+          {scope_to_graph(patterns, graph)}
+        }}
+        """
+
+
+class FusekiBackend(RdfBackend):
+    client: SparqlClient
+
+    def __init__(self, client: SparqlClient):
+        self.client = client
+
+    @property
+    def max_concurrency(self) -> int:  # type: ignore
+        return self.client.max_concurrency
+
+    def named_graphs(self) -> t.List[str]:
+        ret = self.client.query(' SELECT ?g WHERE {GRAPH ?g { }} ', 'named-graphs')
+        return [b['g']['value'] for b in ret['results']['bindings']]
+
+    def load_graph(self, graph_name: GraphName, rdf_file: str):
+        file_uri = f'<file://{rdf_file}>'
+        status = self.client.update(f'LOAD {file_uri} INTO GRAPH {graph_name.uri()}', 'load-graph')
+        assert status == 200
+
+    def count_graph(self, graph_name: GraphName) -> t.Tuple[int, int]:
+        query = f"""
+            PREFIX dblp: <https://dblp.org/rdf/schema#>
+
+            SELECT ?triples ?pubs WHERE {{
+                {{ SELECT (COUNT(*) AS ?triples) WHERE {{ GRAPH {graph_name.uri()} {{ ?s ?p ?o }} }} }}
+                {{ SELECT (COUNT(?s) AS ?pubs) WHERE {{ GRAPH {graph_name.uri()} {{ ?s a dblp:Publication }} }} }}
+            }}
+        """
+        [counts] = self.client.query(query, 'count-graph')['results']['bindings']
+        return int(counts['triples']['value']), int(counts['pubs']['value'])
+
+    def publications(self, graph_name: GraphName) -> t.Iterator[str]:
+        query = dedent(
+            f"""
+            PREFIX dblp: <https://dblp.org/rdf/schema#>
+
+            SELECT ?s WHERE {{
+                GRAPH {graph_name.uri()} {{ ?s a dblp:Publication }}
+            }}
+            ORDER BY (CONCAT(STR(?s), ">"))
+        """
+        )
+        for [pub] in self.client.query_rows(query, 'is-a-publication'):
+            assert pub is not None
+            yield pub
+
+    def diff_publications(self, graph1: GraphName, graph2: GraphName) -> t.Iterator[str]:
+        query = dedent(
+            f"""
+            PREFIX dblp: <https://dblp.org/rdf/schema#>
+
+            SELECT ?s WHERE {{
+                GRAPH {graph1.uri()} {{ ?s a dblp:Publication }}
+                FILTER NOT EXISTS {{
+                    GRAPH {graph2.uri()} {{ ?s a dblp:Publication }}
+                }}
+            }}
+            """
+        )
+        for [pub] in self.client.query_rows(query, 'diff-publications'):
+            assert pub is not None
+            yield pub
+
+    def publication_rows(self, graph_name: GraphName, pubURIs: t.List[str]) -> t.Iterator[Row]:
+        return self.client.query_rows(publication_rows_batch_query(pubURIs, graph_name), 'publication-rows-batch')
+
+    def create_diff_graph(
+        self, graph1: GraphName, graph2: GraphName, diff_graph: DiffGraphName, key_range: t.Optional[KeyRange] = None
+    ):
+        # The range is tested before the NOT EXISTS probe of graph2, so each
+        # update probes only its own publications; TDB2 cannot seek to a range
+        # of subjects in its type index, though, so every update still scans
+        # graph1's publications once, comparing strings.
+        after, upto = key_range or (None, None)
+        bounds: t.List[str] = []
+        if after is not None:
+            bounds.append(f'CONCAT(STR(?pub), ">") > {sparql_string(after)}')
+        if upto is not None:
+            bounds.append(f'CONCAT(STR(?pub), ">") <= {sparql_string(upto)}')
+        key_filter = f'FILTER ({" && ".join(bounds)})' if bounds else ''
+        update = dedent(
+            f"""
+            PREFIX dblp: <https://dblp.org/rdf/schema#>
+
+            INSERT {{
+              GRAPH {diff_graph.uri()} {{
+                ?pub a dblp:Publication
+              }}
+            }}
+            WHERE {{
+                GRAPH {graph1.uri()} {{ ?pub a dblp:Publication }}
+                {key_filter}
+                FILTER NOT EXISTS {{
+                    GRAPH {graph2.uri()} {{ ?pub a dblp:Publication }}
+                }}
+            }}
+            """
+        )
+        self.client.update(update, 'create-diff-graph')
+
+    def copy_graph(self, source: GraphName, target: GraphName):
+        self.client.update(f'COPY {source.uri()} TO {target.uri()}', 'copy-graph')
+
+    def patch_graph(self, graph_name: GraphName, deletes: t.List[Triple], adds: t.List[Triple]):
+        if deletes or adds:
+            self.client.update(patch_graph_update(graph_name, deletes, adds), 'patch-graph')
+
+    def author_publication_rows(self, authorURIs: t.List[str], graph: t.Optional[GraphName] = None) -> t.Iterator[Row]:
+        query = author_publications_batch_query(authorURIs, graph)
+        return self.client.query_rows(query, 'author-publications-batch')
+
+    def close(self):
+        self.client.close()
+
+
+def patch_graph_update(graph_name: GraphName, deletes: t.List[Triple], adds: t.List[Triple]) -> str:
+    """A SPARQL update deleting, then adding, triples in a graph.
+
+    Triples without blank nodes are deleted by DELETE DATA. Each deleted blank
+    node becomes a variable in a DELETE WHERE, matching the nodes with all its
+    deleted tuples, e.g. for a signature:
+
+        DELETE WHERE { GRAPH <g> { <pub> dblp:hasSignature ?b0 . ?b0 dblp:signatureOrdinal 1 . ... } }
+    """
+    graph = graph_name.uri()
+    blank_vars: t.Dict[str, str] = {}
+    blank_patterns: t.Dict[str, t.List[str]] = {}
+    ground: t.List[str] = []
+    for s, p, o in deletes:
+        if not is_blank(s) and not is_blank(o):
+            ground.append(f'{s} {p} {o} .')
+            continue
+        label = s if is_blank(s) else o
+        var = blank_vars.setdefault(label, f'?b{len(blank_vars)}')
+        triple = [blank_vars.get(term, term) if is_blank(term) else term for term in (s, p, o)]
+        if any(is_blank(term) for term in triple):
+            raise Exception(f'Deleted triple links two blank nodes: {s} {p} {o}')
+        blank_patterns.setdefault(var, []).append(' '.join(triple) + ' .')
+
+    operations: t.List[str] = []
+    if ground:
+        operations.append(f'DELETE DATA {{ GRAPH {graph} {{\n' + '\n'.join(ground) + '\n} }')
+    for patterns in blank_patterns.values():
+        operations.append(f'DELETE WHERE {{ GRAPH {graph} {{\n' + '\n'.join(patterns) + '\n} }')
+    if adds:
+        operations.append(
+            f'INSERT DATA {{ GRAPH {graph} {{\n' + '\n'.join(f'{s} {p} {o} .' for s, p, o in adds) + '\n} }'
+        )
+    return ' ;\n'.join(operations)
+
+
+def as_backend(source: t.Union[RdfBackend, SparqlClient, None]) -> RdfBackend:
+    """Accept a backend, a SPARQL client (served by Fuseki), or None for the
+    shared SPARQL client."""
+    if isinstance(source, RdfBackend):
+        return source
+    return FusekiBackend(source if source else get_sparql_client())
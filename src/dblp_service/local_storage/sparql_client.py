@@ -0,0 +1,421 @@
+"""Long-lived HTTP client for the Fuseki SPARQL endpoint.
+
+A single client  is shared by JenaDB, DiffEngine and  the publication queries so
+that repeated  queries reuse pooled  keep-alive connections rather  than opening
+a new connection (as SPARQLWrapper does) for every request.
+
+At most max_concurrency threads have calls in flight at once. A thread which
+already holds a slot, e.g., one fetching records while its own row streams are
+suspended (see publication_records.iter_publication_changes), reuses it for
+nested calls rather than waiting on itself; connections beyond pool_size are
+opened for such calls, but only pool_size are kept alive.
+
+Calls may be given a deadline, explicitly or  per query template. For queries it
+is passed to Fuseki as its `timeout` parameter, so that the server abandons the
+query and  frees its worker, and it is  also enforced by the client, which drops
+the connection once the deadline (plus a short grace period) has passed. Either
+way the call raises QueryTimeout.
+
+Fuseki's overall timeout counts wall-clock time, including time a streaming
+caller spends between rows, so for streamed queries (query_rows) the server is
+given the deadline only as its timeout to the first result; the client alone
+bounds the time spent fetching the rest.
+
+"""
+from contextlib import contextmanager
+from os import path
+import json
+import re
+import threading
+import time
+import typing as t
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dblp_service.lib.config import ApacheJenaConfig, Config, get_config
+from dblp_service.lib.log import AppLogger, create_logger
+from dblp_service.local_storage.query_cache import QueryCache, graphs_in_query
+from dblp_service.local_storage.query_metrics import QueryMetrics, QueryRecord
+
+SPARQL_JSON = 'application/sparql-results+json'
+SPARQL_TSV = 'text/tab-separated-values'
+
+Row: t.TypeAlias = t.List[t.Optional[str]]
+
+connect_timeout_seconds = 10.0
+# Allow Fuseki to report a timeout itself before the client gives up on it
+client_grace_seconds = 5.0
+# Fuseki's overall timeout for streamed queries, which only guards against streams abandoned by a stuck client
+stream_overall_timeout_seconds = 7 * 24 * 3600
+
+
+class QueryTimeout(TimeoutError):
+    template: t.Optional[str]
+    seconds: float
+
+    def __init__(self, template: t.Optional[str], seconds: float):
+        super().__init__(f'SPARQL call {template or ""} exceeded its {seconds:g}s deadline')
+        self.template = template
+        self.seconds = seconds
+
+
+class Deadline:
+    """Time remaining for one call, for server and client-side enforcement."""
+
+    seconds: float
+    expires: float
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds + client_grace_seconds
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def request_timeout(self) -> t.Tuple[float, float]:
+        """(connect, read) timeout for requests; read bounds each wait on the socket."""
+        return connect_timeout_seconds, max(self.remaining(), 0.001)
+
+
+class SparqlClient:
+    endpoint: str
+    pool_size: int
+    max_concurrency: int
+    session: requests.Session
+    cache: t.Optional[QueryCache]
+    metrics: QueryMetrics
+    query_timeout: t.Optional[float]
+    template_timeouts: t.Dict[str, float]
+    log: AppLogger
+
+    def __init__(
+        self,
+        endpoint: str,
+        *,
+        pool_size: int = 8,
+        max_concurrency: int = 8,
+        cache: t.Optional[QueryCache] = None,
+        metrics: t.Optional[QueryMetrics] = None,
+        query_timeout: t.Optional[float] = None,
+        template_timeouts: t.Optional[t.Dict[str, float]] = None,
+    ):
+        self.endpoint = endpoint
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.metrics = metrics if metrics else QueryMetrics()
+        self.query_timeout = query_timeout
+        self.template_timeouts = template_timeouts if template_timeouts else {}
+        self.log = create_logger(self.__class__.__name__)
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._held_slots: t.Dict[int, int] = {}  # thread id -> calls in flight
+        self._held_lock = threading.Lock()
+        self.session = requests.Session()
+        # Not blocking on the pool: concurrency is bounded by _slots, and nested calls need a connection each
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, jena_config: ApacheJenaConfig, cache: t.Optional[QueryCache] = None) -> 'SparqlClient':
+        return cls(
+            jena_config.connectionUrl,
+            pool_size=jena_config.poolSize,
+            max_concurrency=jena_config.maxConcurrency,
+            cache=cache,
+            metrics=QueryMetrics(jena_config.slowQueryMillis / 1000),
+            query_timeout=jena_config.queryTimeoutSeconds or None,
+            template_timeouts={k: float(v) for k, v in jena_config.templateTimeoutSeconds.items()},
+        )
+
+    def deadline(
+        self, template: t.Optional[str], timeout: t.Optional[float], is_update: bool = False
+    ) -> t.Optional[Deadline]:
+        """Resolve the deadline for a call: an explicit timeout, else the template's,
+        else (for queries only) the default query timeout."""
+        if timeout is None and template:
+            timeout = self.template_timeouts.get(template)
+        if timeout is None and not is_update:
+            timeout = self.query_timeout
+        return Deadline(timeout) if timeout else None
+
+    @contextmanager
+    def _slot(self) -> t.Iterator[None]:
+        """Hold a concurrency slot for a call, reusing the slot of the calling
+        thread if it already holds one."""
+        owner = threading.get_ident()
+        with self._held_lock:
+            if nested := owner in self._held_slots:
+                self._held_slots[owner] += 1
+        if not nested:
+            self._slots.acquire()
+            with self._held_lock:
+                self._held_slots[owner] = 1
+        try:
+            yield
+        finally:
+            with self._held_lock:
+                self._held_slots[owner] -= 1
+                if last := self._held_slots[owner] == 0:
+                    del self._held_slots[owner]
+            if last:
+                self._slots.release()
+
+    def _query_params(self, query: str, deadline: t.Optional[Deadline], streamed: bool = False) -> t.Dict[str, str]:
+        """Query parameters; a streamed query's deadline is sent as Fuseki's
+        timeout to the first result (`timeout=<first>,<overall>`)."""
+        params = {'query': query}
+        if deadline and streamed:
+            params['timeout'] = f'{deadline.seconds:g},{stream_overall_timeout_seconds}'
+        elif deadline:
+            params['timeout'] = f'{deadline.seconds:g}'
+        return params
+
+    def _check_timeout(self, response: requests.Response, template: t.Optional[str], deadline: t.Optional[Deadline]):
+        # Fuseki answers a query cancelled by its timeout with 503 Service Unavailable
+        if deadline and response.status_code == 503:
+            raise QueryTimeout(template, deadline.seconds)
+        response.raise_for_status()
+
+    def _cache_key(self, query: str, kind: str) -> t.Optional[str]:
+        return self.cache.cache_key(query, kind) if self.cache else None
+
+    def query(self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None) -> t.Any:
+        """Run a SPARQL query, returning the decoded JSON result document.
+
+        template names the query in metrics and selects its deadline; if not given
+        it is derived from the query text. timeout (seconds) overrides the
+        configured deadline.
+        """
+        if (key := self._cache_key(query, 'json')) and self.cache:
+            if (cached := self.cache.get(key)) is not None:
+                self.metrics.cache_hit(query, template)
+                return cached
+
+        record = self.metrics.start(query, 'query', template)
+        deadline = self.deadline(template, timeout)
+        try:
+            with self._slot():
+                response = self.session.get(
+                    self.endpoint,
+                    params=self._query_params(query, deadline),
+                    headers={'Accept': SPARQL_JSON},
+                    timeout=deadline.request_timeout() if deadline else None,
+                )
+                self._check_timeout(response, template, deadline)
+                record.response_bytes = len(response.content)
+                result = response.json()
+            record.rows = len(result.get('results', {}).get('bindings', []))
+        except requests.Timeout:
+            record.error = QueryTimeout.__name__
+            assert deadline
+            raise QueryTimeout(template, deadline.seconds)
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            self.metrics.finish(record)
+
+        if key and self.cache and result.get('results', {}).get('bindings'):
+            self.cache.put(key, result, graphs_in_query(query))
+        return result
+
+    def query_rows(
+        self, query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None
+    ) -> t.Iterator[Row]:
+        """Run a SPARQL query, lazily yielding result rows as they arrive.
+
+        Results are requested as TSV, one solution per line, so rows are decoded
+        as the response streams rather than after the full document is parsed.
+        Values follow  the same  conventions as  the JSON  'value' field;  unbound
+        variables are None. Blank lines are skipped, so a single-variable query
+        does not report its unbound solutions.
+
+        Cacheable results are  collected as they  stream  and stored once the
+        stream has been fully consumed, unless they grow past the cache's entry
+        size limit, in which case collection is abandoned.
+
+        The deadline (see query()) covers the time spent fetching the whole
+        stream, not just the wait for the first row; it does not count time the
+        caller spends between rows. Fuseki enforces it only up to the first row,
+        and the client enforces it for the rest.
+        """
+        key = self._cache_key(query, 'rows')
+        if key and self.cache:
+            if (cached := self.cache.get(key)) is not None:
+                self.metrics.cache_hit(query, template)
+                yield from cached
+                return
+
+        collected: t.Optional[t.List[Row]] = [] if key else None
+        collected_bytes = 0
+        for row in self._timed_rows(query, template, timeout):
+            if collected is not None and self.cache:
+                collected.append(row)
+                collected_bytes += sum(len(v) + 4 for v in row if v)
+                if collected_bytes > self.cache.max_entry_bytes:
+                    collected = None
+            yield row
+
+        if key and self.cache and collected:
+            self.cache.put(key, collected, graphs_in_query(query))
+
+    def _timed_rows(self, query: str, template: t.Optional[str], timeout: t.Optional[float]) -> t.Iterator[Row]:
+        """Stream rows, counting time spent fetching them apart from time the
+        caller spends between rows, and raising QueryTimeout once the fetch
+        time passes the deadline."""
+        record = self.metrics.start(query, 'rows', template)
+        deadline = self.deadline(template, timeout)
+        rows = self._stream_rows(query, record, deadline)
+        resumed = time.perf_counter()
+        try:
+            for row in rows:
+                record.rows += 1
+                record.fetch_seconds += time.perf_counter() - resumed
+                if deadline and deadline.seconds + client_grace_seconds < record.fetch_seconds:
+                    raise QueryTimeout(template, deadline.seconds)
+                yield row
+                resumed = time.perf_counter()
+            record.fetch_seconds += time.perf_counter() - resumed
+        except requests.Timeout:
+            record.error = QueryTimeout.__name__
+            assert deadline
+            raise QueryTimeout(template, deadline.seconds)
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            # release the connection (and Fuseki's worker) now, not when collected
+            rows.close()
+            self.metrics.finish(record)
+
+    def _stream_rows(
+        self, query: str, record: t.Optional[QueryRecord] = None, deadline: t.Optional[Deadline] = None
+    ) -> t.Iterator[Row]:
+        with self._slot():
+            with self.session.get(
+                self.endpoint,
+                params=self._query_params(query, deadline, streamed=True),
+                headers={'Accept': SPARQL_TSV},
+                stream=True,
+                timeout=deadline.request_timeout() if deadline else None,
+            ) as response:
+                self._check_timeout(response, record.template if record else None, deadline)
+                lines = response.iter_lines(decode_unicode=True, delimiter='\n')
+                if next(lines, None) is None:
+                    return
+                for line in lines:
+                    if record:
+                        record.response_bytes += len(line) + 1
+                    if not line:
+                        continue
+                    yield [decode_tsv_term(term) for term in line.split('\t')]
+
+    def update(self, update: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None) -> int:
+        """Run a SPARQL update, returning the HTTP status code.
+
+        Updates only have a deadline if given one explicitly or by template. It is
+        enforced by the client alone: Fuseki has no update timeout, so a timed
+        out update may still complete on the server.
+        """
+        record = self.metrics.start(update, 'update', template)
+        deadline = self.deadline(template, timeout, is_update=True)
+        try:
+            with self._slot():
+                response = self.session.post(
+                    self.endpoint,
+                    data={'update': update},
+                    timeout=deadline.request_timeout() if deadline else None,
+                )
+                response.raise_for_status()
+                return response.status_code
+        except requests.Timeout:
+            record.error = QueryTimeout.__name__
+            assert deadline
+            raise QueryTimeout(template, deadline.seconds)
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            self.metrics.finish(record)
+
+    def close(self):
+        self.session.close()
+
+
+literal_escape = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+literal_escapes = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+def unescape_literal(s: str) -> str:
+    """Decode the string escapes allowed in Turtle/N-Triples literals."""
+    if '\\' not in s:
+        return s
+
+    def replace(m: re.Match[str]) -> str:
+        if m.group(1) or m.group(2):
+            return chr(int(m.group(1) or m.group(2), 16))
+        return literal_escapes.get(m.group(3), m.group(3))
+
+    return literal_escape.sub(replace, s)
+
+
+def decode_tsv_term(term: str) -> t.Optional[str]:
+    """Convert an RDF term from a SPARQL TSV result into its plain value.
+
+    <http://x/y>        -> http://x/y
+    "title"@en          -> title
+    "2011"^^<xsd:year>  -> 2011
+    _:b0                -> b0
+    (empty)             -> None (unbound)
+    """
+    if not term:
+        return None
+    match term[0]:
+        case '<':
+            return term[1:-1]
+        case '"':
+            return unescape_literal(term[1 : term.rindex('"')])
+        case '_':
+            return term[2:]
+        case _:
+            return term
+
+
+cached_sparql_client: t.Optional[SparqlClient] = None
+
+
+def query_cache_file(config: Config) -> str:
+    return path.join(config.dblpServiceRoot, 'cache', 'sparql-results.sqlite')
+
+
+def get_sparql_client() -> SparqlClient:
+    global cached_sparql_client
+    if not cached_sparql_client:
+        config = get_config()
+        cache = None
+        if config.jena.queryCacheMaxBytes > 0:
+            cache = QueryCache(query_cache_file(config), config.jena.queryCacheMaxBytes)
+        cached_sparql_client = SparqlClient.from_config(config.jena, cache)
+
+    assert cached_sparql_client is not None
+    return cached_sparql_client
+
+
+def write_query_metrics(metrics_file: str):
+    """Write metrics of the shared client, as Prometheus text if the file ends
+    with .prom, else as JSON."""
+    if not cached_sparql_client:
+        return
+
+    metrics = cached_sparql_client.metrics
+    with open(metrics_file, 'w') as f:
+        if metrics_file.endswith('.prom'):
+            f.write(metrics.to_prometheus())
+        else:
+            json.dump(metrics.to_json(), f, indent=2)
@@ -0,0 +1,129 @@
+"""Keyset-paginated iteration over large SPARQL results.
+
+Deep OFFSET paging  makes the server  re-scan every skipped row. Instead, pages
+are ordered by a key variable, and each page starts strictly after the last key
+seen on the previous one:
+
+    SELECT ?s ... WHERE {
+        <pattern>
+        FILTER (STR(?s) > "<last key>")
+    } ORDER BY STR(?s) LIMIT <page size>
+
+By default the filter follows the whole pattern. A pattern whose later parts are
+costly (e.g., a FILTER NOT EXISTS probe of another graph) may instead be given
+as a function placing the filter right after the part which binds the key, so
+that rows before the cursor are dropped before the costly parts see them. Each
+page is still a fresh query: the server scans the key's pattern from the start
+and sorts what remains after the cursor to take the first page_size, so a full
+pass costs about pages x rows in scanning, though not in the costly parts.
+
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import typing as t
+
+from dblp_service.lib.log import AppLogger, create_logger
+
+PageQuery = t.Callable[[str], t.List[t.List[t.Any]]]
+# A pattern, or a function returning it with the given keyset FILTER (or '') placed within it
+WherePattern = t.Union[str, t.Callable[[str], str]]
+
+
+def sparql_string(s: str) -> str:
+    escaped = s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    return f'"{escaped}"'
+
+
+class SparqlKeysetIter:
+    """Create an Iterator over the rows of a SPARQL pattern, fetched page by page.
+
+    The key variable must be the first selected variable. A key may span several
+    rows; rows for the  last key on a full page are held back and re-fetched with
+    the next page, so a key is never split across pages. A single key must fit
+    in one page.
+
+    While the caller consumes a page, the next one is fetched in the background.
+
+    `cursor` is the last key whose rows have all been yielded; passing it back as
+    start_after resumes iteration from that point.
+    """
+
+    run_query: PageQuery
+    where: WherePattern
+    variables: t.List[str]
+    prefixes: str
+    page_size: int
+    cursor: t.Optional[str]
+    pages_fetched: int
+    log: AppLogger
+
+    def __init__(
+        self,
+        run_query: PageQuery,
+        where: WherePattern,
+        variables: t.List[str],
+        *,
+        prefixes: str = '',
+        page_size: int = 10000,
+        start_after: t.Optional[str] = None,
+        prefetch: bool = True,
+    ):
+        self.run_query = run_query
+        self.where = where
+        self.variables = variables
+        self.prefixes = prefixes
+        self.page_size = page_size
+        self.cursor = start_after
+        self.pages_fetched = 0
+        self.prefetch = prefetch
+        self.log = create_logger(self.__class__.__name__)
+
+    def page_query(self, after: t.Optional[str]) -> str:
+        key = self.variables[0]
+        keyset_filter = f'FILTER (STR(?{key}) > {sparql_string(after)})' if after is not None else ''
+        selected = ' '.join(f'?{v}' for v in self.variables)
+        where = self.where(keyset_filter) if callable(self.where) else f'{self.where}\n{keyset_filter}'
+        return f"""
+            {self.prefixes}
+            SELECT {selected} WHERE {{
+                {where}
+            }} ORDER BY STR(?{key}) LIMIT {self.page_size}
+            """
+
+    def _fetch_page(self, after: t.Optional[str]) -> t.Tuple[t.List[t.List[t.Any]], t.Optional[str]]:
+        """Fetch the page following `after`, returning its complete rows and the
+        key to fetch the next page after (None if this is the last page)."""
+        rows = self.run_query(self.page_query(after))
+        self.pages_fetched += 1
+        if len(rows) < self.page_size:
+            return rows, None
+
+        last_key = rows[-1][0]
+        complete = [row for row in rows if row[0] != last_key]
+        if not complete:
+            raise Exception(f'Key {last_key} has more than page_size={self.page_size} rows')
+
+        return complete, complete[-1][0]
+
+    def __iter__(self) -> t.Iterator[t.List[t.Any]]:
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        try:
+            next_after: t.Optional[str] = self.cursor
+            page, next_after = self._fetch_page(next_after)
+            while True:
+                upcoming: t.Optional[Future[t.Tuple[t.List[t.List[t.Any]], t.Optional[str]]]] = None
+                if next_after is not None and executor:
+                    upcoming = executor.submit(self._fetch_page, next_after)
+
+                for i, row in enumerate(page):
+                    if i > 0 and row[0] != page[i - 1][0]:
+                        self.cursor = page[i - 1][0]
+                    yield row
+                if page:
+                    self.cursor = page[-1][0]
+
+                if next_after is None:
+                    return
+                page, next_after = upcoming.result() if upcoming else self._fetch_page(next_after)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
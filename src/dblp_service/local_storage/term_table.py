@@ -0,0 +1,86 @@
+"""Sorted term tables shared by the memory-mapped stores (columnar_store.py,
+authorship_index.py).
+
+Terms are written in sorted order, as concatenated utf-8 bytes plus an array of
+offsets, and a term's id is its rank in the table, so ids compare as their
+terms do. UTF-8 byte order is code point order, so the bytes sort as the
+Python strings do.
+
+"""
+from array import array
+import os
+from os import path
+import shutil
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+
+def write_term_table(store_dir: str, sorted_terms: t.Iterable[str], name: str = 'terms') -> int:
+    """Write sorted terms as <name>.bin (concatenated utf-8) and <name>_offsets.npy,
+    returning the number of terms."""
+    offsets = array('q', [0])
+    with open(path.join(store_dir, f'{name}.bin'), 'wb') as f:
+        for term in sorted_terms:
+            encoded = term.encode('utf-8')
+            f.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+    np.save(path.join(store_dir, f'{name}_offsets.npy'), np.frombuffer(offsets, dtype=np.int64))
+    return len(offsets) - 1
+
+
+def staging_dir(store_dir: str) -> str:
+    """A fresh temporary sibling of store_dir to write a store into (see replace_dir)."""
+    tmp_dir = f'{store_dir}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def replace_dir(tmp_dir: str, store_dir: str):
+    """Move a completely written store into place."""
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+
+
+class TermTable:
+    """A memory-mapped table of sorted terms, written by write_term_table.
+
+    A term's id is its rank in the table, so ids compare as their terms do.
+    """
+
+    offsets: npt.NDArray[np.int64]
+    term_bytes: npt.NDArray[np.uint8]
+
+    def __init__(self, store_dir: str, name: str = 'terms'):
+        self.offsets = np.load(path.join(store_dir, f'{name}_offsets.npy'), mmap_mode='r')
+        terms_file = path.join(store_dir, f'{name}.bin')
+        self.term_bytes = (
+            np.memmap(terms_file, dtype=np.uint8, mode='r')
+            if path.getsize(terms_file)
+            else np.zeros(0, dtype=np.uint8)
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def term(self, term_id: int) -> str:
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        return self.term_bytes[start:end].tobytes().decode('utf-8')
+
+    def insertion_point(self, term: str) -> int:
+        """The number of terms which sort before term."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def term_id(self, term: str) -> t.Optional[int]:
+        """Find a term's id by binary search."""
+        term_id = self.insertion_point(term)
+        return term_id if term_id < len(self) and self.term(term_id) == term else None
@@ -1,10 +1,19 @@
-from pprint import pprint
-from SPARQLWrapper import SPARQLWrapper, JSON
+import asyncio
+from itertools import islice
 import typing as t
 
 from bigtree.node.node import Node
 from bigtree.tree.construct import add_path_to_tree
 
+from dblp_service.lib.config import get_config
+from dblp_service.local_storage.graph_naming import GraphName
+from dblp_service.local_storage.jena_db import AsyncJenaDB, JenaDB
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.rdf_backend import RdfBackend, as_backend
+from dblp_service.local_storage.sparql_client import QueryTimeout, SparqlClient
+
+log = create_logger(__file__)
+
 
 class AuthorTuple(t.NamedTuple):
     sub: str
@@ -14,49 +23,37 @@ class AuthorTuple(t.NamedTuple):
     bobj: t.Optional[str] = None
 
 
-def run_author_publication_query(authorURI: str) -> t.List[AuthorTuple]:
-    sparql = SPARQLWrapper("http://localhost:3030/" "ds")
-    sparql.setReturnFormat(JSON)
-
-    sparql.setQuery(
-        """
-        prefix dblp: <https://dblp.org/rdf/schema#>
-
-        SELECT ?sub ?pred ?obj ?bpred ?bobj
-        WHERE {
-          ?sub dblp:authoredBy """
-        f"<{authorURI}> . "
-        """
-          {
-            ?sub ?pred ?obj
-            FILTER (! isBlank(?obj) )
-          } UNION {
-            ?sub ?pred ?obj
-            FILTER (isBlank(?obj) ) .
-            ?obj ?bpred ?bobj .
-          } UNION {
-            ?sub a ?obj .
-            BIND("isA" as ?pred)
-          } UNION {
-            ?sub ?pred ?obj
-            FILTER (isBlank(?obj) ) .
-            ?obj a ?bobj .
-            BIND("isA" as ?bpred)
-          }
-        }
-        """
-    )
+def query_scope(
+    client: t.Union[SparqlClient, RdfBackend, None], graph: t.Optional[GraphName]
+) -> t.Tuple[RdfBackend, t.Optional[GraphName]]:
+    """The backend and graph to query. Given neither, that is the shared SPARQL
+    client and the graph the configured catalog aliases as active, or all graphs
+    if no graph is active. That reads the catalog, so callers querying for
+    many authors resolve the scope once and pass the backend and graph down."""
+    if client is None and graph is None:
+        jenadb = JenaDB.from_config(get_config())
+        return jenadb.backend, jenadb.active_graph()
+    return as_backend(client), graph
+
+
+def run_author_publication_query(
+    authorURI: str,
+    client: t.Union[SparqlClient, RdfBackend, None] = None,
+    graph: t.Optional[GraphName] = None,
+) -> t.List[AuthorTuple]:
+    """Fetch the tuples of all publications by an author.
+
+    client may be a SPARQL client or any RdfBackend; defaults to the shared
+    SPARQL client, and then graph to the active graph (see query_scope). If a
+    graph is given, only that graph is queried; queries against an imported
+    dblp graph are immutable, and so may be answered from the query cache.
+    """
+    backend, graph = query_scope(client, graph)
 
     tuples: t.List[AuthorTuple] = []
     try:
-        ret: t.Any = sparql.queryAndConvert()
-
-        for r in ret["results"]["bindings"]:
-            sub = get_type_val(r, "sub")
-            pred = get_type_val(r, "pred")
-            obj = get_type_val(r, "obj")
-            bpred = opt_type_val(r, "bpred")
-            bobj = opt_type_val(r, "bobj")
+        for _, sub, pred, obj, bpred, bobj in backend.author_publication_rows([authorURI], graph):
+            assert sub and pred and obj
             tuples.append(AuthorTuple(sub, pred, obj, bpred, bobj))
 
     except Exception as e:
@@ -66,11 +63,110 @@ def run_author_publication_query(authorURI: str) -> t.List[AuthorTuple]:
     return tuples
 
 
-def get_author_publication_tree(authorURI: str) -> Node:
+async def run_author_publication_queries(
+    authorURIs: t.List[str], adb: AsyncJenaDB, graph: t.Optional[GraphName] = None
+) -> t.Dict[str, t.List[AuthorTuple]]:
+    """Fetch publication tuples for many authors, keeping several queries in
+    flight; graph defaults to the active graph."""
+    backend = adb.jenadb.backend
+    graph = graph or adb.jenadb.active_graph()
+    results = await asyncio.gather(
+        *[adb.call(run_author_publication_query, uri, backend, graph) for uri in authorURIs]
+    )
+    return dict(zip(authorURIs, results))
+
+
+def batched(items: t.Iterable[str], batch_size: int) -> t.Iterator[t.List[str]]:
+    it = iter(items)
+    while batch := list(islice(it, batch_size)):
+        yield batch
+
+
+def run_author_publication_batches(
+    authorURIs: t.Iterable[str],
+    client: t.Union[SparqlClient, RdfBackend, None] = None,
+    graph: t.Optional[GraphName] = None,
+    batch_size: int = 200,
+    timed_out: t.Optional[t.List[str]] = None,
+) -> t.Iterator[t.Tuple[str, t.List[AuthorTuple]]]:
+    """Fetch publication tuples for many authors, batch_size authors per query.
+
+    Each query binds a batch  of authors with VALUES ?author {...} and streams
+    back rows tagged with ?author, which are split into per-author tuple lists.
+    Yields (authorURI, tuples) in input order, including authors with no
+    publications.
+
+    A batch which times out is split in half and retried, down to single
+    authors. Authors whose own query still times out are appended to timed_out
+    and skipped, so a batch run can retry them later; if no timed_out list is
+    given, QueryTimeout is raised instead.
+
+    client and graph default as in run_author_publication_query.
+    """
+    backend, graph = query_scope(client, graph)
+    for batch in batched(authorURIs, batch_size):
+        yield from _run_author_batch(backend, batch, graph, timed_out).items()
+
+
+def _run_author_batch(
+    backend: RdfBackend,
+    batch: t.List[str],
+    graph: t.Optional[GraphName],
+    timed_out: t.Optional[t.List[str]],
+) -> t.Dict[str, t.List[AuthorTuple]]:
+    by_author: t.Dict[str, t.List[AuthorTuple]] = {uri: [] for uri in batch}
+    try:
+        unknown: t.Set[str] = set()
+        for author, sub, pred, obj, bpred, bobj in backend.author_publication_rows(batch, graph):
+            assert author and sub and pred and obj
+            if (tuples := by_author.get(author)) is None:
+                # e.g., an IRI the store normalized differently from the one asked for
+                unknown.add(author)
+                continue
+            tuples.append(AuthorTuple(sub, pred, obj, bpred, bobj))
+        if unknown:
+            log.warning(f"Skipped rows of {len(unknown)} authors not in the batch: {sorted(unknown)[:5]}")
+        return by_author
+
+    except QueryTimeout:
+        if len(batch) > 1:
+            log.warning(f"Batch of {len(batch)} authors timed out; retrying in halves")
+            half = len(batch) // 2
+            return {
+                **_run_author_batch(backend, batch[:half], graph, timed_out),
+                **_run_author_batch(backend, batch[half:], graph, timed_out),
+            }
+        if timed_out is None:
+            raise
+        log.warning(f"Publication query for {batch[0]} timed out")
+        timed_out.append(batch[0])
+        return {}
+
+
+def get_author_publication_trees(
+    authorURIs: t.Iterable[str],
+    client: t.Union[SparqlClient, RdfBackend, None] = None,
+    graph: t.Optional[GraphName] = None,
+    batch_size: int = 200,
+    timed_out: t.Optional[t.List[str]] = None,
+) -> t.Iterator[t.Tuple[str, Node]]:
+    """Create publication trees (see get_author_publication_tree) for many authors,
+    using batched queries. Authors whose queries time out are handled as in
+    run_author_publication_batches."""
+    for authorURI, tuples in run_author_publication_batches(authorURIs, client, graph, batch_size, timed_out):
+        yield authorURI, create_tree_from_tuples(tuples)
+
+
+def get_author_publication_tree(
+    authorURI: str, client: t.Union[SparqlClient, RdfBackend, None] = None, graph: t.Optional[GraphName] = None
+) -> Node:
     """Create a tree representing an authors publications.
 
     Args:
         authorURI: format is https://dblp.org/pid/m/auth-uniq-id
+        client: SPARQL client or RdfBackend to use; defaults to the shared client
+        graph: named graph to query; with the shared client, defaults to the
+            active graph, else all graphs
 
     Returns:
         Tree representation of authorship, which mirrors the data
@@ -86,7 +182,7 @@ def get_author_publication_tree(authorURI: str) -> Node:
         │   └── CIKM
 
     """
-    tuples = run_author_publication_query(authorURI)
+    tuples = run_author_publication_query(authorURI, client, graph)
     return create_tree_from_tuples(tuples)
 
 
@@ -125,21 +221,3 @@ def abbreviate_author_tuples(tuples: t.List[AuthorTuple]) -> t.List[str]:
         abbrevs.append(x)
 
     return abbrevs
-
-
-def get_type_val(rec: t.Dict[str, t.Any], key: str) -> str:
-    if key not in rec:
-        raise Exception("key must be in rec")
-
-    subrec = rec[key]
-    v = subrec["value"]
-    return v
-
-
-def opt_type_val(rec: t.Dict[str, t.Any], key: str) -> t.Optional[str]:
-    if key not in rec:
-        return None
-
-    subrec = rec[key]
-    v = subrec["value"]
-    return v
@@ -0,0 +1,94 @@
+"""The authors whose publications changed between two releases.
+
+Re-aligning or re-exporting authors after a release only needs to revisit the
+authors of the publications added, removed or modified. These are read off the
+records of the publication changes (see publication_records.py), before and
+after, so they come for free with any diff pass, online (DiffEngine) or offline
+(offline_diff.py), with no further queries:
+
+    dblp:authoredBy <pid>
+    dblp:hasSignature [dblp:signatureCreator <pid>; ...]
+
+Records from a triple store hold plain IRIs, while offline records hold
+N-Triples terms; both are read, and authors are written as plain IRIs.
+
+The result is a work list for batch jobs: sorted, distinct author IRIs, one
+per line (gzipped if the file name ends with .gz).
+
+"""
+import gzip
+import re
+import typing as t
+
+from dblp_service.services.publication_records import PublicationChange, PublicationRecord
+
+DBLP_SCHEMA = 'https://dblp.org/rdf/schema#'
+AUTHORED_BY = f'{DBLP_SCHEMA}authoredBy'
+HAS_SIGNATURE = f'{DBLP_SCHEMA}hasSignature'
+signature_creator_re = re.compile(rf'(?:^\[|; )<?{re.escape(DBLP_SCHEMA)}signatureCreator>? <?([^\s;\]>]+)')
+
+
+def plain_iri(term: str) -> str:
+    return term[1:-1] if term.startswith('<') else term
+
+
+def record_authors(record: PublicationRecord) -> t.Set[str]:
+    """The authoredBy and signatureCreator targets of a publication."""
+    authors: t.Set[str] = set()
+    for pred, objs in record.fields.items():
+        pred = plain_iri(pred)
+        if pred == AUTHORED_BY:
+            authors.update(plain_iri(obj) for obj in objs)
+        elif pred == HAS_SIGNATURE:
+            for signature in objs:
+                authors.update(signature_creator_re.findall(signature))
+    return authors
+
+
+class AffectedAuthors:
+    """Collect the authors of publication changes, e.g., while streaming them out."""
+
+    authors: t.Set[str]
+
+    def __init__(self):
+        self.authors = set()
+
+    def add(self, change: PublicationChange) -> PublicationChange:
+        for record in (change.before, change.after):
+            if record:
+                self.authors |= record_authors(record)
+        return change
+
+    def collect(self, changes: t.Iterable[PublicationChange]) -> t.Iterator[PublicationChange]:
+        """Pass changes through, collecting their authors."""
+        for change in changes:
+            yield self.add(change)
+
+    def __len__(self) -> int:
+        return len(self.authors)
+
+    def write(self, file_path: str) -> int:
+        """Write the sorted authors, one IRI per line, returning their count."""
+        return write_work_list(sorted(self.authors), file_path)
+
+
+def open_work_list(file_path: str, mode: t.Literal['r', 'w']) -> t.TextIO:
+    if file_path.endswith('.gz'):
+        return t.cast(t.TextIO, gzip.open(file_path, f'{mode}t', encoding='utf-8'))
+    return open(file_path, mode, encoding='utf-8')
+
+
+def write_work_list(sorted_authors: t.Iterable[str], file_path: str) -> int:
+    count = 0
+    with open_work_list(file_path, 'w') as f:
+        for author in sorted_authors:
+            f.write(f'{author}\n')
+            count += 1
+    return count
+
+
+def read_work_list(file_path: str) -> t.Iterator[str]:
+    with open_work_list(file_path, 'r') as f:
+        for line in f:
+            if line := line.rstrip('\n'):
+                yield line
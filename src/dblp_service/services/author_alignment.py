@@ -16,12 +16,14 @@ from rich.console import Console
 
 from dblp_service.lib.log import AppLogger, create_logger
 from dblp_service.lib.utils import pairs_to_multimap
+from dblp_service.local_storage.graph_naming import GraphName
+from dblp_service.local_storage.rdf_backend import RdfBackend
 from dblp_service.open_exchange.note_schemas import Note
 from dblp_service.open_exchange.open_fetch import fetch_notes_for_author, fetch_profile_with_dblp_pid, search_notes
 
 from dblp_service.open_exchange.profile_schemas import Profile
 from dblp_service.pub_formats.rdf_tuples.dblp_repr import DblpRepr
-from dblp_service.pub_formats.rdf_tuples.queries import get_author_publication_tree
+from dblp_service.pub_formats.rdf_tuples.queries import get_author_publication_tree, query_scope
 from dblp_service.pub_formats.rdf_tuples.tree_traversal import all_authorship_trees_to_reprs
 
 import functools as ft
@@ -54,8 +56,14 @@ class OpenreviewFetcher:
 
 
 class DblpOrgFetcher:
+    @ft.cached_property
+    def scope(self) -> t.Tuple[RdfBackend, t.Optional[GraphName]]:
+        """The backend and active graph, resolved once rather than for every author."""
+        return query_scope(None, None)
+
     def fetch_author_publications(self, authorid: DblpAuthID) -> t.List[DblpRepr]:
-        tree = get_author_publication_tree(authorid.uri())
+        backend, graph = self.scope
+        tree = get_author_publication_tree(authorid.uri(), backend, graph)
         dblp_papers = all_authorship_trees_to_reprs(tree, step_debug=False)
 
         def get_title(repr: DblpRepr) -> str:
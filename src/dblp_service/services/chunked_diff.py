@@ -0,0 +1,136 @@
+"""Materialize diff graphs in chunks, with resumable progress.
+
+A single `INSERT ... WHERE { FILTER NOT EXISTS ... }` over two full releases
+is one transaction: nothing is committed until all of it is, and an interrupted
+run starts over. Instead, graph1's publications, which the backend lists in
+key order (see rdf_backend.iri_order_key), are cut into ranges of range_size
+publications, and each range is inserted, and committed, by its own update:
+
+    range_size=500000  ->  (None, k1], (k1, k2], ..., (kn, None)  (about 15 updates for dblp)
+
+The range boundaries take one ordered scan of graph1's publications. Each
+update then tests the NOT EXISTS of graph2 only for its own range, but on
+Fuseki it still scans graph1's publication type index to find them (TDB2 has no
+index by subject range), so a run costs about one scan per range: ranges are
+kept few and large. TDB2 also runs one write transaction at a time, so updates
+run one after another by default; more in flight only queue up on the server.
+
+Finished ranges are recorded in a JSON checkpoint file after each commit, with
+the ranges themselves, so a rerun with the same checkpoint file skips both the
+boundary scan and the finished ranges. A range which committed just before a
+crash, but was not recorded, is inserted again, which does not change the
+graph. The checkpoint file is removed once every range is done.
+
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import dataclasses as dc
+import json
+import os
+from os import path
+import typing as t
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.graph_naming import DiffGraphName, GraphName
+from dblp_service.local_storage.rdf_backend import KeyRange, RdfBackend, iri_order_key
+
+log = create_logger(__file__)
+
+DEFAULT_RANGE_SIZE = 500_000
+
+
+def key_ranges(pubs: t.Iterable[str], range_size: int) -> t.List[KeyRange]:
+    """Cut publication IRIs, in key order, into ranges of range_size; the first
+    and last ranges are open, so publications outside the listed ones are covered."""
+    bounds: t.List[t.Optional[str]] = [None]
+    for i, pub in enumerate(pubs, 1):
+        if i % range_size == 0:
+            bounds.append(iri_order_key(pub))
+    bounds.append(None)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+@dc.dataclass
+class DiffCheckpoint:
+    diff_graph: str  # qname
+    range_size: int
+    ranges: t.List[KeyRange]
+    done: t.List[int] = dc.field(default_factory=list)  # indexes into ranges
+
+    @staticmethod
+    def load(
+        checkpoint_file: t.Optional[str], diff_graph: DiffGraphName, range_size: int
+    ) -> t.Optional['DiffCheckpoint']:
+        """The checkpoint in checkpoint_file, if it records a run over the same graph and range size."""
+        if not checkpoint_file or not path.exists(checkpoint_file):
+            return None
+        with open(checkpoint_file) as f:
+            checkpoint = DiffCheckpoint(**json.load(f))
+        checkpoint.ranges = [(after, upto) for after, upto in checkpoint.ranges]
+        if checkpoint.diff_graph == diff_graph.qname() and checkpoint.range_size == range_size:
+            return checkpoint
+        log.warning(f'Ignoring checkpoint {checkpoint_file} of a different run ({checkpoint.diff_graph})')
+        return None
+
+    def save(self, checkpoint_file: str):
+        os.makedirs(path.dirname(checkpoint_file) or '.', exist_ok=True)
+        tmp_file = f'{checkpoint_file}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(dc.asdict(self), f)
+        os.replace(tmp_file, checkpoint_file)
+
+    def remaining(self) -> t.List[int]:
+        done = set(self.done)
+        return [i for i in range(len(self.ranges)) if i not in done]
+
+
+def materialize_diff_graph(
+    backend: RdfBackend,
+    graph1: GraphName,
+    graph2: GraphName,
+    diff_graph: DiffGraphName,
+    *,
+    range_size: int = DEFAULT_RANGE_SIZE,
+    concurrency: int = 1,
+    checkpoint_file: t.Optional[str] = None,
+) -> int:
+    """Fill diff_graph with the publications in graph1 but not graph2, one key
+    range per update, returning the number of ranges run.
+
+    Args:
+        range_size: publications of graph1 per update
+        concurrency: updates in flight at once
+        checkpoint_file: where finished ranges are recorded, to resume from; None to not record them
+    """
+    checkpoint = DiffCheckpoint.load(checkpoint_file, diff_graph, range_size)
+    if checkpoint:
+        log.info(f'Resuming {diff_graph.qname()}: {len(checkpoint.done)}/{len(checkpoint.ranges)} ranges done')
+    else:
+        ranges = key_ranges(backend.publications(graph1), range_size)
+        checkpoint = DiffCheckpoint(diff_graph.qname(), range_size, ranges)
+    remaining = checkpoint.remaining()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(backend.create_diff_graph, graph1, graph2, diff_graph, checkpoint.ranges[i]): i
+            for i in remaining
+        }
+        error: t.Optional[BaseException] = None
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            if (exc := future.exception()) is not None:
+                # Stop queuing ranges, but record those already in flight as they finish
+                error = error or exc
+                for pending in futures:
+                    pending.cancel()
+                continue
+            checkpoint.done.append(futures[future])
+            if checkpoint_file:
+                checkpoint.save(checkpoint_file)
+            log.info(f'{diff_graph.qname()}: {len(checkpoint.done)}/{len(checkpoint.ranges)} ranges')
+        if error:
+            raise error
+
+    if checkpoint_file and path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return len(remaining)
@@ -0,0 +1,113 @@
+"""Diff two N-Triples dumps without loading them into Fuseki.
+
+Each dump is streamed once and its triples are grouped by subject with an
+external sort: sorted runs of at most a given memory budget are spilled to a
+temporary directory and then merged. Blank nodes are folded into the subject
+that references them, as a canonical signature of their own tuples (see
+publication_records.blank_signature), which takes a second sort keyed by blank
+node label:
+
+    (s p o), s an IRI           ->  subjects:    s  ->  'p o'
+    (b p o), b a blank node     ->  blanks:      b  ->  'p o'
+    (s p b), b a blank node     ->  references:  b  ->  's p'
+    merge blanks, references    ->  subjects:    s  ->  'p [signature of b]'
+
+Only one level of blank nodes is resolved, which covers dblp's signatures and
+identifiers. The subject records of the two dumps, both in subject order, are
+then merge-joined, so the diff itself is linear in the size of the dumps.
+
+Changes are PublicationChange values (see publication_records.py) for every
+IRI subject (publications, persons, streams, ...), with field values in
+N-Triples syntax.
+
+"""
+import typing as t
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.external_sort import ExternalSorter, run_directory
+from dblp_service.local_storage.ntriples import is_blank, read_ntriple_batches
+from dblp_service.services.publication_records import PublicationChange, PublicationRecord
+
+log = create_logger(__file__)
+
+DEFAULT_MEMORY_BUDGET = 1 << 30
+
+V = t.TypeVar('V')
+
+
+def merge_by_key(
+    xs: t.Iterator[t.Tuple[str, V]], ys: t.Iterator[t.Tuple[str, V]]
+) -> t.Iterator[t.Tuple[str, t.Optional[V], t.Optional[V]]]:
+    """Merge-join two streams of (key, value), each sorted by unique key, yielding
+    (key, x value, y value), with None for a key missing from one side."""
+    x, y = next(xs, None), next(ys, None)
+    while x is not None or y is not None:
+        if y is None or (x is not None and x[0] < y[0]):
+            assert x is not None
+            yield x[0], x[1], None
+            x = next(xs, None)
+        elif x is None or y[0] < x[0]:
+            yield y[0], None, y[1]
+            y = next(ys, None)
+        else:
+            yield x[0], x[1], y[1]
+            x, y = next(xs, None), next(ys, None)
+
+
+def subject_records(rdf_file: str, run_dir: str, memory_budget: int) -> t.Iterator[t.Tuple[str, PublicationRecord]]:
+    """Stream (subject term, record) for each IRI subject of an N-Triples file, in term order."""
+    subjects = ExternalSorter(run_dir, memory_budget // 2)
+    blanks = ExternalSorter(run_dir, memory_budget // 4)
+    references = ExternalSorter(run_dir, memory_budget // 4)
+
+    for batch in read_ntriple_batches(rdf_file):
+        for s, p, o in batch:
+            if is_blank(s):
+                blanks.add(s, f'{p} {o}')
+            elif is_blank(o):
+                references.add(o, f'{s} {p}')
+            else:
+                subjects.add(s, f'{p} {o}')
+    log.debug(f'Sorted {rdf_file} into {len(subjects.runs) + len(blanks.runs) + len(references.runs)} runs')
+
+    for _, tuples, refs in merge_by_key(blanks.groups(), references.groups()):
+        signature = '[' + '; '.join(sorted(set(tuples or []))) + ']'
+        for ref in refs or []:
+            s, p = ref.split(' ', 1)
+            subjects.add(s, f'{p} {signature}')
+
+    for subject, fields in subjects.groups():
+        yield subject, record_from_fields(subject, fields)
+
+
+def record_from_fields(subject: str, fields: t.List[str]) -> PublicationRecord:
+    values: t.Dict[str, t.Set[str]] = {}
+    for field in fields:
+        pred, obj = field.split(' ', 1)
+        values.setdefault(pred, set()).add(obj)
+    return PublicationRecord(subject[1:-1], {pred: frozenset(objs) for pred, objs in values.items()})
+
+
+def iter_offline_changes(
+    base_file: str,
+    head_file: str,
+    tmp_dir: t.Optional[str] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> t.Iterator[PublicationChange]:
+    """Stream the subjects added, removed or modified from base_file to head_file, in term order.
+
+    Args:
+        base_file, head_file: N-Triples dumps (.nt or .nt.gz)
+        tmp_dir: where sorted runs are spilled (default: the system temp directory)
+        memory_budget: approximate bytes of triples buffered per dump before spilling
+    """
+    with run_directory(tmp_dir) as run_dir:
+        base = subject_records(base_file, run_dir, memory_budget)
+        head = subject_records(head_file, run_dir, memory_budget)
+        for subject, before, after in merge_by_key(base, head):
+            if not after:
+                yield PublicationChange(subject[1:-1], 'removed', before, None)
+            elif not before:
+                yield PublicationChange(subject[1:-1], 'added', None, after)
+            elif before != after:
+                yield PublicationChange(subject[1:-1], 'modified', before, after)
@@ -0,0 +1,131 @@
+"""Per-publication content hashes, stored with each stashed release.
+
+A publication's hash is a digest of its record (see publication_records.py):
+every (predicate, value) pair, sorted, with blank nodes replaced by their
+canonical signatures, so the hash does not depend on triple order or blank
+node labels. Equal hashes mean equal records.
+
+Hashes are computed once, when a release is imported, from the subject records
+of offline_diff.subject_records, and stored as a table sorted by publication:
+
+    stash/indexes/<md5>/pub-hashes
+    ├── meta.json
+    ├── pubs.bin, pubs_offsets.npy    publication terms ('<iri>'), in term order (see term_table.py)
+    └── hashes.npy                    HASH_SIZE bytes per publication, by publication id
+
+Diffing two releases is then a linear merge of their tables, which never reads
+the dumps: diff_publication_hashes yields each publication added, removed, or
+whose hash changed. Anything derived from a single publication (rendered
+records, notes) can be cached under its hash and invalidated exactly.
+
+"""
+from hashlib import blake2b
+import json
+from os import path
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.external_sort import run_directory
+from dblp_service.local_storage.memory_store import DBLP_PUBLICATION, RDF_TYPE
+from dblp_service.local_storage.term_table import TermTable, replace_dir, staging_dir, write_term_table
+from dblp_service.services.offline_diff import DEFAULT_MEMORY_BUDGET, merge_by_key, subject_records
+from dblp_service.services.publication_records import ChangeKind, PublicationRecord
+
+log = create_logger(__file__)
+
+HASHES_FORMAT = 1
+HASH_SIZE = 16
+
+
+def publication_hash(record: PublicationRecord) -> bytes:
+    """Digest of a record's (predicate, value) pairs, in sorted order."""
+    digest = blake2b(digest_size=HASH_SIZE)
+    for pred, objs in sorted(record.fields.items()):
+        for obj in sorted(objs):
+            digest.update(f'{pred} {obj}\n'.encode('utf-8'))
+    return digest.digest()
+
+
+def is_publication(record: PublicationRecord) -> bool:
+    return DBLP_PUBLICATION in record.fields.get(RDF_TYPE, ())
+
+
+def build_publication_hashes(
+    rdf_file: str,
+    hashes_dir: str,
+    tmp_dir: t.Optional[str] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> int:
+    """Hash every publication of an N-Triples file into hashes_dir, returning the publication count.
+
+    Args:
+        rdf_file: .nt or .nt.gz dump
+        hashes_dir: the table directory, replaced once completely written
+        tmp_dir: where sorted runs are spilled (default: the system temp directory)
+        memory_budget: approximate bytes of triples buffered before spilling
+    """
+    tmp_table = staging_dir(hashes_dir)
+    hashes = bytearray()
+
+    def publication_terms() -> t.Iterator[str]:
+        with run_directory(tmp_dir) as run_dir:
+            for subject, record in subject_records(rdf_file, run_dir, memory_budget):
+                if is_publication(record):
+                    hashes.extend(publication_hash(record))
+                    yield subject
+
+    pub_count = write_term_table(tmp_table, publication_terms(), 'pubs')
+    np.save(path.join(tmp_table, 'hashes.npy'), np.frombuffer(hashes, dtype=np.uint8).reshape(-1, HASH_SIZE))
+    with open(path.join(tmp_table, 'meta.json'), 'w') as f:
+        json.dump({'format': HASHES_FORMAT, 'hash': f'blake2b-{HASH_SIZE}', 'pubs': pub_count}, f)
+
+    replace_dir(tmp_table, hashes_dir)
+    log.info(f'Hashed {pub_count:,} publications of {rdf_file} into {hashes_dir}')
+    return pub_count
+
+
+def is_publication_hashes(hashes_dir: str) -> bool:
+    return path.exists(path.join(hashes_dir, 'meta.json'))
+
+
+class PublicationHashes:
+    hashes_dir: str
+    pubs: TermTable
+    hashes: npt.NDArray[np.uint8]
+
+    def __init__(self, hashes_dir: str):
+        self.hashes_dir = hashes_dir
+        with open(path.join(hashes_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != HASHES_FORMAT:
+            raise Exception(f'Unsupported publication hashes format {meta["format"]} in {hashes_dir}')
+        self.pubs = TermTable(hashes_dir, 'pubs')
+        self.hashes = np.load(path.join(hashes_dir, 'hashes.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.pubs)
+
+    def hash_of(self, pubURI: str) -> t.Optional[bytes]:
+        """The content hash of a publication, or None if it is not in the release."""
+        pub_id = self.pubs.term_id(f'<{pubURI}>')
+        return None if pub_id is None else self.hashes[pub_id].tobytes()
+
+    def items(self) -> t.Iterator[t.Tuple[str, bytes]]:
+        """Stream (publication term, hash), in term order."""
+        for pub_id in range(len(self.pubs)):
+            yield self.pubs.term(pub_id), self.hashes[pub_id].tobytes()
+
+
+def diff_publication_hashes(base: PublicationHashes, head: PublicationHashes) -> t.Iterator[t.Tuple[str, ChangeKind]]:
+    """Stream (publication IRI, change) for the publications added, removed or
+    modified from base to head, in term order."""
+    for term, before, after in merge_by_key(base.items(), head.items()):
+        if after is None:
+            yield term[1:-1], 'removed'
+        elif before is None:
+            yield term[1:-1], 'added'
+        elif before != after:
+            yield term[1:-1], 'modified'
@@ -0,0 +1,138 @@
+"""Per-release publication key sets, for membership checks without Fuseki.
+
+Whether a publication is in a release (e.g., is it new in head, or was it in
+base) is answered in-process from two memory-mapped files, built when the
+release is imported:
+
+    stash/indexes/<md5>/pub-keys
+    ├── meta.json                   key count, Bloom filter size and hash count
+    ├── bloom.npy                   Bloom filter bits (uint8)
+    └── keys.bin, keys_offsets.npy  sorted dblp keys (see term_table.py)
+
+A key is the path of a publication IRI after https://dblp.org/rec/, e.g.,
+'reference/vision/Wong14'. A lookup first probes the Bloom filter, which
+rules out most absent keys by touching k bits; keys it lets through are
+confirmed by a binary search over the sorted keys, so answers are exact.
+
+Keys come from the release's publication hashes (see publication_hashes.py),
+which are in term order, not key order, so they are sorted again within a
+memory budget (external_sort.ExternalSorter).
+
+"""
+from hashlib import blake2b
+import json
+import math
+from os import path
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.external_sort import ExternalSorter, run_directory
+from dblp_service.local_storage.term_table import TermTable, replace_dir, staging_dir, write_term_table
+
+log = create_logger(__file__)
+
+KEYS_FORMAT = 1
+REC_PREFIX = 'https://dblp.org/rec/'
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+DEFAULT_MEMORY_BUDGET = 256 << 20
+BATCH_SIZE = 1 << 16
+
+
+def publication_key(pub: str) -> str:
+    """The dblp key of a publication IRI; a key is returned as is."""
+    return pub[len(REC_PREFIX) :] if pub.startswith(REC_PREFIX) else pub
+
+
+def bloom_size(key_count: int, false_positive_rate: float) -> t.Tuple[int, int]:
+    """(bits, hash count) of a Bloom filter for key_count keys at the given false positive rate."""
+    bits = max(64, math.ceil(-max(key_count, 1) * math.log(false_positive_rate) / math.log(2) ** 2))
+    hashes = max(1, round(bits / max(key_count, 1) * math.log(2)))
+    return bits, hashes
+
+
+def bloom_positions(key: str, bits: int, hashes: int) -> t.List[int]:
+    """The bits of a key: double hashing over a 128-bit digest."""
+    digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def set_bloom_bits(bloom: npt.NDArray[np.uint8], keys: t.List[str], bits: int, hashes: int):
+    positions = np.array([pos for key in keys for pos in bloom_positions(key, bits, hashes)], dtype=np.uint64)
+    np.bitwise_or.at(bloom, positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+
+def build_publication_keys(
+    pubs: t.Iterable[str],
+    keys_dir: str,
+    tmp_dir: t.Optional[str] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+) -> int:
+    """Write the key set of a release's publications (IRIs or keys), returning the key count."""
+    tmp_table = staging_dir(keys_dir)
+    with run_directory(tmp_dir) as run_dir:
+        sorter = ExternalSorter(run_dir, memory_budget)
+        added = 0
+        for pub in pubs:
+            sorter.add(publication_key(pub), '')
+            added += 1
+
+        bits, hashes = bloom_size(added, false_positive_rate)
+        bloom = np.zeros((bits + 7) // 8, dtype=np.uint8)
+        batch: t.List[str] = []
+
+        def sorted_keys() -> t.Iterator[str]:
+            for key, _ in sorter.groups():
+                batch.append(key)
+                if len(batch) >= BATCH_SIZE:
+                    set_bloom_bits(bloom, batch, bits, hashes)
+                    batch.clear()
+                yield key
+
+        key_count = write_term_table(tmp_table, sorted_keys(), 'keys')
+        set_bloom_bits(bloom, batch, bits, hashes)
+
+    np.save(path.join(tmp_table, 'bloom.npy'), bloom)
+    with open(path.join(tmp_table, 'meta.json'), 'w') as f:
+        json.dump({'format': KEYS_FORMAT, 'keys': key_count, 'bits': bits, 'hashes': hashes}, f)
+
+    replace_dir(tmp_table, keys_dir)
+    log.info(f'Wrote {key_count:,} publication keys to {keys_dir} ({bits // 8:,} byte Bloom filter, {hashes} hashes)')
+    return key_count
+
+
+def is_publication_keys(keys_dir: str) -> bool:
+    return path.exists(path.join(keys_dir, 'meta.json'))
+
+
+class PublicationKeys:
+    keys_dir: str
+    keys: TermTable
+    bloom: npt.NDArray[np.uint8]
+    bits: int
+    hashes: int
+
+    def __init__(self, keys_dir: str):
+        self.keys_dir = keys_dir
+        with open(path.join(keys_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != KEYS_FORMAT:
+            raise Exception(f'Unsupported publication keys format {meta["format"]} in {keys_dir}')
+        self.bits, self.hashes = meta['bits'], meta['hashes']
+        self.keys = TermTable(keys_dir, 'keys')
+        self.bloom = np.load(path.join(keys_dir, 'bloom.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def might_contain(self, pub: str) -> bool:
+        """False if the publication (IRI or key) is certainly absent; True if it probably is present."""
+        positions = bloom_positions(publication_key(pub), self.bits, self.hashes)
+        return all(self.bloom[pos >> 3] >> (pos & 7) & 1 for pos in positions)
+
+    def __contains__(self, pub: str) -> bool:
+        return self.might_contain(pub) and self.keys.term_id(publication_key(pub)) is not None
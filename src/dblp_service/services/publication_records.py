@@ -0,0 +1,147 @@
+"""Field-level comparison of publications across two dblp releases.
+
+A publication's record is the set of values of each of its predicates, built
+from the rows of RdfBackend.publication_rows. Blank nodes (e.g., author
+signatures, identifiers) carry release-specific labels, so each is replaced by a
+canonical signature of its own tuples:
+
+    dblp:hasSignature  ->  {'[dblp:signatureCreator <pid>; dblp:signatureOrdinal 2; ...]', ...}
+
+Two records are equal iff each predicate has the same set of values, so fixed
+titles, added DOIs and reordered or merged authors (changed signatures) all
+show up as changed predicates.
+
+iter_publication_changes merge-joins the publications of two graphs, both
+streamed in term order (rdf_backend.iri_order_key), and fetches records in batches, so changes are yielded
+as they are found and memory stays bounded by the batch size.
+
+"""
+from collections import defaultdict
+import dataclasses as dc
+import typing as t
+
+from dblp_service.local_storage.graph_naming import GraphName
+from dblp_service.local_storage.rdf_backend import RdfBackend, iri_order_key
+from dblp_service.local_storage.sparql_client import Row
+
+ChangeKind: t.TypeAlias = t.Literal['added', 'removed', 'modified']
+Fields: t.TypeAlias = t.Dict[str, t.FrozenSet[str]]
+
+
+def blank_signature(tuples: t.Iterable[t.Tuple[str, str]]) -> str:
+    """Canonical form of a blank node: its (pred, obj) pairs, sorted."""
+    return '[' + '; '.join(f'{pred} {obj}' for pred, obj in sorted(set(tuples))) + ']'
+
+
+@dc.dataclass
+class PublicationRecord:
+    uri: str
+    fields: Fields
+
+    @staticmethod
+    def from_rows(uri: str, rows: t.Iterable[Row]) -> 'PublicationRecord':
+        """Build a record from rows [sub, pred, obj, bpred, bobj]."""
+        values: t.Dict[str, t.Set[str]] = defaultdict(set)
+        blanks: t.Dict[t.Tuple[str, str], t.List[t.Tuple[str, str]]] = defaultdict(list)
+        for _, pred, obj, bpred, bobj in rows:
+            if bpred is None:
+                values[pred].add(obj)
+            else:
+                blanks[(pred, obj)].append((bpred, bobj))
+
+        for (pred, _), tuples in blanks.items():
+            values[pred].add(blank_signature(tuples))
+
+        return PublicationRecord(uri, {pred: frozenset(objs) for pred, objs in values.items()})
+
+    def to_json(self) -> t.Dict[str, t.List[str]]:
+        return {pred: sorted(objs) for pred, objs in sorted(self.fields.items())}
+
+
+@dc.dataclass
+class FieldChange:
+    predicate: str
+    removed: t.FrozenSet[str]
+    added: t.FrozenSet[str]
+
+
+@dc.dataclass
+class PublicationChange:
+    uri: str
+    kind: ChangeKind
+    before: t.Optional[PublicationRecord]
+    after: t.Optional[PublicationRecord]
+
+    def field_changes(self) -> t.List[FieldChange]:
+        """The predicates whose values differ, with the values removed and added."""
+        before = self.before.fields if self.before else {}
+        after = self.after.fields if self.after else {}
+        changes: t.List[FieldChange] = []
+        for pred in sorted(before.keys() | after.keys()):
+            old, new = before.get(pred, frozenset()), after.get(pred, frozenset())
+            if old != new:
+                changes.append(FieldChange(pred, old - new, new - old))
+        return changes
+
+    @property
+    def changed_predicates(self) -> t.List[str]:
+        return [change.predicate for change in self.field_changes()]
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        return {
+            'uri': self.uri,
+            'kind': self.kind,
+            'changes': {
+                change.predicate: {'removed': sorted(change.removed), 'added': sorted(change.added)}
+                for change in self.field_changes()
+            },
+        }
+
+
+def merge_join(base: t.Iterator[str], head: t.Iterator[str]) -> t.Iterator[t.Tuple[str, bool, bool]]:
+    """Merge two streams of IRIs, each sorted by iri_order_key, yielding (iri, in_base, in_head)."""
+    b, h = next(base, None), next(head, None)
+    while b is not None or h is not None:
+        if h is None or (b is not None and iri_order_key(b) < iri_order_key(h)):
+            yield b, True, False  # type: ignore
+            b = next(base, None)
+        elif b is None or iri_order_key(h) < iri_order_key(b):
+            yield h, False, True
+            h = next(head, None)
+        else:
+            yield b, True, True
+            b, h = next(base, None), next(head, None)
+
+
+def fetch_records(backend: RdfBackend, graph: GraphName, uris: t.List[str]) -> t.Dict[str, PublicationRecord]:
+    if not uris:
+        return {}
+    rows_by_pub: t.Dict[str, t.List[Row]] = defaultdict(list)
+    for row in backend.publication_rows(graph, uris):
+        rows_by_pub[row[0]].append(row)
+    return {uri: PublicationRecord.from_rows(uri, rows_by_pub[uri]) for uri in uris}
+
+
+def iter_publication_changes(
+    backend: RdfBackend,
+    base: GraphName,
+    head: GraphName,
+    batch_size: int = 500,
+) -> t.Iterator[PublicationChange]:
+    """Stream the publications added, removed or modified from base to head, by iri_order_key.
+
+    Records are fetched and compared batch_size publications at a time, while
+    both publication streams are held open; SparqlClient runs these nested
+    calls in the thread's one concurrency slot.
+    """
+    joined = merge_join(backend.publications(base), backend.publications(head))
+    while batch := [entry for _, entry in zip(range(batch_size), joined)]:
+        before = fetch_records(backend, base, [uri for uri, in_base, _ in batch if in_base])
+        after = fetch_records(backend, head, [uri for uri, _, in_head in batch if in_head])
+        for uri, in_base, in_head in batch:
+            if not in_head:
+                yield PublicationChange(uri, 'removed', before[uri], None)
+            elif not in_base:
+                yield PublicationChange(uri, 'added', None, after[uri])
+            elif before[uri] != after[uri]:
+                yield PublicationChange(uri, 'modified', before[uri], after[uri])
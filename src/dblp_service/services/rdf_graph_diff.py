@@ -3,7 +3,13 @@ import typing as t
 from dblp_service.lib.log import AppLogger, create_logger
 from dblp_service.local_storage.file_stash_manager import FileStash
 from dblp_service.local_storage.jena_db import JenaDB
-from textwrap import dedent
+from dblp_service.local_storage.sparql_pager import SparqlKeysetIter
+from dblp_service.services.affected_authors import AffectedAuthors
+from dblp_service.services.chunked_diff import DEFAULT_RANGE_SIZE, materialize_diff_graph
+from dblp_service.services.offline_diff import DEFAULT_MEMORY_BUDGET, iter_offline_changes
+from dblp_service.services.publication_keys import PublicationKeys, is_publication_keys
+from dblp_service.services.publication_records import PublicationChange, iter_publication_changes
+from dblp_service.services.rdf_patch import PatchStats, apply_rdf_patch, patch_headers, release_md5, write_rdf_patch
 
 from dblp_service.local_storage.graph_naming import (
     DblpGraphName,
@@ -34,17 +40,18 @@ class DiffEngine:
         else:
             self.log.warn(f'Stashed id found but no file located. md5={md5}')
 
-    def query_is_a_publication(self, graph: GraphName):
-        query_pubs = dedent(
-            f"""
-            PREFIX dblp: <https://dblp.org/rdf/schema#>
+    def query_is_a_publication(self, graph: t.Optional[GraphName] = None):
+        return [[pub] for pub in self.iter_is_a_publication(graph)]
 
-            SELECT ?s WHERE {{
-                GRAPH {graph.uri()} {{ ?s a dblp:Publication }}
-            }}
-        """
-        )
-        return self.jenadb.run_sparql_query(query_pubs)
+    def iter_is_a_publication(self, graph: t.Optional[GraphName] = None) -> t.Iterator[str]:
+        """Stream the IRIs of all publications in graph (default: the active graph)."""
+        return self.jenadb.backend.publications(graph or self.jenadb.resolve_alias())
+
+    def active_release(self) -> t.Optional[str]:
+        """The MD5 of the release the active graph holds, if one is active."""
+        active = self.jenadb.active_graph()
+        entry = self.jenadb.catalog.get_entry(active) if active and self.jenadb.catalog else None
+        return entry.source_md5 if entry else None
 
     def diff_publications_graphs(self, graph1: GraphName, graph2: GraphName) -> t.List[str]:
         """Return all publications in graph1 but not graph2
@@ -52,47 +59,150 @@ class DiffEngine:
         Query for difference (graph1 - graph2) for all tuples matching
         `?x a dblp:Publication`
         """
-        query_pubs = dedent(
-            f"""
-            PREFIX dblp: <https://dblp.org/rdf/schema#>
+        return list(self.iter_diff_publications(graph1, graph2))
+
+    def iter_diff_publications(self, graph1: GraphName, graph2: GraphName) -> t.Iterator[str]:
+        """Stream all publications in graph1 but not graph2, without holding the
+        full result in memory."""
+        return self.jenadb.backend.diff_publications(graph1, graph2)
+
+    def iter_publication_changes(
+        self, base: GraphName, head: GraphName, batch_size: int = 500
+    ) -> t.Iterator[PublicationChange]:
+        """Stream every publication added, removed or modified (field by field)
+        from base to head; see publication_records.py"""
+        return iter_publication_changes(self.jenadb.backend, base, head, batch_size)
+
+    def affected_authors(self, base: GraphName, head: GraphName, batch_size: int = 500) -> t.Set[str]:
+        """The authors (authoredBy and signatureCreator targets) of every
+        publication added, removed or modified from base to head; see affected_authors.py"""
+        affected = AffectedAuthors()
+        for change in self.iter_publication_changes(base, head, batch_size):
+            affected.add(change)
+        return affected.authors
+
+    def publication_keys(self, md5: str) -> PublicationKeys:
+        """The key set of a stashed release, for membership checks without
+        SPARQL, e.g. `key in engine.publication_keys(head_md5)`; see publication_keys.py"""
+        keys_dir = self.fstash.publication_keys_dir(md5)
+        if not is_publication_keys(keys_dir):
+            raise Exception(f'No publication keys for {md5}; build them with `stash index`')
+        return PublicationKeys(keys_dir)
+
+    def export_patch(
+        self,
+        base_md5: str,
+        head_md5: str,
+        patch_file: str,
+        tmp_dir: t.Optional[str] = None,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    ) -> PatchStats:
+        """Write the changes from the stashed base release to the head release as
+        an RDF Patch (see rdf_patch.py), computed offline from the stashed files."""
+        rdf_files = [self.fstash.get_stashed_file(md5) for md5 in (base_md5, head_md5)]
+        [base_file, head_file] = [f.path if f else None for f in rdf_files]
+        if not base_file or not head_file:
+            raise Exception(f'Stashed files of both {base_md5} and {head_md5} are required to export a patch')
+        changes = iter_offline_changes(base_file, head_file, tmp_dir, memory_budget)
+        return write_rdf_patch(changes, patch_file, base_md5, head_md5)
+
+    def apply_patch(
+        self, patch_file: str, base: t.Optional[GraphName] = None, batch_size: int = 500
+    ) -> t.Tuple[DblpGraphName, PatchStats]:
+        """Create the graph of the release a patch leads to, from a loaded graph of
+        the release it follows, batch_size subjects per update.
+
+        Graphs named for an MD5 hold that release only (query_cache.py relies on
+        it), so base is copied to the head release's graph, which is patched;
+        base is left untouched. Returns the head graph.
+        """
+        headers = patch_headers(patch_file)
+        previous, head = release_md5(headers.get('previous')), release_md5(headers.get('id'))
+        if not head:
+            raise Exception(f'Patch {patch_file} does not name the release it leads to')
+        if base is None:
+            if not previous:
+                raise Exception(f'Patch {patch_file} does not name the release it follows; give the base graph')
+            base = md5_to_graph_name(previous)
+        if previous and isinstance(base, DblpGraphName) and base.md5 != previous:
+            raise Exception(f'Patch applies to release {previous}, not {base.md5}')
+        entry = self.jenadb.catalog.get_entry(base) if self.jenadb.catalog else None
+        if entry and previous and entry.source_md5 and entry.source_md5 != previous:
+            raise Exception(f'Patch applies to release {previous}, but {base.qname()} holds {entry.source_md5}')
+
+        head_graph = md5_to_graph_name(head)
+        if head_graph.qname() == base.qname():
+            raise Exception(f'Patch {patch_file} leads to the release {base.qname()} already holds')
+        self.jenadb.backend.copy_graph(base, head_graph)
+        stats = apply_rdf_patch(self.jenadb.backend, head_graph, patch_file, batch_size)
+        self.jenadb.record_graph(head_graph)
+        return head_graph, stats
+
+    def paged_diff_publications(
+        self,
+        graph1: GraphName,
+        graph2: GraphName,
+        *,
+        page_size: int = 10000,
+        start_after: t.Optional[str] = None,
+    ) -> SparqlKeysetIter:
+        """Iterate over all publications in graph1 but not graph2, page_size at a time.
+
+        The returned iterator's cursor may be saved and passed back as
+        start_after to resume an interrupted run.
+
+        The cursor is tested within graph1's pattern, so each page probes graph2
+        only for the publications after it. Each page still scans graph1's
+        publications from the start and sorts the rest of the difference, so a
+        full pass costs about one scan of graph1 per page: prefer a large
+        page_size, or RdfBackend.diff_publications for one unpaged stream.
+        """
 
-            SELECT ?s WHERE {{
-                GRAPH {graph1.uri()} {{ ?s a dblp:Publication }}
+        def where(keyset_filter: str) -> str:
+            return f"""
+                GRAPH {graph1.uri()} {{ ?s a dblp:Publication {keyset_filter} }}
                 FILTER NOT EXISTS {{
                     GRAPH {graph2.uri()} {{ ?s a dblp:Publication }}
                 }}
-            }}
             """
+
+        return SparqlKeysetIter(
+            lambda query: self.jenadb.run_sparql_query(query, 'diff-publications-page'),
+            where,
+            ['s'],
+            prefixes='PREFIX dblp: <https://dblp.org/rdf/schema#>',
+            page_size=page_size,
+            start_after=start_after,
         )
-        entries = self.jenadb.run_sparql_query(query_pubs)
-        return [entry[0] for entry in entries]
 
-    def create_diff_graph(self, graph1: DblpGraphName, graph2: DblpGraphName) -> DiffGraphName:
+    def create_diff_graph(
+        self,
+        graph1: DblpGraphName,
+        graph2: DblpGraphName,
+        *,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        concurrency: int = 1,
+        checkpoint_file: t.Optional[str] = None,
+    ) -> DiffGraphName:
         """Create a new graph containing all publications in graph1 but not graph2
 
         Query for difference (graph1 - graph2) for all tuples matching
-        `?x a dblp:Publication`, then insert those tuples into a new graph
+        `?x a dblp:Publication`, then insert those tuples into a new graph,
+        one key range of publications per update (see chunked_diff.py). With
+        a checkpoint_file, an interrupted run resumes at the unfinished ranges.
         """
 
         diff_graph = DiffGraphName(graph2, graph1)
-        query_pubs = dedent(
-            f"""
-            PREFIX dblp: <https://dblp.org/rdf/schema#>
-
-            INSERT {{
-              GRAPH {diff_graph.uri()} {{
-                ?pub a dblp:Publication
-              }}
-            }}
-            WHERE {{
-                GRAPH {graph1.uri()} {{ ?pub a dblp:Publication }}
-                FILTER NOT EXISTS {{
-                    GRAPH {graph2.uri()} {{ ?pub a dblp:Publication }}
-                }}
-            }}
-            """
+        materialize_diff_graph(
+            self.jenadb.backend,
+            graph1,
+            graph2,
+            diff_graph,
+            range_size=range_size,
+            concurrency=concurrency,
+            checkpoint_file=checkpoint_file,
         )
-        self.jenadb.run_sparql_update(query_pubs)
+        self.jenadb.record_graph(diff_graph)
         return diff_graph
 
     def load_active_graphs(self):
@@ -0,0 +1,196 @@
+"""Release-to-release deltas as RDF Patch files, to update loaded graphs in place.
+
+Rather than downloading and loading every full release, a node holding the
+base release can be moved to the head release by a patch: the triples deleted
+and added by each changed subject, computed offline (see offline_diff.py) and
+written in RDF Patch syntax (https://afs.github.io/rdf-patch/), gzipped if the
+file name ends with .gz:
+
+    H id <urn:dblp:release:<head md5>> .
+    H previous <urn:dblp:release:<base md5>> .
+    TX .
+    D <https://dblp.org/rec/x> <https://dblp.org/rdf/schema#title> "Old title." .
+    A <https://dblp.org/rec/x> <https://dblp.org/rdf/schema#title> "New title." .
+    D <https://dblp.org/rec/x> <https://dblp.org/rdf/schema#hasSignature> _:d0 .
+    D _:d0 <https://dblp.org/rdf/schema#signatureOrdinal> "2"^^<...#integer> .
+    ...
+    TC .
+
+Rows are grouped by subject, with a subject's blank nodes right after it, and
+only the changed values of modified subjects are listed. Blank nodes are
+matched by their contents on delete (see RdfBackend.patch_graph), as their
+labels differ from node to node.
+
+apply_rdf_patch streams a patch into RdfBackend.patch_graph, a batch of
+subjects per update.
+
+"""
+import dataclasses as dc
+import gzip
+from itertools import count
+import re
+import typing as t
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.graph_naming import GraphName
+from dblp_service.local_storage.ntriples import Triple, blank, iri, is_blank, literal, parse_ntriples_line
+from dblp_service.local_storage.rdf_backend import RdfBackend
+from dblp_service.services.publication_records import PublicationChange
+
+log = create_logger(__file__)
+
+RELEASE_URN = 'urn:dblp:release:'
+PatchOp: t.TypeAlias = t.Literal['A', 'D']
+PatchRow: t.TypeAlias = t.Tuple[PatchOp, Triple]
+
+signature_tuple_re = re.compile(rf'({iri}) ({iri}|{blank}|{literal})(?:; |\]$)')
+
+
+@dc.dataclass
+class PatchStats:
+    subjects: int = 0
+    deleted: int = 0
+    added: int = 0
+
+
+def signature_tuples(signature: str) -> t.List[t.Tuple[str, str]]:
+    """The (pred, obj) terms of a blank node signature, '[p o; p o]' (see offline_diff.py)."""
+    return signature_tuple_re.findall(signature[1:])
+
+
+def value_triples(sub: str, pred: str, value: str, labels: t.Iterator[int], prefix: str) -> t.List[Triple]:
+    """The triples of one field value, expanding a blank node signature."""
+    if not value.startswith('['):
+        return [(sub, pred, value)]
+    node = f'_:{prefix}{next(labels)}'
+    return [(sub, pred, node)] + [(node, p, o) for p, o in signature_tuples(value)]
+
+
+def change_rows(change: PublicationChange, labels: t.Iterator[int]) -> t.Iterator[PatchRow]:
+    """The patch rows of a change between offline records (N-Triples terms)."""
+    sub = f'<{change.uri}>'
+    for field_change in change.field_changes():
+        for value in sorted(field_change.removed):
+            for triple in value_triples(sub, field_change.predicate, value, labels, 'd'):
+                yield 'D', triple
+    for field_change in change.field_changes():
+        for value in sorted(field_change.added):
+            for triple in value_triples(sub, field_change.predicate, value, labels, 'a'):
+                yield 'A', triple
+
+
+def open_patch(file_path: str, mode: t.Literal['r', 'w']) -> t.TextIO:
+    if file_path.endswith('.gz'):
+        return t.cast(t.TextIO, gzip.open(file_path, f'{mode}t', encoding='utf-8'))
+    return open(file_path, mode, encoding='utf-8')
+
+
+def write_rdf_patch(
+    changes: t.Iterable[PublicationChange],
+    patch_file: str,
+    base_md5: t.Optional[str] = None,
+    head_md5: t.Optional[str] = None,
+) -> PatchStats:
+    """Write changes between offline records (see offline_diff.iter_offline_changes) as one patch transaction."""
+    stats = PatchStats()
+    labels = count()
+    with open_patch(patch_file, 'w') as f:
+        if head_md5:
+            f.write(f'H id <{RELEASE_URN}{head_md5}> .\n')
+        if base_md5:
+            f.write(f'H previous <{RELEASE_URN}{base_md5}> .\n')
+        f.write('TX .\n')
+        for change in changes:
+            stats.subjects += 1
+            for op, (s, p, o) in change_rows(change, labels):
+                if op == 'D':
+                    stats.deleted += 1
+                else:
+                    stats.added += 1
+                f.write(f'{op} {s} {p} {o} .\n')
+        f.write('TC .\n')
+    return stats
+
+
+def patch_headers(patch_file: str) -> t.Dict[str, str]:
+    """The headers of a patch, e.g. {'id': '<urn:...>', 'previous': '<urn:...>'}."""
+    headers: t.Dict[str, str] = {}
+    with open_patch(patch_file, 'r') as f:
+        for line in f:
+            if not line.startswith('H '):
+                break
+            name, value = line[2:].rstrip().removesuffix(' .').split(' ', 1)
+            headers[name] = value
+    return headers
+
+
+def release_md5(header: t.Optional[str]) -> t.Optional[str]:
+    """The release MD5 of an id or previous header, if it names a dblp release."""
+    if header and header.startswith(f'<{RELEASE_URN}'):
+        return header[len(RELEASE_URN) + 1 : -1]
+    return None
+
+
+def read_rdf_patch(patch_file: str) -> t.Iterator[PatchRow]:
+    """Stream the rows of a patch; headers and transaction markers are checked and skipped."""
+    in_transaction = False
+    with open_patch(patch_file, 'r') as f:
+        for line in f:
+            op, _, rest = line.strip().partition(' ')
+            match op:
+                case '' | 'H':
+                    continue
+                case 'TX':
+                    in_transaction = True
+                case 'TC':
+                    in_transaction = False
+                case 'TA':
+                    raise Exception(f'Patch {patch_file} has an aborted transaction')
+                case 'A' | 'D' if in_transaction:
+                    if (triple := parse_ntriples_line(rest)) is None:
+                        raise Exception(f'Invalid patch row: {line!r}')
+                    yield t.cast(PatchOp, op), triple
+                case _:
+                    raise Exception(f'Unsupported patch row: {line!r}')
+    if in_transaction:
+        raise Exception(f'Patch {patch_file} ends inside a transaction')
+
+
+def subject_groups(rows: t.Iterable[PatchRow]) -> t.Iterator[t.List[PatchRow]]:
+    """Group rows by IRI subject; rows about blank nodes go with the preceding subject."""
+    group: t.List[PatchRow] = []
+    for row in rows:
+        s = row[1][0]
+        if group and not is_blank(s) and s != group[0][1][0]:
+            yield group
+            group = []
+        group.append(row)
+    if group:
+        yield group
+
+
+def apply_rdf_patch(backend: RdfBackend, graph_name: GraphName, patch_file: str, batch_size: int = 500) -> PatchStats:
+    """Apply a patch to a graph, batch_size subjects per update."""
+    stats = PatchStats()
+    deletes: t.List[Triple] = []
+    adds: t.List[Triple] = []
+    batch_subjects = 0
+
+    def flush():
+        nonlocal deletes, adds, batch_subjects
+        backend.patch_graph(graph_name, deletes, adds)
+        stats.deleted += len(deletes)
+        stats.added += len(adds)
+        deletes, adds, batch_subjects = [], [], 0
+        log.debug(f'Patched {graph_name.qname()}: {stats.subjects:,} subjects')
+
+    for group in subject_groups(read_rdf_patch(patch_file)):
+        stats.subjects += 1
+        batch_subjects += 1
+        for op, triple in group:
+            (deletes if op == 'D' else adds).append(triple)
+        if batch_subjects >= batch_size:
+            flush()
+    if batch_subjects:
+        flush()
+    return stats
@@ -0,0 +1,192 @@
+"""Stored deltas between releases, composed to diff any two releases.
+
+A delta lists the publications whose content hash (see publication_hashes.py)
+differs between two releases, with the hash before and after; ABSENT stands
+for a publication missing from a release:
+
+    stash/deltas/<base md5>-<head md5>
+    ├── meta.json                  base and head md5s
+    ├── pubs.bin, pubs_offsets.npy changed publication terms, in term order (see term_table.py)
+    └── before.npy, after.npy      HASH_SIZE bytes per publication, by publication id
+
+A delta is built once per pair of consecutive releases, from their hash tables.
+Deltas compose: a publication's change from r0 to rn is its hash in the first
+delta of the chain which lists it, and its hash in the last one. Publications
+a delta does not list kept their hash over that step. So a k-way merge of the
+stored deltas, which are small next to a release, diffs r0 and rn without
+reading either release:
+
+    r0 -> r1 -> r2 -> r3     compose_deltas([d01, d12, d23])  ==  delta(r0, r3)
+
+Publications which end with the hash they started with (e.g., added then
+removed, or edited and reverted) drop out. Deltas can be walked backwards too,
+swapping before and after, so ReleaseDeltas.path finds a chain between any two
+releases connected by stored deltas.
+
+"""
+from collections import deque
+import heapq
+from itertools import groupby
+import json
+import os
+from os import path
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+from dblp_service.lib.log import create_logger
+from dblp_service.local_storage.term_table import TermTable, replace_dir, staging_dir, write_term_table
+from dblp_service.services.offline_diff import merge_by_key
+from dblp_service.services.publication_hashes import HASH_SIZE, PublicationHashes
+from dblp_service.services.publication_records import ChangeKind
+
+log = create_logger(__file__)
+
+DELTA_FORMAT = 1
+ABSENT = bytes(HASH_SIZE)
+
+# (publication term, hash before, hash after)
+DeltaEntry: t.TypeAlias = t.Tuple[str, bytes, bytes]
+# (base md5, head md5, walked backwards)
+DeltaStep: t.TypeAlias = t.Tuple[str, str, bool]
+
+
+def hash_delta(base: PublicationHashes, head: PublicationHashes) -> t.Iterator[DeltaEntry]:
+    """Stream the entries of the delta from base to head, in term order."""
+    for term, before, after in merge_by_key(base.items(), head.items()):
+        if before != after:
+            yield term, before or ABSENT, after or ABSENT
+
+
+def write_delta(entries: t.Iterable[DeltaEntry], delta_dir: str, base_md5: str, head_md5: str) -> int:
+    """Store delta entries, in term order, into delta_dir, returning the entry count."""
+    tmp_dir = staging_dir(delta_dir)
+    befores, afters = bytearray(), bytearray()
+
+    def terms() -> t.Iterator[str]:
+        for term, before, after in entries:
+            befores.extend(before)
+            afters.extend(after)
+            yield term
+
+    count = write_term_table(tmp_dir, terms(), 'pubs')
+    for name, hashes in [('before', befores), ('after', afters)]:
+        np.save(path.join(tmp_dir, f'{name}.npy'), np.frombuffer(hashes, dtype=np.uint8).reshape(-1, HASH_SIZE))
+    with open(path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump({'format': DELTA_FORMAT, 'base': base_md5, 'head': head_md5, 'pubs': count}, f)
+
+    replace_dir(tmp_dir, delta_dir)
+    return count
+
+
+class StoredDelta:
+    delta_dir: str
+    base_md5: str
+    head_md5: str
+    pubs: TermTable
+    before: npt.NDArray[np.uint8]
+    after: npt.NDArray[np.uint8]
+
+    def __init__(self, delta_dir: str):
+        self.delta_dir = delta_dir
+        with open(path.join(delta_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != DELTA_FORMAT:
+            raise Exception(f'Unsupported delta format {meta["format"]} in {delta_dir}')
+        self.base_md5, self.head_md5 = meta['base'], meta['head']
+        self.pubs = TermTable(delta_dir, 'pubs')
+        self.before = np.load(path.join(delta_dir, 'before.npy'), mmap_mode='r')
+        self.after = np.load(path.join(delta_dir, 'after.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.pubs)
+
+    def entries(self, backwards: bool = False) -> t.Iterator[DeltaEntry]:
+        """Stream the entries in term order; backwards gives the delta from head to base."""
+        before, after = (self.after, self.before) if backwards else (self.before, self.after)
+        for pub_id in range(len(self.pubs)):
+            yield self.pubs.term(pub_id), before[pub_id].tobytes(), after[pub_id].tobytes()
+
+
+def compose_deltas(chain: t.List[t.Iterator[DeltaEntry]]) -> t.Iterator[DeltaEntry]:
+    """Compose the deltas of consecutive steps r0 -> r1 -> ... -> rn into the delta r0 -> rn."""
+    steps = [((term, step, before, after) for term, before, after in entries) for step, entries in enumerate(chain)]
+    for term, entries in groupby(heapq.merge(*steps), key=lambda entry: entry[0]):
+        changes = list(entries)
+        before, after = changes[0][2], changes[-1][3]
+        if before != after:
+            yield term, before, after
+
+
+def delta_kind(before: bytes, after: bytes) -> ChangeKind:
+    if before == ABSENT:
+        return 'added'
+    if after == ABSENT:
+        return 'removed'
+    return 'modified'
+
+
+class ReleaseDeltas:
+    """The deltas stored under a directory, one subdirectory per pair of releases."""
+
+    deltas_dir: str
+    deltas: t.Dict[t.Tuple[str, str], str]
+
+    def __init__(self, deltas_dir: str):
+        self.deltas_dir = deltas_dir
+        self.deltas = {}
+        for name in sorted(os.listdir(deltas_dir)) if path.isdir(deltas_dir) else []:
+            meta_file = path.join(deltas_dir, name, 'meta.json')
+            if path.exists(meta_file):
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                self.deltas[(meta['base'], meta['head'])] = path.join(deltas_dir, name)
+
+    def delta_dir(self, base_md5: str, head_md5: str) -> str:
+        return path.join(self.deltas_dir, f'{base_md5}-{head_md5}')
+
+    def add(self, base: PublicationHashes, head: PublicationHashes, base_md5: str, head_md5: str) -> int:
+        """Build and store the delta between two hashed releases, returning its entry count."""
+        delta_dir = self.delta_dir(base_md5, head_md5)
+        count = write_delta(hash_delta(base, head), delta_dir, base_md5, head_md5)
+        self.deltas[(base_md5, head_md5)] = delta_dir
+        log.info(f'Stored delta {base_md5} -> {head_md5}: {count:,} publications')
+        return count
+
+    def path(self, base_md5: str, head_md5: str) -> t.Optional[t.List[DeltaStep]]:
+        """The shortest chain of stored deltas from base to head, walking deltas
+        either way, or None if the releases are not connected."""
+        neighbours: t.Dict[str, t.List[DeltaStep]] = {}
+        for b, h in self.deltas:
+            neighbours.setdefault(b, []).append((b, h, False))
+            neighbours.setdefault(h, []).append((b, h, True))
+
+        came_from: t.Dict[str, t.Optional[DeltaStep]] = {base_md5: None}
+        queue = deque([base_md5])
+        while queue and head_md5 not in came_from:
+            md5 = queue.popleft()
+            for step in neighbours.get(md5, []):
+                b, h, backwards = step
+                if (next_md5 := b if backwards else h) not in came_from:
+                    came_from[next_md5] = step
+                    queue.append(next_md5)
+
+        if head_md5 not in came_from:
+            return None
+        steps: t.List[DeltaStep] = []
+        md5 = head_md5
+        while (step := came_from[md5]) is not None:
+            steps.append(step)
+            md5 = step[1] if step[2] else step[0]
+        return steps[::-1]
+
+    def changes(self, base_md5: str, head_md5: str) -> t.Optional[t.Iterator[t.Tuple[str, ChangeKind]]]:
+        """Stream (publication IRI, change) from base to head, in term order, by
+        composing stored deltas; None if no chain of deltas connects them."""
+        steps = self.path(base_md5, head_md5)
+        if steps is None:
+            return None
+        log.debug(f'Composing {len(steps)} deltas from {base_md5} to {head_md5}')
+        chain = [StoredDelta(self.deltas[(b, h)]).entries(backwards) for b, h, backwards in steps]
+        return ((term[1:-1], delta_kind(before, after)) for term, before, after in compose_deltas(chain))
@@ -0,0 +1,67 @@
+from os import path
+
+from dblp_service.local_storage.authorship_index import (
+    AuthorshipDelta,
+    AuthorshipIndex,
+    apply_authorship_delta,
+    authorship_delta,
+    build_authorship_index,
+    write_authorship_index,
+)
+from dblp_service.local_storage.columnar_store import ColumnarBackend
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.memory_store import DBLP_AUTHORED_BY, MemoryBackend
+from tests.helpers import get_resource_path
+
+l222 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+l338 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+WONG = 'https://dblp.org/pid/69/220'
+
+
+def test_authorship_index_lookups(tmp_path):
+    index_dir = path.join(tmp_path, 'authorship')
+    pairs = write_authorship_index([('a/2', 'p/1'), ('a/1', 'p/2'), ('a/1', 'p/1'), ('a/1', 'p/1')], index_dir)
+    assert pairs == 3
+
+    index = AuthorshipIndex(index_dir)
+    assert index.publications('a/1') == ['p/1', 'p/2']
+    assert index.publications('a/2') == ['p/1']
+    assert index.publications('a/3') == []
+    assert index.authors_of('p/1') == ['a/1', 'a/2']
+    assert sorted(index.pairs()) == [('a/1', 'p/1'), ('a/1', 'p/2'), ('a/2', 'p/1')]
+
+    delta = AuthorshipDelta(pubs={'p/1', 'p/3'}, pairs={('a/0', 'p/1'), ('a/2', 'p/3')})
+    assert apply_authorship_delta(index, delta, path.join(tmp_path, 'updated')) == 3
+    updated = AuthorshipIndex(path.join(tmp_path, 'updated'))
+    assert sorted(updated.pairs()) == [('a/0', 'p/1'), ('a/1', 'p/2'), ('a/2', 'p/3')]
+    assert updated.publications('a/2') == ['p/3']
+    assert updated.authors_of('p/1') == ['a/0']
+
+
+def test_authorship_index_matches_graph(tmp_path):
+    memory = MemoryBackend()
+    memory.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    build_authorship_index(get_resource_path('dblp-l222.nt'), path.join(tmp_path, 'l222'))
+    index = AuthorshipIndex(path.join(tmp_path, 'l222'))
+
+    expected = sorted((o[1:-1], s[1:-1]) for s, _, o in memory.graph(l222).match(p=DBLP_AUTHORED_BY))
+    assert expected and sorted(index.pairs()) == expected
+    assert index.publications(WONG) == ['https://dblp.org/rec/reference/vision/Wong14']
+
+
+def test_authorship_index_update_from_release_diff(tmp_path):
+    backend = ColumnarBackend(str(tmp_path))
+    backend.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    backend.load_graph(l338, get_resource_path('dblp-l338.nt'))
+    base_dir = path.join(tmp_path, 'l222-authorship')
+    build_authorship_index(get_resource_path('dblp-l222.nt'), base_dir)
+    full_dir = path.join(tmp_path, 'l338-authorship')
+    build_authorship_index(get_resource_path('dblp-l338.nt'), full_dir)
+
+    changed = list(backend.diff_publications(l338, l222)) + list(backend.diff_publications(l222, l338))
+    delta = authorship_delta(backend.store(l338), changed)
+    assert len(delta) == 4
+    updated_dir = path.join(tmp_path, 'updated')
+    apply_authorship_delta(AuthorshipIndex(base_dir), delta, updated_dir)
+
+    assert sorted(AuthorshipIndex(updated_dir).pairs()) == sorted(AuthorshipIndex(full_dir).pairs())
@@ -0,0 +1,47 @@
+import os
+from os import path
+import tempfile
+from textwrap import dedent
+
+from dblp_service.lib.config import ApacheJenaConfig
+from dblp_service.local_storage.bulk_loader import BulkLoader
+from dblp_service.local_storage.graph_naming import DblpGraphName
+
+fake_tdbloader = dedent(
+    """\
+    #!/bin/sh
+    echo "INFO  Loader = LoaderParallel"
+    echo "INFO  Start: $5"
+    echo "INFO  Add: 500,000 dblp.nt.gz (Batch: 250,000 / Avg: 250,000)"
+    echo "INFO  Add: 1,000,000 dblp.nt.gz (Batch: 250,000 / Avg: 250,000)"
+    echo "INFO  Finished: dblp.nt.gz: 1,234,567 tuples in 4.00s (Avg: 308,641)"
+    """
+)
+
+
+def test_bulk_loader_command():
+    loader = BulkLoader(ApacheJenaConfig(dbLocation='/data/tdb2'))
+    cmd = loader.loader_command(DblpGraphName('ed2c3d52'), '/stash/dblp.nt.gz')
+    assert cmd == [
+        'tdb2.tdbloader',
+        '--loader=parallel',
+        '--loc',
+        '/data/tdb2',
+        '--graph=http://rdfdb/g/ed2c3d',
+        '/stash/dblp.nt.gz',
+    ]
+
+
+def test_bulk_loader_reports_stats():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        executable = path.join(tmpdirname, 'tdb2.tdbloader')
+        with open(executable, 'w') as f:
+            f.write(fake_tdbloader)
+        os.chmod(executable, 0o755)
+
+        loader = BulkLoader(ApacheJenaConfig(dbLocation=tmpdirname, loaderExecutable=executable))
+        stats = loader.load(DblpGraphName('ed2c3d52'), 'dblp.nt.gz')
+
+    assert stats.triples == 1234567
+    assert stats.seconds == 4.0
+    assert round(stats.triples_per_second()) == 308642
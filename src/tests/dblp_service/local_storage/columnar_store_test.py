@@ -0,0 +1,99 @@
+from os import path
+
+import pytest
+
+from dblp_service.local_storage.authorship_index import build_authorship_index
+from dblp_service.local_storage.columnar_store import (
+    AUTHORSHIP_DIR,
+    ColumnarBackend,
+    ColumnarStore,
+    build_columnar_store,
+)
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.memory_store import MemoryBackend
+from tests.helpers import get_resource_path
+
+l222 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+l338 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+WONG = 'https://dblp.org/pid/69/220'
+
+
+@pytest.fixture
+def columnar_backend(tmp_path) -> ColumnarBackend:
+    backend = ColumnarBackend(str(tmp_path))
+    # l222 author lookups are served by its authorship index, l338's by the store
+    build_authorship_index(get_resource_path('dblp-l222.nt'), path.join(backend.graph_dir(l222), AUTHORSHIP_DIR))
+    backend.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    backend.load_graph(l338, get_resource_path('dblp-l338.nt'))
+    return backend
+
+
+def test_build_columnar_store(tmp_path):
+    store_dir = path.join(tmp_path, 'l222')
+    stats = build_columnar_store(get_resource_path('dblp-l222.nt'), store_dir)
+    store = ColumnarStore(store_dir)
+    assert stats.triples == len(store) == 197
+
+    pub = '<https://dblp.org/rec/reference/vision/Wong14>'
+    assert store.term(store.term_id(pub)) == pub
+    assert store.term_id('<https://example.org/missing>') is None
+
+    triples = list(store.match(s=pub))
+    assert triples and all(s == pub for s, _, _ in triples)
+    for s, p, o in triples:
+        assert list(store.match(s, p, o)) == [(s, p, o)]
+        assert (s, p, o) in list(store.match(p=p, o=o))
+        assert (s, p, o) in list(store.match(o=o))
+    assert list(store.match(s='<https://example.org/missing>')) == []
+
+
+def test_build_columnar_store_spills(tmp_path):
+    # a tiny sort budget spills many runs, and must build the same store
+    rdf_file = get_resource_path('dblp-l338.nt')
+    build_columnar_store(rdf_file, path.join(tmp_path, 'in-memory'))
+    build_columnar_store(rdf_file, path.join(tmp_path, 'spilled'), str(tmp_path), memory_budget=1000)
+    def read(store: str, name: str) -> bytes:
+        with open(path.join(tmp_path, store, name), 'rb') as f:
+            return f.read()
+
+    for name in ['terms.bin', 'spo_s.npy', 'spo_o.npy', 'pos_p.npy', 'pos_s.npy']:
+        assert read('in-memory', name) == read('spilled', name)
+
+
+def test_build_columnar_store_tab_literals(tmp_path):
+    rdf_file = path.join(tmp_path, 'tabs.nt')
+    pub = '<https://dblp.org/rec/x>'
+    title, plain = '"A\ttitle."', '"A title."'
+    with open(rdf_file, 'w') as f:
+        f.write(f'{pub} <https://dblp.org/rdf/schema#title> {title} .\n')
+        f.write(f'{pub} <https://dblp.org/rdf/schema#note> {plain} .\n')
+
+    store_dir = path.join(tmp_path, 'store')
+    build_columnar_store(rdf_file, store_dir)
+    store = ColumnarStore(store_dir)
+    assert store.term(store.term_id(title)) == title
+    assert {o for _, _, o in store.match(s=pub)} == {title, plain}
+
+
+def test_columnar_backend_matches_memory_backend(columnar_backend: ColumnarBackend):
+    memory = MemoryBackend()
+    memory.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    memory.load_graph(l338, get_resource_path('dblp-l338.nt'))
+
+    assert columnar_backend.count_graph(l222) == memory.count_graph(l222) == (197, 7)
+    assert columnar_backend.count_graph(l338) == memory.count_graph(l338)
+    assert list(columnar_backend.publications(l338)) == list(memory.publications(l338))
+    diff = list(columnar_backend.diff_publications(l338, l222))
+    assert len(diff) == 4
+    assert diff == list(memory.diff_publications(l338, l222))
+
+    def rows(backend, graph):
+        # blank node labels are scoped per load in MemoryBackend, so compare without them
+        def unlabeled(row):
+            return tuple(str(v) for v in (row[:3] + row[4:] if row[4] else row))
+
+        return sorted(unlabeled(row) for row in backend.author_publication_rows([WONG], graph))
+
+    assert l222.uri()[1:-1] in columnar_backend.authorship
+    for graph in [l222, l338]:
+        assert rows(columnar_backend, graph) and rows(columnar_backend, graph) == rows(memory, graph)
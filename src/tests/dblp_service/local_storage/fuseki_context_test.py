@@ -1,4 +1,13 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+from os import path
 from pprint import pprint
+import tempfile
+import threading
+import typing as t
+
+import pytest
 from SPARQLWrapper import SPARQLWrapper, JSON
 from dblp_service.local_storage.fuseki_context import FusekiServerManager
 from tests.dblp_service.local_storage.fixtures import *  # noqa
@@ -28,3 +37,69 @@ async def test_update_fetch(fuseki_manager: FusekiServerManager):
     )
     ret = sparql.queryAndConvert()
     pprint(ret)
+
+
+@contextmanager
+def ping_server() -> t.Generator[str, t.Any, t.Any]:
+    class PingHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200 if self.path == '/$/ping' else 404)
+            self.end_headers()
+
+        def log_message(self, format: str, *args: t.Any):
+            pass
+
+    server = ThreadingHTTPServer(('localhost', 0), PingHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield f'http://localhost:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def fake_fuseki(tmpdirname: str, script: str) -> str:
+    executable = path.join(tmpdirname, 'fuseki-server')
+    with open(executable, 'w') as f:
+        f.write(f'#!/bin/sh\n{script}\n')
+    os.chmod(executable, 0o755)
+    return executable
+
+
+async def test_attach_to_running_server():
+    with ping_server() as server_url:
+        manager = FusekiServerManager('no-such-fuseki-server', server_url=server_url)
+        async with manager:
+            assert manager.attached
+            assert manager.process is None
+            assert not manager.spawned()
+
+
+async def test_spawn_ready_on_log_line():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        executable = fake_fuseki(tmpdirname, 'echo "Server :: Started 2023/11/20"; sleep 30')
+        manager = FusekiServerManager(executable, server_url='http://localhost:1')
+        async with manager:
+            assert not manager.attached
+            assert manager.process is not None
+            assert manager.spawned()
+        assert manager.process is None
+        assert not manager.spawned()
+
+
+async def test_spawn_times_out():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        executable = fake_fuseki(tmpdirname, 'echo "starting"; sleep 30')
+        manager = FusekiServerManager(executable, server_url='http://localhost:1', startup_timeout=0.5)
+        with pytest.raises(TimeoutError):
+            await manager.start()
+        assert manager.process is None
+
+
+async def test_spawn_exits_early():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        executable = fake_fuseki(tmpdirname, 'echo "bad args"; exit 3')
+        manager = FusekiServerManager(executable, server_url='http://localhost:1')
+        with pytest.raises(Exception, match='status 3'):
+            await manager.start()
@@ -0,0 +1,95 @@
+from os import path
+import tempfile
+from unittest import mock
+
+import pytest
+
+from dblp_service.local_storage.graph_catalog import PREVIOUS_ALIAS, GraphCatalog, GraphCatalogEntry
+from dblp_service.local_storage.graph_naming import DblpGraphName, DiffGraphName
+from dblp_service.local_storage.jena_db import JenaDB
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.local_storage.sparql_client import SparqlClient
+from tests.helpers import get_resource_path
+
+g1 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+g2 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+
+
+def count_result(triples: int, pubs: int):
+    return {
+        'head': {'vars': ['triples', 'pubs']},
+        'results': {'bindings': [{'triples': {'value': str(triples)}, 'pubs': {'value': str(pubs)}}]},
+    }
+
+
+def test_catalog_record_and_remove():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        catalog = GraphCatalog(path.join(tmpdirname, 'jena', 'graph-catalog.json'))
+        assert not catalog.exists()
+        assert catalog.entries() == []
+
+        entry = GraphCatalogEntry(g1.qname(), g1.md5, 120, 7, '2023-11-20T10:00:00', 4096)
+        catalog.record(entry)
+        catalog.record(GraphCatalogEntry(g2.qname(), g2.md5, 200, 11, '2023-11-20T10:05:00', 8192))
+        catalog.record(GraphCatalogEntry(g1.qname(), g1.md5, 121, 7, '2023-11-21T10:00:00', 4096))
+
+        reloaded = GraphCatalog(catalog.catalog_file)
+        assert [g.qname() for g in reloaded.graph_names()] == [g2.qname(), g1.qname()]
+        assert (g1_entry := reloaded.get_entry(g1)) and g1_entry.triple_count == 121
+        assert 'g/ed2c3d' in reloaded.create_report()
+
+        reloaded.remove(g2)
+        assert [g.qname() for g in reloaded.graph_names()] == [g1.qname()]
+
+
+def test_jena_db_records_counts_and_lists_from_catalog():
+    ttl_file = get_resource_path('dblp-l222.ttl')
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        client = SparqlClient('http://localhost:3030/ds')
+        jenadb = JenaDB(client, GraphCatalog(path.join(tmpdirname, 'graph-catalog.json')))
+        diff_graph = DiffGraphName(g1, g2)
+
+        with mock.patch.object(client, 'update', return_value=200), mock.patch.object(
+            client, 'query', side_effect=[count_result(180, 7), count_result(4, 4)]
+        ) as query:
+            jenadb.load_graph(g1, ttl_file)
+            jenadb.record_graph(diff_graph)
+            assert [g.qname() for g in jenadb.get_named_graphs()] == [g1.qname(), diff_graph.qname()]
+            assert query.call_count == 2
+
+        assert jenadb.catalog
+        assert (entry := jenadb.catalog.get_entry(g1))
+        assert (entry.source_md5, entry.triple_count, entry.publication_count) == (g1.md5, 180, 7)
+        assert entry.source_size == path.getsize(ttl_file)
+        assert (diff_entry := jenadb.catalog.get_entry(diff_graph))
+        assert diff_entry.source_md5 is None
+
+
+def test_swap_alias_rolls_over_releases():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        catalog = GraphCatalog(path.join(tmpdirname, 'graph-catalog.json'))
+        backend = MemoryBackend()
+        jenadb = JenaDB(catalog=catalog, backend=backend)
+        assert jenadb.active_graph() is None
+        with pytest.raises(Exception, match='not set'):
+            jenadb.resolve_alias()
+        with pytest.raises(Exception, match='no publications'):
+            jenadb.activate_graph(g1)
+
+        for graph in (g1, g2):
+            backend.load_graph(graph, get_resource_path('dblp-l222.nt'))
+        with pytest.raises(Exception, match='not in the catalog'):
+            jenadb.activate_graph(g1)
+
+        catalog.record(GraphCatalogEntry(g1.qname(), g1.md5, 120, 7, '2023-11-20T10:00:00', 4096))
+        catalog.record(GraphCatalogEntry(g2.qname(), g2.md5, 200, 11, '2023-11-27T10:00:00', 8192))
+
+        assert jenadb.activate_graph(g1) is None
+        prior = jenadb.activate_graph(g2)
+        assert prior and prior.qname() == g1.qname()
+        assert jenadb.resolve_alias().qname() == g2.qname()
+        assert jenadb.resolve_alias(PREVIOUS_ALIAS).qname() == g1.qname()
+        assert 'active' in catalog.create_report()
+
+        with pytest.raises(Exception, match='alias'):
+            catalog.remove(g2)
@@ -1,8 +1,14 @@
+import threading
+import time
+import typing as t
+from unittest import mock
+
 from dblp_service.dblp_org.fetch_dblp_files import get_file_md5
 
 from dblp_service.local_storage.fuseki_context import FusekiServerManager
 from dblp_service.local_storage.graph_naming import DblpGraphName
-from dblp_service.local_storage.jena_db import JenaDB
+from dblp_service.local_storage.jena_db import AsyncJenaDB, JenaDB
+from dblp_service.local_storage.sparql_client import SparqlClient
 from tests.dblp_service.local_storage.fixtures import * # noqa
 
 from tests.helpers import get_resource_path
@@ -22,3 +28,27 @@ async def test_load_graph(
     print(graphs[0].uri())
     assert len(graphs) == 1
     assert graphs[0].uri() == '<http://rdfdb/g/ed2c3d>'
+
+
+async def test_async_jena_db_bounds_fan_out():
+    client = SparqlClient('http://localhost:3030/ds', max_concurrency=8)
+    lock = threading.Lock()
+    in_flight = [0]
+    max_in_flight = [0]
+
+    def slow_query(query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None):
+        with lock:
+            in_flight[0] += 1
+            max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        return {'head': {'vars': ['q']}, 'results': {'bindings': [{'q': {'value': query}}]}}
+
+    queries = [f'SELECT {i}' for i in range(12)]
+    with mock.patch.object(client, 'query', side_effect=slow_query):
+        async with AsyncJenaDB(JenaDB(client), concurrency=3) as adb:
+            results = await adb.run_queries(queries)
+
+    assert results == [[[q]] for q in queries]
+    assert max_in_flight[0] == 3
@@ -0,0 +1,95 @@
+import typing as t
+from unittest import mock
+
+import pytest
+
+from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.local_storage.graph_naming import DblpGraphName, DiffGraphName
+from dblp_service.local_storage.jena_db import JenaDB
+from dblp_service.local_storage.memory_store import MemoryBackend, TripleIndex
+from dblp_service.local_storage.ntriples import parse_ntriples_line
+from dblp_service.pub_formats.rdf_tuples.queries import AuthorTuple, get_author_publication_tree
+from dblp_service.services.rdf_graph_diff import DiffEngine
+from tests.helpers import get_resource_path
+
+l222 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+l338 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+WONG = 'https://dblp.org/pid/69/220'
+
+
+@pytest.fixture
+def memory_jena_db() -> JenaDB:
+    jenadb = JenaDB(backend=MemoryBackend())
+    jenadb.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    jenadb.load_graph(l338, get_resource_path('dblp-l338.nt'))
+    return jenadb
+
+
+def test_parse_ntriples_line():
+    assert parse_ntriples_line('  # comment') is None
+    assert parse_ntriples_line('<http://a> <http://b> "say \\"hi\\""@en-US .') == (
+        '<http://a>',
+        '<http://b>',
+        '"say \\"hi\\""@en-US',
+    )
+    assert parse_ntriples_line('_:b0 <http://b> "2011"^^<http://www.w3.org/2001/XMLSchema#gYear> .') == (
+        '_:b0',
+        '<http://b>',
+        '"2011"^^<http://www.w3.org/2001/XMLSchema#gYear>',
+    )
+    with pytest.raises(Exception, match='Invalid'):
+        parse_ntriples_line('<http://a> <http://b> .')
+
+
+def test_triple_index_match():
+    index = TripleIndex()
+    for s, p, o in [('<a>', '<p>', '<b>'), ('<a>', '<p>', '<c>'), ('<b>', '<q>', '<c>'), ('<a>', '<p>', '<b>')]:
+        index.add(s, p, o)
+
+    assert len(index) == 3
+    assert sorted(index.match(s='<a>')) == [('<a>', '<p>', '<b>'), ('<a>', '<p>', '<c>')]
+    assert sorted(index.match(p='<p>', o='<c>')) == [('<a>', '<p>', '<c>')]
+    assert sorted(index.match(o='<c>')) == [('<a>', '<p>', '<c>'), ('<b>', '<q>', '<c>')]
+    assert list(index.match(s='<b>', p='<q>', o='<b>')) == []
+    assert len(list(index.match())) == 3
+
+
+def test_memory_backend_diff(memory_jena_db: JenaDB):
+    diff_engine = DiffEngine(mock.create_autospec(FileStash), memory_jena_db)
+    assert len(diff_engine.query_is_a_publication(l222)) == 7
+    assert len(diff_engine.query_is_a_publication(l338)) == 11
+
+    diff = diff_engine.diff_publications_graphs(l338, l222)
+    assert len(diff) == 4
+
+    diff_graph = diff_engine.create_diff_graph(l338, l222)
+    assert len(diff_engine.query_is_a_publication(diff_graph)) == 4
+
+    assert memory_jena_db.count_graph(l222) == (197, 7)
+    unloaded = DblpGraphName('0' * 32)
+    assert memory_jena_db.count_graph(unloaded) == (0, 0)
+    assert not list(memory_jena_db.backend.author_publication_rows([WONG], unloaded))
+    assert unloaded.uri()[1:-1] not in t.cast(MemoryBackend, memory_jena_db.backend).graphs
+    graphs = [g.qname() for g in memory_jena_db.get_named_graphs()]
+    assert graphs == [l222.qname(), l338.qname(), DiffGraphName(l222, l338).qname()]
+
+
+def test_memory_backend_author_publications(memory_jena_db: JenaDB):
+    backend = memory_jena_db.backend
+    tree = get_author_publication_tree(WONG, backend, l222)
+    [pub] = tree.children
+    assert pub.node_name == 'https://dblp.org/rec/reference/vision/Wong14'
+
+    rows = list(backend.author_publication_rows([WONG], l222))
+    tuples = {AuthorTuple(*row[1:]) for row in rows}
+    assert AuthorTuple(pub.node_name, 'isA', 'https://dblp.org/rdf/schema#Publication') in tuples
+    assert any(t.bpred == 'https://dblp.org/rdf/schema#signatureCreator' and t.bobj == WONG for t in tuples)
+    assert any(t.bpred == 'isA' for t in tuples)
+
+
+def test_memory_backend_has_no_sparql():
+    jenadb = JenaDB(backend=MemoryBackend())
+    with pytest.raises(Exception, match='does not run SPARQL'):
+        jenadb.run_sparql_query('SELECT * { ?s ?p ?o }')
+    with pytest.raises(Exception, match='N-Triples'):
+        jenadb.load_graph(l222, get_resource_path('dblp-l222.ttl'))
@@ -0,0 +1,51 @@
+import gzip
+from os import path
+
+import pytest
+
+from dblp_service.local_storage import ntriples
+from dblp_service.local_storage.ntriples import parse_ntriples_chunk, read_ntriple_batches, read_ntriples
+from tests.helpers import get_resource_path
+
+L222 = get_resource_path('dblp-l222.nt')
+
+
+def expected_triples():
+    with open(L222) as f:
+        return [triple for line in f if (triple := ntriples.parse_ntriples_line(line))]
+
+
+def test_parse_ntriples_chunk():
+    chunk = '<http://a> <http://b> "x" .\n<http://a> <http://b> _:b1 .\n'
+    assert parse_ntriples_chunk(chunk) == [('<http://a>', '<http://b>', '"x"'), ('<http://a>', '<http://b>', '_:b1')]
+    # comments and blank lines take the line-by-line path
+    assert parse_ntriples_chunk('# c\n\n' + chunk) == parse_ntriples_chunk(chunk)
+    # a literal may not run over a line end
+    with pytest.raises(Exception, match='Invalid'):
+        parse_ntriples_chunk('<http://a> <http://b> "x\n" .\n')
+
+
+def test_read_ntriple_batches():
+    batches = list(read_ntriple_batches(L222, chunk_chars=1000))
+    assert len(batches) > 1
+    assert [triple for batch in batches for triple in batch] == expected_triples()
+    assert list(read_ntriples(L222)) == expected_triples()
+
+
+@pytest.mark.parametrize('use_decompressor', [True, False])
+def test_read_gzipped_ntriples(tmp_path, monkeypatch, use_decompressor):
+    gz_file = path.join(tmp_path, 'dblp-l222.nt.gz')
+    with open(L222, 'rb') as f, gzip.open(gz_file, 'wb') as gz:
+        gz.write(f.read())
+
+    if not use_decompressor:
+        monkeypatch.setattr(ntriples, 'decompressors', [])
+    elif not ntriples.decompress_command():
+        pytest.skip('no gzip decompressor found')
+
+    assert list(read_ntriples(gz_file)) == expected_triples()
+
+    with open(gz_file, 'wb') as f:
+        f.write(b'not gzip')
+    with pytest.raises(Exception):
+        list(read_ntriples(gz_file))
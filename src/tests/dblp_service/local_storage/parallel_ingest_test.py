@@ -0,0 +1,57 @@
+import gzip
+from os import path
+
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.ntriples import read_ntriples
+from dblp_service.local_storage.parallel_ingest import (
+    AuthorshipPairs,
+    Combine,
+    CountTriples,
+    PredicateStats,
+    byte_shards,
+    map_reduce_ntriples,
+    read_shard_batches,
+)
+from tests.helpers import get_resource_path
+
+L338 = get_resource_path('dblp-l338.nt')
+
+
+def test_byte_shards_split_at_line_ends():
+    shards = byte_shards(L338, 7)
+    assert len(shards) == 7
+    assert shards[0][0] == 0 and shards[-1][1] == path.getsize(L338)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(shards, shards[1:]))
+
+    with open(L338, 'rb') as f:
+        content = f.read()
+    assert all(content[end - 1 : end] == b'\n' for _, end in shards)
+
+    triples = [triple for shard in shards for batch in read_shard_batches(L338, shard, 500) for triple in batch]
+    assert triples == list(read_ntriples(L338))
+
+
+def test_map_reduce_ntriples(tmp_path):
+    reducer = Combine(CountTriples(), PredicateStats(), AuthorshipPairs())
+    sequential = map_reduce_ntriples(L338, reducer, processes=1)
+    parallel = map_reduce_ntriples(L338, reducer, processes=3)
+    assert parallel == sequential
+
+    counts, predicates, pairs = parallel
+    assert (counts.triples, counts.publications) == (311, 11)
+    assert sum(predicates.values()) == 311
+
+    graph = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+    memory = MemoryBackend()
+    memory.load_graph(graph, L338)
+    assert memory.count_graph(graph) == (counts.triples, counts.publications)
+    assert len(pairs) == predicates['<https://dblp.org/rdf/schema#authoredBy>']
+
+    gz_file = path.join(tmp_path, 'dblp-l338.nt.gz')
+    with open(L338, 'rb') as f, gzip.open(gz_file, 'wb') as gz:
+        gz.write(f.read())
+    work_dir = path.join(tmp_path, 'work')
+    assert map_reduce_ntriples(gz_file, reducer, processes=2, work_dir=work_dir) == sequential
+    assert path.exists(path.join(work_dir, 'dblp-l338.nt'))
+    assert map_reduce_ntriples(gz_file, reducer, processes=2) == sequential
@@ -0,0 +1,71 @@
+from os import path
+import tempfile
+from unittest import mock
+
+from dblp_service.local_storage.graph_naming import DblpGraphName, DiffGraphName
+from dblp_service.local_storage.query_cache import QueryCache
+from dblp_service.local_storage.rdf_backend import author_publications_batch_query
+from dblp_service.local_storage.sparql_client import SparqlClient
+
+g1 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+g2 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+
+
+def pubs_query(graph_uri: str) -> str:
+    return f'SELECT ?s WHERE {{ GRAPH {graph_uri} {{ ?s a dblp:Publication }} }}'
+
+
+def test_cache_keys():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = QueryCache(path.join(tmpdirname, 'cache.sqlite'), 1 << 20)
+
+        key = cache.cache_key(pubs_query(g1.uri()), 'json')
+        assert key is not None
+        assert key == cache.cache_key('  ' + pubs_query(g1.uri()).replace(' ', '\n  '), 'json')
+        assert key != cache.cache_key(pubs_query(g1.uri()), 'rows')
+        assert key != cache.cache_key(pubs_query(g2.uri()), 'json')
+
+        assert cache.cache_key(author_publications_batch_query(['https://dblp.org/pid/m/Smith'], g1), 'json')
+        assert cache.cache_key(author_publications_batch_query(['https://dblp.org/pid/m/Smith']), 'json') is None
+        assert cache.cache_key(pubs_query(DiffGraphName(g1, g2).uri()), 'json') is None
+        assert cache.cache_key('SELECT ?g WHERE {GRAPH ?g { }}', 'json') is None
+
+
+def test_cache_persists_and_evicts_lru():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache_file = path.join(tmpdirname, 'cache.sqlite')
+        cache = QueryCache(cache_file, 8000)
+        value = ['x' * 900]
+        for i in range(8):
+            cache.put(f'k{i}', value, [])
+        assert cache.get('k0') == value
+        cache.put('k8', value, [])
+        cache.close()
+
+        cache = QueryCache(cache_file, 8000)
+        assert cache.get('k0') == value
+        assert cache.get('k1') is None
+        assert cache.get('k8') == value
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['misses'] == 1
+        assert cache.size_bytes() <= 8000
+
+
+def test_client_answers_repeat_queries_from_cache():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        cache = QueryCache(path.join(tmpdirname, 'cache.sqlite'), 1 << 20)
+        client = SparqlClient('http://localhost:3030/ds', cache=cache)
+        result = {'head': {'vars': ['s']}, 'results': {'bindings': [{'s': {'value': 'https://dblp.org/rec/a'}}]}}
+        response = mock.Mock(status_code=200, content=b'{}')
+        response.json.return_value = result
+
+        with mock.patch.object(client.session, 'get', return_value=response) as get:
+            assert client.query(pubs_query(g1.uri())) == result
+            assert client.query(pubs_query(g1.uri())) == result
+            assert get.call_count == 1
+
+            empty = {'head': {'vars': ['s']}, 'results': {'bindings': []}}
+            response.json.return_value = empty
+            client.query(pubs_query(g2.uri()))
+            client.query(pubs_query(g2.uri()))
+            assert get.call_count == 3
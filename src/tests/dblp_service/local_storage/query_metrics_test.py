@@ -0,0 +1,69 @@
+import time
+from unittest import mock
+
+import pytest
+
+from dblp_service.local_storage.query_metrics import QueryMetrics, query_template
+from dblp_service.local_storage.sparql_client import SparqlClient
+
+
+def streaming_response(lines: list[str]) -> mock.MagicMock:
+    response = mock.MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_lines.return_value = iter(lines)
+    return response
+
+
+def test_query_template_ignores_terms():
+    q1 = 'SELECT ?s WHERE { VALUES ?a { <https://dblp.org/pid/1> } GRAPH <http://rdfdb/g/aaaaaa> { ?s ?p "x" } }'
+    q2 = """SELECT ?s WHERE {  VALUES ?a { <https://dblp.org/pid/2> <https://dblp.org/pid/3> }
+        GRAPH <http://rdfdb/g/bbbbbb> { ?s ?p "y" } } LIMIT 10"""
+    assert query_template(q1).startswith('select-')
+    assert query_template(q1) == query_template(q2.replace('LIMIT 10', ''))
+    assert query_template(q1) != query_template('ASK { ?s ?p ?o }')
+
+
+def test_client_records_streamed_rows_apart_from_caller_time():
+    client = SparqlClient('http://localhost:3030/ds')
+    lines = ['?s', '<http://rdfdb/a>', '<http://rdfdb/b>', '<http://rdfdb/c>']
+    query = 'SELECT ?s WHERE { GRAPH <http://rdfdb/g/aaaaaa> { ?s ?p ?o } }'
+    with mock.patch.object(client.session, 'get', return_value=streaming_response(lines)):
+        for _ in client.query_rows(query, 'all-subjects'):
+            time.sleep(0.02)
+
+    stats = client.metrics.templates['all-subjects']
+    assert (stats.calls, stats.rows, stats.errors) == (1, 3, 0)
+    assert stats.response_bytes == sum(len(line) + 1 for line in lines[1:])
+    assert stats.wall_seconds >= 0.06 > stats.fetch_seconds
+    assert client.metrics.graph_calls == {'http://rdfdb/g/aaaaaa': 1}
+
+
+def test_client_records_errors():
+    client = SparqlClient('http://localhost:3030/ds')
+    with mock.patch.object(client.session, 'post', side_effect=ConnectionError('refused')):
+        with pytest.raises(ConnectionError):
+            client.update('DROP GRAPH <http://rdfdb/g/aaaaaa>', 'drop-graph')
+
+    assert client.metrics.templates['drop-graph'].errors == 1
+
+
+def test_slow_queries_and_export():
+    metrics = QueryMetrics(slow_query_seconds=0.0)
+    for rows in [2, 5]:
+        record = metrics.start('SELECT * { ?s ?p ?o }', 'query', 'everything')
+        record.rows = rows
+        metrics.finish(record)
+    metrics.cache_hit('SELECT * { ?s ?p ?o }', 'everything')
+
+    exported = metrics.to_json()
+    assert exported['slow_queries'] == 2
+    assert exported['templates']['everything']['calls'] == 2
+    assert exported['templates']['everything']['rows'] == 7
+    assert sum(exported['templates']['everything']['buckets'].values()) == 2
+    assert exported['cache_hits'] == {'everything': 1}
+
+    prometheus = metrics.to_prometheus()
+    assert '# TYPE dblp_sparql_fetch_seconds histogram' in prometheus
+    assert 'dblp_sparql_fetch_seconds_bucket{template="everything",le="+Inf"} 2' in prometheus
+    assert 'dblp_sparql_rows_total{template="everything"} 7' in prometheus
+    assert 'dblp_sparql_slow_queries_total 2' in prometheus
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import typing as t
+from unittest import mock
+
+from dblp_service.lib.config import ApacheJenaConfig
+import pytest
+import requests
+
+from dblp_service.local_storage.sparql_client import QueryTimeout, SparqlClient, decode_tsv_term
+
+
+def test_client_from_config():
+    jena_config = ApacheJenaConfig(dbLocation='/tmp/db', connectionUrl='http://fuseki:3031/dblp', poolSize=3)
+    client = SparqlClient.from_config(jena_config)
+    assert client.endpoint == 'http://fuseki:3031/dblp'
+    assert client.pool_size == 3
+    assert client.session.get_adapter('http://fuseki:3031/dblp').poolmanager.connection_pool_kw['maxsize'] == 3
+
+
+def test_client_reuses_session():
+    client = SparqlClient('http://localhost:3030/ds')
+    response = mock.Mock(status_code=200, content=b'{}')
+    response.json.return_value = {'head': {'vars': []}, 'results': {'bindings': []}}
+    with mock.patch.object(client.session, 'get', return_value=response) as get:
+        client.query('SELECT ?s WHERE { ?s ?p ?o }')
+        client.query('SELECT ?o WHERE { ?s ?p ?o }')
+
+    assert get.call_count == 2
+    assert get.call_args.kwargs['params'] == {'query': 'SELECT ?o WHERE { ?s ?p ?o }'}
+
+
+def test_client_limits_concurrency():
+    client = SparqlClient('http://localhost:3030/ds', max_concurrency=2)
+    lock = threading.Lock()
+    in_flight = [0]
+    max_in_flight = [0]
+
+    def slow_get(*args: t.Any, **kwargs: t.Any):
+        with lock:
+            in_flight[0] += 1
+            max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        response = mock.Mock(status_code=200, content=b'{}')
+        response.json.return_value = {'head': {'vars': []}, 'results': {'bindings': []}}
+        return response
+
+    with mock.patch.object(client.session, 'get', side_effect=slow_get):
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(client.query, ['SELECT * {}'] * 12))
+
+    assert max_in_flight[0] == 2
+
+
+def test_nested_streams_do_not_deadlock():
+    # iter_publication_changes holds two suspended streams while fetching records with a third
+    client = SparqlClient('http://localhost:3030/ds', max_concurrency=2)
+
+    def tsv_get(*args: t.Any, **kwargs: t.Any):
+        response = mock.MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = iter(['?s', '<https://dblp.org/rec/a>', '<https://dblp.org/rec/b>'])
+        return response
+
+    fetched: t.List[int] = []
+
+    def merge_and_fetch():
+        base = client.query_rows('SELECT ?s { GRAPH <g1> { ?s ?p ?o } }')
+        head = client.query_rows('SELECT ?s { GRAPH <g2> { ?s ?p ?o } }')
+        for b, _ in zip(base, head):
+            fetched.append(len(list(client.query_rows(f'SELECT ?s {{ VALUES ?s {{ <{b[0]}> }} }}'))))
+
+    with mock.patch.object(client.session, 'get', side_effect=tsv_get):
+        # daemon threads, so a deadlock fails the test rather than hanging it
+        threads = [threading.Thread(target=merge_and_fetch, daemon=True) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert not any(thread.is_alive() for thread in threads)
+
+    assert fetched == [2] * 4
+
+    assert client._held_slots == {}
+
+
+def test_decode_tsv_term():
+    examples = [
+        ('<https://dblp.org/rec/conf/cikm/DruckM11>', 'https://dblp.org/rec/conf/cikm/DruckM11'),
+        ('"Curvedness. (2014)"', 'Curvedness. (2014)'),
+        ('"Curvedness"@en', 'Curvedness'),
+        ('"2011"^^<http://www.w3.org/2001/XMLSchema#gYear>', '2011'),
+        (r'"say \"hi\"\tthere \u00e9"', 'say "hi"\tthere \u00e9'),
+        ('_:b0', 'b0'),
+        ('42', '42'),
+        ('', None),
+    ]
+    for term, value in examples:
+        assert decode_tsv_term(term) == value
+
+
+def test_query_rows_streams_tsv():
+    client = SparqlClient('http://localhost:3030/ds')
+    response = mock.MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_lines.return_value = iter(
+        [
+            '?sub\t?bpred',
+            '<https://dblp.org/rec/a>\t"isA"',
+            '',
+            '<https://dblp.org/rec/b>\t',
+        ]
+    )
+    with mock.patch.object(client.session, 'get', return_value=response) as get:
+        rows = client.query_rows('SELECT ?sub ?bpred WHERE { ?sub ?p ?o }')
+        assert get.call_count == 0
+        assert list(rows) == [['https://dblp.org/rec/a', 'isA'], ['https://dblp.org/rec/b', None]]
+
+    assert get.call_args.kwargs['stream']
+
+
+def test_deadlines_passed_to_fuseki_and_enforced():
+    client = SparqlClient('http://localhost:3030/ds', query_timeout=30, template_timeouts={'slow-diff': 600})
+    response = mock.Mock(status_code=503)
+    with mock.patch.object(client.session, 'get', return_value=response) as get:
+        with pytest.raises(QueryTimeout):
+            client.query('SELECT * { ?s ?p ?o }', 'slow-diff')
+        assert get.call_args.kwargs['params']['timeout'] == '600'
+        connect, read = get.call_args.kwargs['timeout']
+        assert 600 < read <= 605
+
+        with pytest.raises(QueryTimeout):
+            client.query('SELECT * { ?s ?p ?o }', timeout=2.5)
+        assert get.call_args.kwargs['params']['timeout'] == '2.5'
+
+    with mock.patch.object(client.session, 'get', side_effect=requests.ReadTimeout()) as get:
+        with pytest.raises(QueryTimeout):
+            list(client.query_rows('SELECT * { ?s ?p ?o }'))
+        # a streamed query's deadline bounds Fuseki only up to its first result
+        first, overall = get.call_args.kwargs['params']['timeout'].split(',')
+        assert first == '30' and float(overall) > 600
+
+    with mock.patch.object(client.session, 'post', return_value=mock.Mock(status_code=200)) as post:
+        client.update('CLEAR ALL')
+        assert post.call_args.kwargs['timeout'] is None
+
+    assert client.metrics.templates['slow-diff'].errors == 1
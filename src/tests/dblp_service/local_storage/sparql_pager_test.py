@@ -0,0 +1,66 @@
+import re
+import typing as t
+
+import pytest
+
+from dblp_service.local_storage.sparql_pager import SparqlKeysetIter
+
+# (key, value) rows, several rows per key
+rows = sorted([[f'https://dblp.org/rec/{k:03d}', v] for k in range(40) for v in range(k % 3 + 1)])
+
+
+class FakeEndpoint:
+    queries: t.List[str]
+
+    def __init__(self):
+        self.queries = []
+
+    def run_query(self, query: str) -> t.List[t.List[t.Any]]:
+        self.queries.append(query)
+        assert 'OFFSET' not in query
+        limit = int(re.search(r'LIMIT (\d+)', query).group(1))  # type: ignore
+        after = re.search(r'> "([^"]*)"', query)
+        matching = [r for r in rows if after is None or r[0] > after.group(1)]
+        return matching[:limit]
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_keyset_iter_visits_every_row(prefetch: bool):
+    endpoint = FakeEndpoint()
+    pages = SparqlKeysetIter(endpoint.run_query, '?s ?p ?o', ['s', 'o'], page_size=7, prefetch=prefetch)
+    assert list(pages) == rows
+    assert pages.pages_fetched == len(endpoint.queries) > len(rows) // 7
+    assert 'ORDER BY STR(?s) LIMIT 7' in endpoint.queries[0]
+
+
+def test_keyset_iter_resumes_from_cursor():
+    endpoint = FakeEndpoint()
+    pages = SparqlKeysetIter(endpoint.run_query, '?s ?p ?o', ['s', 'o'], page_size=7)
+    it = iter(pages)
+    consumed = [next(it) for _ in range(20)]
+    cursor = pages.cursor
+    assert cursor is not None
+    it.close()
+
+    resumed = list(SparqlKeysetIter(endpoint.run_query, '?s ?p ?o', ['s', 'o'], page_size=7, start_after=cursor))
+    done = [r for r in consumed if r[0] <= cursor]
+    assert done + resumed == rows
+
+
+def test_keyset_iter_rejects_key_larger_than_page():
+    endpoint = FakeEndpoint()
+    pages = SparqlKeysetIter(endpoint.run_query, '?s ?p ?o', ['s', 'o'], page_size=2, start_after=rows[3][0])
+    with pytest.raises(Exception, match='page_size'):
+        list(pages)
+
+
+def test_keyset_iter_places_filter_within_pattern():
+    endpoint = FakeEndpoint()
+
+    def where(keyset_filter: str) -> str:
+        return f'GRAPH <g1> {{ ?s ?p ?o {keyset_filter} }} FILTER NOT EXISTS {{ GRAPH <g2> {{ ?s ?p ?o }} }}'
+
+    pages = SparqlKeysetIter(endpoint.run_query, where, ['s', 'o'], page_size=7)
+    assert list(pages) == rows
+    # the cursor filter binds within g1's pattern, ahead of the probe of g2
+    assert re.search(r'GRAPH <g1> \{ \?s \?p \?o FILTER \(STR\(\?s\) > "[^"]+"\) \} FILTER NOT', endpoint.queries[1])
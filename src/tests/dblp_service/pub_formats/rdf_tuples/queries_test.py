@@ -0,0 +1,96 @@
+import typing as t
+from unittest import mock
+
+from dblp_service.local_storage.graph_naming import DblpGraphName
+import pytest
+
+from dblp_service.local_storage.sparql_client import QueryTimeout, SparqlClient
+from dblp_service.pub_formats.rdf_tuples.queries import (
+    AuthorTuple,
+    get_author_publication_trees,
+    run_author_publication_batches,
+)
+
+DRUCK = 'https://dblp.org/pid/08/5706'
+MCCALLUM = 'https://dblp.org/pid/m/AndrewMcCallum'
+NOBODY = 'https://dblp.org/pid/00/0000'
+PUB = 'https://dblp.org/rec/conf/cikm/DruckM11'
+TITLE = 'https://dblp.org/rdf/schema#title'
+SIG = 'https://dblp.org/rdf/schema#hasSignature'
+CREATOR = 'https://dblp.org/rdf/schema#signatureCreator'
+
+
+def batch_rows(
+    query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None
+) -> t.Iterator[t.List[t.Optional[str]]]:
+    for author in [DRUCK, MCCALLUM]:
+        if f'<{author}>' in query:
+            yield [author, PUB, TITLE, 'Toward Interactive Training and Evaluation.', None, None]
+            yield [author, PUB, SIG, 'b0', CREATOR, author]
+
+
+def test_batched_author_publications():
+    client = SparqlClient('http://localhost:3030/ds')
+    graph = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+    with mock.patch.object(client, 'query_rows', side_effect=batch_rows) as query_rows:
+        results = list(run_author_publication_batches([DRUCK, NOBODY, MCCALLUM], client, graph, batch_size=2))
+
+    assert query_rows.call_count == 2
+    first_query = query_rows.call_args_list[0].args[0]
+    assert f'VALUES ?author {{ <{DRUCK}> <{NOBODY}> }}' in first_query
+    assert f'GRAPH {graph.uri()}' in first_query
+
+    assert [author for author, _ in results] == [DRUCK, NOBODY, MCCALLUM]
+    druck_tuples = results[0][1]
+    assert druck_tuples == [
+        AuthorTuple(PUB, TITLE, 'Toward Interactive Training and Evaluation.'),
+        AuthorTuple(PUB, SIG, 'b0', CREATOR, DRUCK),
+    ]
+    assert results[1][1] == []
+
+
+def test_batch_skips_unknown_authors():
+    def rows_with_stranger(query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None):
+        yield ['https://dblp.org/pid/00/stranger', PUB, TITLE, 'Elsewhere.', None, None]
+        yield from batch_rows(query, template, timeout)
+
+    client = SparqlClient('http://localhost:3030/ds')
+    with mock.patch.object(client, 'query_rows', side_effect=rows_with_stranger):
+        results = dict(run_author_publication_batches([DRUCK], client))
+
+    assert list(results) == [DRUCK]
+    assert len(results[DRUCK]) == 2
+
+
+def test_batched_author_trees():
+    client = SparqlClient('http://localhost:3030/ds')
+    with mock.patch.object(client, 'query_rows', side_effect=batch_rows):
+        trees = dict(get_author_publication_trees([DRUCK, MCCALLUM], client))
+
+    assert [pub.node_name for pub in trees[DRUCK].children] == [PUB]
+    assert len(trees[MCCALLUM].children) == 1
+
+
+def test_timed_out_batches_are_split_and_reported():
+    def rows_unless_druck(
+        query: str, template: t.Optional[str] = None, timeout: t.Optional[float] = None
+    ) -> t.Iterator[t.List[t.Optional[str]]]:
+        if f"<{DRUCK}>" in query:
+            raise QueryTimeout(template, 30)
+        return batch_rows(query)
+
+    client = SparqlClient("http://localhost:3030/ds")
+    timed_out: t.List[str] = []
+    with mock.patch.object(client, "query_rows", side_effect=rows_unless_druck) as query_rows:
+        authors = [NOBODY, DRUCK, MCCALLUM]
+        results = dict(run_author_publication_batches(authors, client, batch_size=3, timed_out=timed_out))
+
+    assert timed_out == [DRUCK]
+    assert list(results) == [NOBODY, MCCALLUM]
+    assert len(results[MCCALLUM]) == 2
+    # [all 3] -> [NOBODY] + [DRUCK, MCCALLUM] -> [DRUCK] + [MCCALLUM]
+    assert query_rows.call_count == 5
+
+    with mock.patch.object(client, "query_rows", side_effect=rows_unless_druck):
+        with pytest.raises(QueryTimeout):
+            list(run_author_publication_batches([DRUCK], client))
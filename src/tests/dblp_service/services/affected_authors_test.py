@@ -0,0 +1,59 @@
+from os import path
+from unittest import mock
+
+from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.jena_db import JenaDB
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.services.affected_authors import AffectedAuthors, read_work_list, record_authors
+from dblp_service.services.offline_diff import iter_offline_changes
+from dblp_service.services.publication_records import PublicationRecord
+from dblp_service.services.rdf_graph_diff import DiffEngine
+from tests.dblp_service.services.offline_diff_test import L222, L338, write_edited_l222
+
+WONG = 'https://dblp.org/pid/69/220'
+SCHEMA = 'https://dblp.org/rdf/schema#'
+
+
+def test_record_authors():
+    plain = PublicationRecord(
+        'https://dblp.org/rec/x',
+        {
+            f'{SCHEMA}authoredBy': frozenset(['https://dblp.org/pid/1']),
+            f'{SCHEMA}hasSignature': frozenset([f'[{SCHEMA}signatureCreator https://dblp.org/pid/2; {SCHEMA}x y]']),
+        },
+    )
+    assert record_authors(plain) == {'https://dblp.org/pid/1', 'https://dblp.org/pid/2'}
+
+    terms = PublicationRecord(
+        'https://dblp.org/rec/x',
+        {
+            f'<{SCHEMA}hasSignature>': frozenset(
+                [f'[<{SCHEMA}signatureCreator> <https://dblp.org/pid/3>; <{SCHEMA}signatureDblpName> "A; B"]']
+            ),
+        },
+    )
+    assert record_authors(terms) == {'https://dblp.org/pid/3'}
+
+
+def test_affected_authors(tmp_path):
+    edited = path.join(tmp_path, 'edited.nt.gz')
+    write_edited_l222(edited)
+    affected = AffectedAuthors()
+    assert len(list(affected.collect(iter_offline_changes(L222, edited)))) == 1
+    assert affected.authors == {WONG}
+
+    # offline and online diffs agree
+    offline = AffectedAuthors()
+    for change in iter_offline_changes(L222, L338):
+        offline.add(change)
+    jenadb = JenaDB(backend=MemoryBackend())
+    l222, l338 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4'), DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+    jenadb.load_graph(l222, L222)
+    jenadb.load_graph(l338, L338)
+    online = DiffEngine(mock.create_autospec(FileStash), jenadb).affected_authors(l222, l338)
+    assert online == offline.authors and len(online) > 0
+
+    work_list = path.join(tmp_path, 'authors.txt.gz')
+    assert offline.write(work_list) == len(online)
+    assert list(read_work_list(work_list)) == sorted(online)
@@ -0,0 +1,64 @@
+import json
+from os import path
+import typing as t
+
+import pytest
+
+from dblp_service.local_storage.graph_naming import DblpGraphName, DiffGraphName, GraphName
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.local_storage.rdf_backend import KeyRange
+from dblp_service.services.chunked_diff import key_ranges, materialize_diff_graph
+from tests.helpers import get_resource_path
+
+l222 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+l338 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+
+
+class FailingBackend(MemoryBackend):
+    """Fails the first time it fills a given key range, and records the ranges filled."""
+
+    def __init__(self, fail_range: int):
+        super().__init__()
+        self.fail_range: t.Optional[int] = fail_range
+        self.ranges: t.List[KeyRange] = []
+        self.filled: t.List[int] = []
+
+    def create_diff_graph(
+        self, graph1: GraphName, graph2: GraphName, diff_graph: DiffGraphName, key_range: t.Optional[KeyRange] = None
+    ):
+        assert key_range
+        i = self.ranges.index(key_range)
+        if i == self.fail_range:
+            self.fail_range = None
+            raise Exception('connection reset')
+        super().create_diff_graph(graph1, graph2, diff_graph, key_range)
+        self.filled.append(i)
+
+
+def test_key_ranges():
+    pubs = ['https://dblp.org/rec/a', 'https://dblp.org/rec/b', 'https://dblp.org/rec/c']
+    assert key_ranges([], 2) == [(None, None)]
+    assert key_ranges(pubs, 2) == [(None, 'https://dblp.org/rec/b>'), ('https://dblp.org/rec/b>', None)]
+    assert len(key_ranges(pubs, 1)) == 4
+
+
+def test_materialize_resumes(tmp_path):
+    backend = FailingBackend(fail_range=2)
+    backend.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    backend.load_graph(l338, get_resource_path('dblp-l338.nt'))
+    backend.ranges = key_ranges(backend.publications(l338), 2)
+    diff_graph = DiffGraphName(l222, l338)
+    checkpoint_file = path.join(tmp_path, 'checkpoints', 'diff.json')
+
+    with pytest.raises(Exception, match='connection reset'):
+        materialize_diff_graph(backend, l338, l222, diff_graph, range_size=2, checkpoint_file=checkpoint_file)
+    with open(checkpoint_file) as f:
+        done = json.load(f)['done']
+    assert done == backend.filled and 2 not in done
+
+    backend.filled = []
+    assert materialize_diff_graph(backend, l338, l222, diff_graph, range_size=2, checkpoint_file=checkpoint_file)
+    assert sorted(done + backend.filled) == list(range(len(backend.ranges)))
+    assert not path.exists(checkpoint_file)
+    assert list(backend.publications(diff_graph)) == list(backend.diff_publications(l338, l222))
+    assert len(list(backend.publications(diff_graph))) == 4
@@ -0,0 +1,81 @@
+import gzip
+from os import path
+
+from dblp_service.local_storage.external_sort import ExternalSorter
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.local_storage.ntriples import read_ntriples
+from dblp_service.services.offline_diff import iter_offline_changes
+from dblp_service.services.publication_records import iter_publication_changes
+from tests.helpers import get_resource_path
+
+L222 = get_resource_path('dblp-l222.nt')
+L338 = get_resource_path('dblp-l338.nt')
+WONG14 = 'https://dblp.org/rec/reference/vision/Wong14'
+TITLE = '<https://dblp.org/rdf/schema#title>'
+
+
+def test_external_sorter(tmp_path):
+    sorter = ExternalSorter(str(tmp_path), memory_budget=500)
+    for i in reversed(range(50)):
+        sorter.add(f'<k{i % 7}>', f'v{i}')
+    assert len(sorter.runs) > 1
+
+    groups = list(sorter.groups())
+    assert [key for key, _ in groups] == [f'<k{i}>' for i in range(7)]
+    assert groups[0][1] == sorted(f'v{i}' for i in range(0, 50, 7))
+
+
+def test_external_sorter_escapes_control_characters(tmp_path):
+    pairs = [
+        ('"a\tb"', '1'),
+        ('"a"', 'x\ty'),
+        ('"a\\tb"', '2'),
+        ('"a\nb\x01"', '3'),
+        ('"a\x00"', '4'),
+        ('"a b"', '5'),
+        ('"a\x0b\r"', '6'),
+        ('"a"', 'x'),
+    ]
+    for spill in [False, True]:
+        sorter = ExternalSorter(str(tmp_path), memory_budget=100 if spill else 1 << 20)
+        for key, value in pairs:
+            sorter.add(key, value)
+        assert (len(sorter.runs) > 1) == spill
+        assert list(sorter.items()) == sorted(pairs)
+
+
+def write_edited_l222(gz_file: str):
+    """l222 with Wong14's title fixed and its blank nodes relabeled and reordered."""
+    lines = []
+    for s, p, o in read_ntriples(L222):
+        if s == f'<{WONG14}>' and p == TITLE:
+            o = '"Image-Based Lighting (revised)."'
+        s, o = [f'_:z{term[2:]}' if term.startswith('_:') else term for term in (s, o)]
+        lines.append(f'{s} {p} {o} .\n')
+    with gzip.open(gz_file, 'wt', encoding='utf-8') as f:
+        f.writelines(reversed(lines))
+
+
+def test_offline_diff(tmp_path):
+    edited = path.join(tmp_path, 'edited.nt.gz')
+    write_edited_l222(edited)
+    runs = path.join(tmp_path, 'runs')
+
+    [change] = list(iter_offline_changes(L222, edited, runs, memory_budget=4000))
+    assert (change.uri, change.kind, change.changed_predicates) == (WONG14, 'modified', [TITLE])
+
+    changes = list(iter_offline_changes(L222, L338, runs, memory_budget=4000))
+
+    # publications agree with the Fuseki-style diff over a triple store
+    memory = MemoryBackend()
+    l222, l338 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4'), DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+    memory.load_graph(l222, L222)
+    memory.load_graph(l338, L338)
+    expected = [c.uri for c in iter_publication_changes(memory, l222, l338)]
+    assert [c.uri for c in changes] == expected
+    assert [c.to_json()['kind'] for c in changes] == ['added'] * len(expected)
+
+    assert path.exists(runs)
+    assert not list(iter_offline_changes(L338, L338, runs, memory_budget=4000))
+    assert not [f for f in tmp_path.joinpath('runs').iterdir()]
@@ -0,0 +1,38 @@
+from os import path
+
+from dblp_service.services.offline_diff import iter_offline_changes
+from dblp_service.services.publication_hashes import (
+    PublicationHashes,
+    build_publication_hashes,
+    diff_publication_hashes,
+)
+from tests.dblp_service.services.offline_diff_test import L222, L338, WONG14, write_edited_l222
+
+
+def build(rdf_file: str, hashes_dir: str) -> PublicationHashes:
+    build_publication_hashes(rdf_file, hashes_dir, path.join(path.dirname(hashes_dir), 'runs'), memory_budget=4000)
+    return PublicationHashes(hashes_dir)
+
+
+def test_publication_hashes(tmp_path):
+    edited = path.join(tmp_path, 'edited.nt.gz')
+    write_edited_l222(edited)
+    l222 = build(L222, path.join(tmp_path, 'l222'))
+    l338 = build(L338, path.join(tmp_path, 'l338'))
+    relabeled = build(edited, path.join(tmp_path, 'edited'))
+
+    assert len(l222) == len(relabeled) > 0
+    terms = [term for term, _ in l222.items()]
+    assert terms == sorted(terms)
+    assert l222.hash_of('https://dblp.org/no/such/pub') is None
+
+    # blank node labels and triple order do not change hashes; only the fixed title does
+    changed = [(term, h) for (term, h), (_, h2) in zip(l222.items(), relabeled.items()) if h != h2]
+    assert [term for term, _ in changed] == [f'<{WONG14}>']
+    assert list(diff_publication_hashes(l222, relabeled)) == [(WONG14, 'modified')]
+
+    # the hash merge finds the same publications as the full offline diff
+    expected = [(c.uri, c.kind) for c in iter_offline_changes(L222, L338, path.join(tmp_path, 'runs'), 4000)]
+    assert list(diff_publication_hashes(l222, l338)) == expected
+    assert [(uri, 'removed') for uri, _ in expected] == list(diff_publication_hashes(l338, l222))
+    assert not list(diff_publication_hashes(l338, l338))
@@ -0,0 +1,37 @@
+from os import path
+
+from dblp_service.services.publication_keys import PublicationKeys, bloom_size, build_publication_keys
+from tests.dblp_service.services.offline_diff_test import L222, L338, WONG14
+from tests.dblp_service.services.publication_hashes_test import build
+
+
+def test_publication_keys(tmp_path):
+    l222 = build(L222, path.join(tmp_path, 'l222-hashes'))
+    l338 = build(L338, path.join(tmp_path, 'l338-hashes'))
+    pubs = {label: [term[1:-1] for term, _ in hashes.items()] for label, hashes in [('l222', l222), ('l338', l338)]}
+
+    keys = {}
+    for label, iris in pubs.items():
+        keys_dir = path.join(tmp_path, label)
+        assert build_publication_keys(iris, keys_dir, path.join(tmp_path, 'runs'), memory_budget=500) == len(iris)
+        keys[label] = PublicationKeys(keys_dir)
+
+    assert [keys['l222'].keys.term(i) for i in range(len(keys['l222']))] == sorted(
+        iri[len('https://dblp.org/rec/') :] for iri in pubs['l222']
+    )
+    assert WONG14 in keys['l222'] and 'reference/vision/Wong14' in keys['l222']
+    new_in_head = [iri for iri in pubs['l338'] if iri not in keys['l222']]
+    assert new_in_head == [iri for iri in pubs['l338'] if iri not in pubs['l222']]
+    assert len(new_in_head) == 4
+    assert all(keys['l338'].might_contain(iri) for iri in pubs['l338'])
+    assert 'https://dblp.org/rec/no/such/Key' not in keys['l338']
+
+
+def test_bloom_false_positive_rate(tmp_path):
+    keys_dir = path.join(tmp_path, 'keys')
+    build_publication_keys((f'conf/x/K{i}' for i in range(20000)), keys_dir, false_positive_rate=0.01)
+    keys = PublicationKeys(keys_dir)
+    assert all(keys.might_contain(f'conf/x/K{i}') for i in range(0, 20000, 97))
+    false_positives = sum(keys.might_contain(f'conf/y/K{i}') for i in range(20000))
+    assert false_positives < 20000 * 0.02
+    assert bloom_size(20000, 0.01) == (keys.bits, keys.hashes)
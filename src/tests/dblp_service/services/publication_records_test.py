@@ -0,0 +1,84 @@
+from dblp_service.local_storage.columnar_store import ColumnarBackend
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.local_storage.ntriples import read_ntriples
+from dblp_service.services.publication_records import (
+    PublicationRecord,
+    blank_signature,
+    iter_publication_changes,
+    merge_join,
+)
+from tests.helpers import get_resource_path
+
+l222 = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+l338 = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+edited = DblpGraphName('00000000000000000000000000000000')
+WONG14 = 'https://dblp.org/rec/reference/vision/Wong14'
+TITLE = 'https://dblp.org/rdf/schema#title'
+SIGNATURE = 'https://dblp.org/rdf/schema#hasSignature'
+
+
+def edit_l222(s: str, p: str, o: str):
+    """l222 with Wong14's title fixed and all blank nodes relabeled."""
+    if s == f'<{WONG14}>' and p == f'<{TITLE}>':
+        o = '"Image-Based Lighting (revised)."'
+    if o == '"Tien-Tsin Wong"':
+        o = '"T.-T. Wong"'
+
+    def relabel(term: str) -> str:
+        return f'_:x{term[2:]}' if term.startswith('_:') else term
+
+    return relabel(s), p, relabel(o)
+
+
+def test_merge_join():
+    joined = list(merge_join(iter(['a', 'b', 'd']), iter(['b', 'c', 'd', 'e'])))
+    assert joined == [
+        ('a', True, False),
+        ('b', True, True),
+        ('c', False, True),
+        ('d', True, True),
+        ('e', False, True),
+    ]
+
+
+def test_merge_join_in_term_order():
+    # as terms, <x/A14-1> sorts before <x/A14>, though 'x/A14' < 'x/A14-1'
+    joined = list(merge_join(iter(['x/A14-1', 'x/A14']), iter(['x/A14'])))
+    assert joined == [('x/A14-1', True, False), ('x/A14', True, True)]
+
+
+def test_blank_nodes_compare_canonically():
+    rows1 = [['p', 'sig', 'b1', 'ordinal', '1'], ['p', 'sig', 'b1', 'name', 'A'], ['p', 'title', 'T', None, None]]
+    rows2 = [['p', 'title', 'T', None, None], ['p', 'sig', 'b9', 'name', 'A'], ['p', 'sig', 'b9', 'ordinal', '1']]
+    assert PublicationRecord.from_rows('p', rows1) == PublicationRecord.from_rows('p', rows2)
+    assert PublicationRecord.from_rows('p', rows1).fields['sig'] == {blank_signature([('name', 'A'), ('ordinal', '1')])}
+
+
+def test_publication_changes(tmp_path):
+    memory = MemoryBackend()
+    memory.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    memory.load_graph(l338, get_resource_path('dblp-l338.nt'))
+    memory.add_triples(edited, (edit_l222(*triple) for triple in read_ntriples(get_resource_path('dblp-l222.nt'))))
+
+    changes = list(iter_publication_changes(memory, l222, l338, batch_size=3))
+    assert [c.kind for c in changes] == ['added'] * 4
+    assert all(c.after and not c.before for c in changes)
+    assert [c.uri for c in changes] == sorted(c.uri for c in changes)
+
+    # relabeled blank nodes alone are not changes
+    [change] = list(iter_publication_changes(memory, l222, edited))
+    assert (change.uri, change.kind) == (WONG14, 'modified')
+    assert change.changed_predicates == [SIGNATURE, TITLE]
+    [title_change] = [c for c in change.field_changes() if c.predicate == TITLE]
+    assert title_change.removed == {'Image-Based Lighting.'}
+    assert title_change.added == {'Image-Based Lighting (revised).'}
+
+    removed = list(iter_publication_changes(memory, l338, l222))
+    assert [c.kind for c in removed] == ['removed'] * 4
+    assert removed[0].to_json()['kind'] == 'removed'
+
+    columnar = ColumnarBackend(str(tmp_path))
+    columnar.load_graph(l222, get_resource_path('dblp-l222.nt'))
+    columnar.load_graph(l338, get_resource_path('dblp-l338.nt'))
+    assert [c.to_json() for c in iter_publication_changes(columnar, l222, l338)] == [c.to_json() for c in changes]
@@ -0,0 +1,88 @@
+from os import path
+from unittest import mock
+
+import pytest
+
+from dblp_service.local_storage.file_stash_manager import FileStash
+from dblp_service.local_storage.graph_naming import DblpGraphName
+from dblp_service.local_storage.jena_db import JenaDB
+from dblp_service.local_storage.memory_store import MemoryBackend
+from dblp_service.local_storage.rdf_backend import patch_graph_update
+from dblp_service.services.offline_diff import iter_offline_changes
+from dblp_service.services.publication_records import iter_publication_changes
+from dblp_service.services.rdf_graph_diff import DiffEngine
+from dblp_service.services.rdf_patch import (
+    apply_rdf_patch,
+    patch_headers,
+    read_rdf_patch,
+    release_md5,
+    write_rdf_patch,
+)
+from tests.dblp_service.services.offline_diff_test import L222, L338, TITLE, WONG14, write_edited_l222
+
+base = DblpGraphName('ed2c3d520c332d8e4e6d5b9446eb51d4')
+head = DblpGraphName('ffe98a7f2f4ca496a4e25295e8117dac')
+
+
+def test_patch_graph_update():
+    update = patch_graph_update(
+        base,
+        [('<s>', '<p>', '"o"'), ('<s>', '<sig>', '_:d0'), ('_:d0', '<ord>', '"1"')],
+        [('<s>', '<sig>', '_:a1'), ('_:a1', '<ord>', '"2"')],
+    )
+    assert update.split(' ;\n') == [
+        f'DELETE DATA {{ GRAPH {base.uri()} {{\n<s> <p> "o" .\n}} }}',
+        f'DELETE WHERE {{ GRAPH {base.uri()} {{\n<s> <sig> ?b0 .\n?b0 <ord> "1" .\n}} }}',
+        f'INSERT DATA {{ GRAPH {base.uri()} {{\n<s> <sig> _:a1 .\n_:a1 <ord> "2" .\n}} }}',
+    ]
+
+
+def test_rdf_patch_round_trip(tmp_path):
+    edited = path.join(tmp_path, 'edited.nt.gz')
+    write_edited_l222(edited)
+    patch_file = path.join(tmp_path, 'edit.rdfp.gz')
+    stats = write_rdf_patch(iter_offline_changes(L222, edited), patch_file, 'aaa', 'bbb')
+    assert (stats.subjects, stats.deleted, stats.added) == (1, 1, 1)
+    assert [op for op, (s, p, _) in read_rdf_patch(patch_file)] == ['D', 'A']
+    headers = patch_headers(patch_file)
+    assert (release_md5(headers['previous']), release_md5(headers['id'])) == ('aaa', 'bbb')
+
+    # forwards (mostly additions) and backwards (removals, including signatures)
+    for rdf_from, rdf_to in [(L222, L338), (L338, L222)]:
+        patch_file = path.join(tmp_path, 'release.rdfp')
+        write_rdf_patch(iter_offline_changes(rdf_from, rdf_to), patch_file)
+        backend = MemoryBackend()
+        backend.load_graph(base, rdf_from)
+        backend.load_graph(head, rdf_to)
+        stats = apply_rdf_patch(backend, base, patch_file, batch_size=3)
+        assert stats.subjects > 3
+        assert not list(iter_publication_changes(backend, base, head))
+        assert backend.count_graph(base) == backend.count_graph(head)
+
+    backend = MemoryBackend()
+    backend.load_graph(base, L222)
+    apply_rdf_patch(backend, base, path.join(tmp_path, 'edit.rdfp.gz'))
+    [(_, _, title)] = backend.graph(base).match(s=f'<{WONG14}>', p=TITLE)
+    assert title == '"Image-Based Lighting (revised)."'
+
+
+def test_apply_patch_creates_head_graph(tmp_path):
+    patch_file = path.join(tmp_path, 'release.rdfp.gz')
+    write_rdf_patch(iter_offline_changes(L222, L338), patch_file, base.md5, head.md5)
+    backend = MemoryBackend()
+    backend.load_graph(base, L222)
+    base_counts = backend.count_graph(base)
+
+    diff_engine = DiffEngine(mock.create_autospec(FileStash), JenaDB(backend=backend))
+    head_graph, stats = diff_engine.apply_patch(patch_file)
+    assert head_graph.qname() == head.qname()
+    assert stats.added > 0
+    assert backend.count_graph(base) == base_counts
+
+    expected = DblpGraphName('0' * 32)
+    backend.load_graph(expected, L338)
+    assert not list(iter_publication_changes(backend, head, expected))
+    assert backend.count_graph(head) == backend.count_graph(expected)
+
+    with pytest.raises(Exception, match='applies to release'):
+        diff_engine.apply_patch(patch_file, DblpGraphName(expected.md5))
@@ -0,0 +1,41 @@
+from os import path
+
+from dblp_service.services.publication_hashes import diff_publication_hashes
+from dblp_service.services.release_deltas import ABSENT, ReleaseDeltas, compose_deltas
+from tests.dblp_service.services.offline_diff_test import L222, L338, WONG14, write_edited_l222
+from tests.dblp_service.services.publication_hashes_test import build
+
+
+def test_compose_deltas():
+    h1, h2, h3 = b'1' * 16, b'2' * 16, b'3' * 16
+    d01 = [('<a>', ABSENT, h1), ('<b>', h1, h2), ('<c>', h1, h2)]
+    d12 = [('<a>', h1, ABSENT), ('<b>', h2, h3), ('<d>', h1, ABSENT)]
+    d23 = [('<c>', h2, h1), ('<e>', ABSENT, h1)]
+    composed = list(compose_deltas([iter(d01), iter(d12), iter(d23)]))
+    assert composed == [('<b>', h1, h3), ('<d>', h1, ABSENT), ('<e>', ABSENT, h1)]
+
+
+def test_release_deltas(tmp_path):
+    edited = path.join(tmp_path, 'edited.nt.gz')
+    write_edited_l222(edited)
+    l222 = build(L222, path.join(tmp_path, 'l222'))
+    l338 = build(L338, path.join(tmp_path, 'l338'))
+    relabeled = build(edited, path.join(tmp_path, 'edited'))
+
+    deltas = ReleaseDeltas(path.join(tmp_path, 'deltas'))
+    assert deltas.add(l338, l222, 'r0', 'r1') > 0
+    assert deltas.add(l222, relabeled, 'r1', 'r2') == 1
+
+    # reloaded from disk, chained forwards and backwards
+    deltas = ReleaseDeltas(path.join(tmp_path, 'deltas'))
+    assert deltas.path('r0', 'r2') == [('r0', 'r1', False), ('r1', 'r2', False)]
+    assert deltas.path('r2', 'r0') == [('r1', 'r2', True), ('r0', 'r1', True)]
+    assert deltas.path('r0', 'r9') is None and deltas.changes('r0', 'r9') is None
+
+    changes = deltas.changes('r0', 'r2')
+    assert changes is not None
+    expected = list(diff_publication_hashes(l338, relabeled))
+    assert list(changes) == expected
+    assert (WONG14, 'modified') in expected
+    assert list(deltas.changes('r2', 'r0') or []) == list(diff_publication_hashes(relabeled, l338))
+    assert list(deltas.changes('r1', 'r2') or []) == [(WONG14, 'modified')]